@@ -4,15 +4,25 @@ from src.tools.device_tools import register_device_tools
 from src.tools.app_tools import register_app_tools
 from src.tools.file_tools import register_file_tools
 from src.tools.system_tools import register_system_tools
+from src.tools.fan_out_tools import register_fan_out_tools
+from src.tools.telemetry_tools import register_telemetry_tools
+from src.tools.job_tools import register_job_tools
+from src.telemetry import instrument_tools
 
 # Create the MCP server instance
 mcp = FastMCP("android-device-mcp")
 
+# Time every tool registered below
+instrument_tools(mcp)
+
 # Register all tool categories
 register_device_tools(mcp)
 register_app_tools(mcp)
 register_file_tools(mcp)
 register_system_tools(mcp)
+register_fan_out_tools(mcp)
+register_telemetry_tools(mcp)
+register_job_tools(mcp)
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
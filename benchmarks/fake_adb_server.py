@@ -0,0 +1,251 @@
+"""Fake ADB server emulating a rack of devices, for benchmarks.
+
+Speaks enough of the ADB host protocol for the server under test and for the fake `adb`
+executable in benchmarks/bin: host queries, track-devices, transports, shell v2, exec and
+sync. Every device request waits the configured latency, and a configurable share of
+requests fails as if the device had gone offline.
+
+    python -m benchmarks.fake_adb_server --devices 32 --port 5037
+"""
+import argparse
+import asyncio
+import struct
+
+from benchmarks.fake_device import DeviceProfile, FakeDevice, make_devices
+
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+SYNC_DATA_MAX = 64 * 1024
+
+
+class FakeAdbServer:
+    def __init__(self, devices: dict[str, FakeDevice]):
+        self.devices = devices
+        self.requests = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 5037) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        device = None
+        try:
+            while True:
+                length = int(await reader.readexactly(4), 16)
+                request = (await reader.readexactly(length)).decode()
+                self.requests += 1
+                if request.startswith("host:transport:"):
+                    device = self.devices.get(request.split(":", 2)[2])
+                    if device is None:
+                        await self._fail(writer, f"device '{request.split(':', 2)[2]}' not found")
+                        return
+                    await asyncio.sleep(device.profile.delay())
+                    if device.should_fail():
+                        await self._fail(writer, "device offline")
+                        return
+                    writer.write(b"OKAY")
+                    await writer.drain()
+                    continue
+                if request.startswith("host"):
+                    await self._host(request, writer)
+                    return
+                if device is None:
+                    await self._fail(writer, "no device selected")
+                    return
+                await self._device(device, request, reader, writer)
+                return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _fail(writer: asyncio.StreamWriter, message: str):
+        payload = message.encode()
+        writer.write(b"FAIL" + f"{len(payload):04x}".encode() + payload)
+        await writer.drain()
+
+    @staticmethod
+    async def _okay(writer: asyncio.StreamWriter, text: str):
+        payload = text.encode()
+        writer.write(b"OKAY" + f"{len(payload):04x}".encode() + payload)
+        await writer.drain()
+
+    async def _host(self, request: str, writer: asyncio.StreamWriter):
+        if request == "host:version":
+            await self._okay(writer, "0029")
+        elif request in ("host:devices", "host:devices-l"):
+            long = request.endswith("-l")
+            await self._okay(writer, "".join(
+                f"{serial}\tdevice" + (f" product:fake model:Fake_Pixel device:fake{device.index} transport_id:"
+                                       f"{device.index + 1}" if long else "") + "\n"
+                for serial, device in self.devices.items()))
+        elif request == "host:track-devices":
+            writer.write(b"OKAY")
+            payload = "".join(f"{serial}\tdevice\n" for serial in self.devices).encode()
+            writer.write(f"{len(payload):04x}".encode() + payload)
+            await writer.drain()
+            # Device list never changes, keep the stream open until the client goes away
+            await asyncio.Event().wait()
+        elif request.startswith("host-serial:"):
+            _, serial, query = request.split(":", 2)
+            if serial not in self.devices:
+                await self._fail(writer, f"device '{serial}' not found")
+            else:
+                await self._okay(writer, "device" if query == "get-state" else serial)
+        elif request == "host:kill":
+            writer.write(b"OKAY")
+            await writer.drain()
+        else:
+            await self._fail(writer, f"unknown host request {request}")
+
+    async def _device(self, device: FakeDevice, request: str, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        service, _, command = request.partition(":")
+        if service.startswith("shell"):
+            writer.write(b"OKAY")
+            if _is_streaming_logcat(command):
+                await self._stream_logcat(device, writer, shell_v2=",v2" in service)
+                return
+            code, stdout, stderr = await asyncio.to_thread(device.run, command)
+            if ",v2" in service:
+                for packet_id, data in ((SHELL_STDOUT, stdout), (SHELL_STDERR, stderr)):
+                    for offset in range(0, len(data), SYNC_DATA_MAX):
+                        chunk = data[offset:offset + SYNC_DATA_MAX]
+                        writer.write(struct.pack("<BI", packet_id, len(chunk)) + chunk)
+                writer.write(struct.pack("<BI", SHELL_EXIT, 1) + bytes([code & 0xff]))
+            else:
+                writer.write(stdout + stderr)
+            await writer.drain()
+        elif service == "exec":
+            writer.write(b"OKAY")
+            if command.startswith("cmd package install"):
+                await self._install(device, command, reader, writer)
+                return
+            if _is_streaming_logcat(command):
+                await self._stream_logcat(device, writer, shell_v2=False)
+                return
+            code, stdout, stderr = await asyncio.to_thread(device.run, command)
+            writer.write(stdout)
+            await writer.drain()
+        elif service == "sync":
+            writer.write(b"OKAY")
+            await self._sync(device, reader, writer)
+        elif service == "reboot":
+            writer.write(b"OKAY")
+            await writer.drain()
+        else:
+            await self._fail(writer, f"unknown service {service}")
+
+    async def _stream_logcat(self, device: FakeDevice, writer: asyncio.StreamWriter, shell_v2: bool):
+        batch = max(1, device.profile.logcat_lines_per_second // 10)
+        while True:
+            data = device.logcat_lines(batch).encode()
+            writer.write(struct.pack("<BI", SHELL_STDOUT, len(data)) + data if shell_v2 else data)
+            await writer.drain()
+            await asyncio.sleep(0.1)
+
+    @staticmethod
+    async def _install(device: FakeDevice, command: str, reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter):
+        words = command.split()
+        size = int(words[words.index("-S") + 1]) if "-S" in words else 0
+        remaining = size
+        while remaining > 0:
+            data = await reader.read(min(remaining, SYNC_DATA_MAX))
+            if not data:
+                return
+            remaining -= len(data)
+        # The APK contents are not inspected, every install adds one more build of a bench package
+        device.installed[f"com.example.installed{len(device.installed)}"] = 1
+        writer.write(b"Success\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _sync(device: FakeDevice, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            header = await reader.readexactly(8)
+            request, length = header[:4], struct.unpack("<I", header[4:])[0]
+            if request == b"QUIT":
+                return
+            path = (await reader.readexactly(length)).decode()
+            if request in (b"STAT", b"STA2"):
+                data = device.files.get(path)
+                if data is not None:
+                    writer.write(b"STAT" + struct.pack("<III", 0o100644, len(data), 0))
+                elif path.endswith("/") or "." not in path.rsplit("/", 1)[-1]:
+                    writer.write(b"STAT" + struct.pack("<III", 0o40755, 4096, 0))
+                else:
+                    writer.write(b"STAT" + struct.pack("<III", 0, 0, 0))
+            elif request == b"RECV":
+                data = device.files.get(path)
+                if data is None:
+                    message = b"No such file or directory"
+                    writer.write(b"FAIL" + struct.pack("<I", len(message)) + message)
+                else:
+                    for offset in range(0, len(data), SYNC_DATA_MAX):
+                        chunk = data[offset:offset + SYNC_DATA_MAX]
+                        writer.write(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                    writer.write(b"DONE" + struct.pack("<I", 0))
+            elif request == b"SEND":
+                target = path.rsplit(",", 1)[0]
+                data = bytearray()
+                while True:
+                    header = await reader.readexactly(8)
+                    if header[:4] == b"DONE":
+                        break
+                    data += await reader.readexactly(struct.unpack("<I", header[4:])[0])
+                device.files[target] = bytes(data)
+                writer.write(b"OKAY" + struct.pack("<I", 0))
+            await writer.drain()
+
+
+def _is_streaming_logcat(command: str) -> bool:
+    words = command.split()
+    return bool(words) and words[0] == "logcat" and not ({"-d", "-c", "-g"} & set(words))
+
+
+def profile_arguments(parser: argparse.ArgumentParser):
+    defaults = DeviceProfile()
+    parser.add_argument("--devices", type=int, default=8, help="number of simulated devices")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="latency per device request")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms, help="random +/- latency")
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate,
+                        help="share of device requests failing with 'device offline'")
+    parser.add_argument("--getprop-lines", type=int, default=defaults.getprop_lines)
+    parser.add_argument("--wifi-kb", type=int, default=defaults.wifi_kb, help="size of dumpsys wifi")
+    parser.add_argument("--packages", type=int, default=defaults.packages, help="installed packages per device")
+    parser.add_argument("--logcat-rate", type=int, default=defaults.logcat_lines_per_second,
+                        help="logcat lines per second")
+    parser.add_argument("--screencap-size", default="x".join(map(str, defaults.screencap_size)),
+                        help="screenshot resolution, e.g. 1080x2400")
+
+
+def profile_from_arguments(args: argparse.Namespace) -> DeviceProfile:
+    width, height = (int(value) for value in args.screencap_size.lower().split("x"))
+    return DeviceProfile(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+                         getprop_lines=args.getprop_lines, wifi_kb=args.wifi_kb, packages=args.packages,
+                         logcat_lines_per_second=args.logcat_rate, screencap_size=(width, height))
+
+
+async def serve(args: argparse.Namespace):
+    server = FakeAdbServer(make_devices(args.devices, profile_from_arguments(args)))
+    listener = await server.start(args.host, args.port)
+    print(f"Fake ADB server with {args.devices} devices listening on {args.host}:{args.port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5037)
+    profile_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Simulated Android devices for the benchmark suite.
+
+Each FakeDevice answers shell commands with generated output of a configurable size. Only
+the small subset of the shell the server actually uses is understood: `;`, `&&` and `|`
+separated commands, redirections (ignored) and a handful of programs and filters.
+"""
+import hashlib
+import io
+import random
+import re
+import shlex
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class DeviceProfile:
+    """Output sizes and behaviour shared by all simulated devices"""
+    latency_ms: float = 5.0
+    jitter_ms: float = 2.0
+    failure_rate: float = 0.0
+    getprop_lines: int = 800
+    wifi_kb: int = 200
+    packages: int = 300
+    logcat_lines_per_second: int = 500
+    screencap_size: tuple[int, int] = (1080, 2400)
+    files_per_directory: int = 200
+
+    def delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+
+_screencaps: dict[tuple[int, int], bytes] = {}
+
+
+def screencap_png(size: tuple[int, int]) -> bytes:
+    """A PNG of the configured size with some noise, so it does not compress to nothing"""
+    if size not in _screencaps:
+        from PIL import Image
+
+        width, height = size
+        image = Image.frombytes("RGB", (width, 64), random.randbytes(width * 64 * 3)).resize((width, height))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", compress_level=1)
+        _screencaps[size] = buffer.getvalue()
+    return _screencaps[size]
+
+
+@dataclass
+class FakeDevice:
+    serial: str
+    profile: DeviceProfile
+    index: int = 0
+    boot_id: str = field(default_factory=lambda: hashlib.md5(random.randbytes(8)).hexdigest())
+    files: dict[str, bytes] = field(default_factory=dict)
+    installed: dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.installed = {f"com.example.app{i:04d}": 100 + i for i in range(self.profile.packages)}
+
+    def should_fail(self) -> bool:
+        return random.random() < self.profile.failure_rate
+
+    # Generated outputs
+
+    def getprop(self) -> str:
+        props = {
+            'ro.build.version.release': "14",
+            'ro.build.version.sdk': "34",
+            'ro.build.version.security_patch': "2024-05-01",
+            'ro.build.display.id': "UQ1A.240505.001",
+            'ro.build.date': "Wed May 1 00:00:00 UTC 2024",
+            'ro.product.model': "Fake Pixel",
+            'ro.product.manufacturer': "Fake",
+            'ro.product.brand': "fake",
+            'ro.product.device': f"fake{self.index}",
+            'ro.product.cpu.abi': "arm64-v8a",
+            'ro.hardware': "fakehw",
+            'ro.serialno': self.serial,
+        }
+        for i in range(max(0, self.profile.getprop_lines - len(props))):
+            props[f"persist.fake.property{i}"] = f"value{i}"
+        return "".join(f"[{key}]: [{value}]\n" for key, value in props.items())
+
+    def dumpsys_battery(self) -> str:
+        return ("Current Battery Service state:\n  AC powered: false\n  USB powered: true\n  status: 2\n"
+                f"  health: 2\n  present: true\n  level: {50 + self.index % 50}\n  scale: 100\n  voltage: 4200\n")
+
+    def dumpsys_wifi(self) -> str:
+        lines = ["Wi-Fi is enabled",
+                 f'mWifiInfo SSID: "bench-net-{self.index % 4}", BSSID: 02:00:00:00:00:00, RSSI: -50, Link speed: 866']
+        filler = "  WifiConfigManager entry " + "x" * 100
+        lines += [filler] * (self.profile.wifi_kb * 1024 // len(filler))
+        return "\n".join(lines) + "\n"
+
+    def ip_addr(self) -> str:
+        return ("1: lo: <LOOPBACK,UP> mtu 65536\n    inet 127.0.0.1/8 scope host lo\n"
+                "3: wlan0: <BROADCAST,MULTICAST,UP> mtu 1500\n"
+                f"    inet 10.0.{self.index // 250}.{self.index % 250 + 2}/24 brd 10.0.0.255 scope global wlan0\n")
+
+    def ip_addr_oneline(self) -> str:
+        return ("1: lo    inet 127.0.0.1/8 scope host lo\\       valid_lft forever preferred_lft forever\n"
+                f"3: wlan0    inet 10.0.{self.index // 250}.{self.index % 250 + 2}/24 brd 10.0.0.255 scope global "
+                "wlan0\\       valid_lft forever preferred_lft forever\n")
+
+    def cmd_wifi_status(self) -> str:
+        return (f'Wifi is enabled\nWifi is connected to "bench-net-{self.index % 4}"\n'
+                f'WifiInfo: SSID: "bench-net-{self.index % 4}", BSSID: 02:00:00:00:00:00, RSSI: -50\n')
+
+    def pm_list_packages(self, show_versioncode: bool) -> str:
+        if show_versioncode:
+            return "".join(f"package:{name} versionCode:{code}\n" for name, code in sorted(self.installed.items()))
+        return "".join(f"package:{name}\n" for name in sorted(self.installed))
+
+    def dumpsys_package(self) -> str:
+        out = ["Packages:"]
+        for name, code in sorted(self.installed.items()):
+            out += [f"  Package [{name}] (abc{code}):", f"    userId={10000 + code}",
+                    f"    codePath=/data/app/~~{code}/{name}-1",
+                    f"    versionCode={code} minSdk=24 targetSdk=34", f"    versionName=1.0.{code}",
+                    "    flags=[ HAS_CODE ALLOW_CLEAR_USER_DATA ALLOW_BACKUP ]",
+                    "    firstInstallTime=2024-01-01 00:00:00", "    lastUpdateTime=2024-05-01 00:00:00",
+                    "    installerPackageName=com.android.vending", "    requested permissions:",
+                    "      android.permission.INTERNET", "    install permissions:",
+                    "      android.permission.INTERNET: granted=true",
+                    "    User 0: ceDataInode=1 installed=true hidden=false suspended=false enabled=0"]
+        return "\n".join(out) + "\n"
+
+    def find(self) -> str:
+        now = int(time.time())
+        lines = []
+        for i in range(self.profile.files_per_directory):
+            if i % 10 == 0:
+                lines.append(f"41f9 4096 {now} ./dir{i}")
+            else:
+                lines.append(f"81b0 {1024 * i} {now} ./file{i}.jpg")
+        return "\n".join(lines) + "\n"
+
+    def logcat_lines(self, count: int) -> str:
+        now = time.time()
+        return "".join(f"[ {now:.3f} {1000 + i % 50}: {2000 + i % 50} I/BenchTag{i % 10} ]\nbenchmark log line {i}\n\n"
+                       for i in range(count))
+
+    def ui_dump(self) -> str:
+        nodes = "".join(f'<node index="{i}" text="Item {i}" resource-id="com.example:id/item{i}" '
+                        f'class="android.widget.TextView" package="com.example" content-desc="" clickable="true" '
+                        f'enabled="true" bounds="[0,{i * 100}][1080,{i * 100 + 100}]" />' for i in range(40))
+        return (f'<?xml version=\'1.0\' encoding=\'UTF-8\' standalone=\'yes\' ?><hierarchy rotation="0">'
+                f'<node index="0" text="" class="android.widget.FrameLayout" package="com.example" '
+                f'bounds="[0,0][1080,2400]">{nodes}</node></hierarchy>\n'
+                "UI hierchary dumped to: /dev/tty\n")
+
+    # Mini shell
+
+    def run(self, command: str) -> tuple[int, bytes, bytes]:
+        """Run a shell command line, returning exit code, stdout and stderr"""
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError as e:
+            return 2, b"", f"sh: {e}\n".encode()
+        stdout, stderr = bytearray(), bytearray()
+        code = 0
+        pipeline: list[list[str]] = [[]]
+        skip_next = False
+        for token in tokens + [";"]:
+            if skip_next:
+                skip_next = False
+                continue
+            if token in (">", ">>", "<", ">&", "&>"):
+                # Redirections are ignored, along with the fd number before them
+                if pipeline[-1] and pipeline[-1][-1].isdigit():
+                    pipeline[-1].pop()
+                skip_next = True
+            elif token == "|":
+                pipeline.append([])
+            elif token in (";", "&&", "||"):
+                if pipeline != [[]]:
+                    code, out, err = self._pipeline(pipeline)
+                    stdout += out
+                    stderr += err
+                pipeline = [[]]
+                if (token == "&&" and code != 0) or (token == "||" and code == 0):
+                    break
+            else:
+                pipeline[-1].append(token)
+        return code, bytes(stdout), bytes(stderr)
+
+    def _pipeline(self, pipeline: list[list[str]]) -> tuple[int, bytes, bytes]:
+        data = b""
+        code, err = 0, b""
+        for argv in pipeline:
+            if argv:
+                code, data, err = self._program(argv, data)
+        return code, data, err
+
+    def _program(self, argv: list[str], stdin: bytes) -> tuple[int, bytes, bytes]:
+        name, args = argv[0], argv[1:]
+        if name == "echo":
+            return 0, (" ".join(args) + "\n").encode(), b""
+        if name == "getprop":
+            return 0, self.getprop().encode(), b""
+        if name == "cat" and args == ["/proc/sys/kernel/random/boot_id"]:
+            return 0, f"{self.boot_id}\n".encode(), b""
+        if name == "cat" and args:
+            if args[0] in self.files:
+                return 0, self.files[args[0]], b""
+            return 1, b"", f"cat: {args[0]}: No such file or directory\n".encode()
+        if name == "dumpsys":
+            service = args[0] if args else ""
+            output = {'battery': self.dumpsys_battery, 'wifi': self.dumpsys_wifi,
+                      'package': self.dumpsys_package}.get(service)
+            return 0, (output() if output else f"DUMP OF SERVICE {service}:\n").encode(), b""
+        if name == "ip":
+            return 0, (self.ip_addr_oneline() if "-o" in args else self.ip_addr()).encode(), b""
+        if name == "cmd" and args[:2] == ["wifi", "status"]:
+            return 0, self.cmd_wifi_status().encode(), b""
+        if name == "pm" and args[:2] == ["list", "packages"]:
+            return 0, self.pm_list_packages("--show-versioncode" in args).encode(), b""
+        if name == "pm" and args[:1] == ["uninstall"]:
+            if self.installed.pop(args[-1], None) is None:
+                return 1, b"Failure [DELETE_FAILED_INTERNAL_ERROR]\n", b""
+            return 0, b"Success\n", b""
+        if name in ("md5sum", "sha256sum"):
+            digest = hashlib.md5 if name == "md5sum" else hashlib.sha256
+            if not args:
+                return 0, f"{digest(stdin).hexdigest()}  -\n".encode(), b""
+            return 0, "".join(f"{digest(self.files.get(path, b'')).hexdigest()}  {path}\n"
+                              for path in args).encode(), b""
+        if name == "grep":
+            max_count = int(args[args.index("-m") + 1]) if "-m" in args[:-1] else None
+            pattern = [arg for index, arg in enumerate(args)
+                       if not arg.startswith("-") and (index == 0 or args[index - 1] != "-m")]
+            if not pattern:
+                return 2, b"", b"grep: no pattern\n"
+            regex = re.compile(pattern[0].encode())
+            lines = [line for line in stdin.split(b"\n") if regex.search(line)][:max_count]
+            return (0 if lines else 1), b"".join(line + b"\n" for line in lines), b""
+        if name == "find":
+            return 0, self.find().encode(), b""
+        if name == "screencap":
+            return 0, screencap_png(self.profile.screencap_size), b""
+        if name == "uiautomator":
+            return 0, self.ui_dump().encode(), b""
+        if name == "logcat":
+            if "-c" in args:
+                return 0, b"", b""
+            return 0, self.logcat_lines(self.profile.logcat_lines_per_second).encode(), b""
+        if name == "sleep":
+            time.sleep(float(args[0]) if args else 0)
+            return 0, b"", b""
+        if name in ("cd", "mkdir", "rm", "true", "am", "input", "monkey", "svc", "settings", "setprop", "reboot"):
+            return 0, b"", b""
+        if name == "false":
+            return 1, b"", b""
+        return 127, b"", f"/system/bin/sh: {name}: inaccessible or not found\n".encode()
+
+
+def make_devices(count: int, profile: Optional[DeviceProfile] = None) -> dict[str, FakeDevice]:
+    profile = profile or DeviceProfile()
+    return {f"bench-{index:03d}": FakeDevice(f"bench-{index:03d}", profile, index) for index in range(count)}
@@ -0,0 +1,198 @@
+"""Benchmark the server functions against a rack of simulated devices.
+
+Starts the fake ADB server, puts the fake `adb` executable first on PATH and drives the
+real functions of device_management, app_management and file_system, reporting throughput
+and p50/p99 latency per scenario. Each execution backend runs in its own process, because
+the backend is chosen by environment variables read at import time.
+
+    python -m benchmarks.run_benchmarks --devices 32 --latency-ms 10 --backends native,cli
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from benchmarks.fake_adb_server import profile_arguments
+
+ROOT = Path(__file__).resolve().parent.parent
+FAKE_ADB_DIR = Path(__file__).resolve().parent / "bin"
+
+# Environment of each execution backend
+BACKENDS = {
+    'native': {'ADB_MCP_NATIVE': "1", 'ADB_MCP_SHELL_SESSIONS': "1"},
+    'session': {'ADB_MCP_NATIVE': "0", 'ADB_MCP_SHELL_SESSIONS': "1"},
+    'cli': {'ADB_MCP_NATIVE': "0", 'ADB_MCP_SHELL_SESSIONS': "0"},
+}
+
+SCENARIOS = ("list_devices", "execute_shell", "battery", "network", "list_installed_apps", "get_app_details",
+             "list_files", "push_file", "pull_file", "take_screenshot", "fan_out_shell")
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def run_scenario(name: str, operation: Callable[[int], Awaitable], iterations: int, concurrency: int) -> dict:
+    """Run `operation` `iterations` times with at most `concurrency` in flight"""
+    from src.fan_out import is_failure
+
+    latencies: list[float] = []
+    errors = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        nonlocal errors
+        async with limit:
+            started = time.perf_counter()
+            try:
+                result = await operation(index)
+                if is_failure(result):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(iterations)))
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': name,
+        'ops': iterations,
+        'concurrency': concurrency,
+        'ops_per_second': iterations / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'errors': errors,
+    }
+
+
+def build_scenarios(serials: list[str], work_dir: Path) -> dict[str, tuple[Callable[[int], Awaitable], bool]]:
+    """Scenario name -> (operation taking the iteration index, whether it runs concurrently)"""
+    from src.app_management import get_app_details
+    from src.device_management import (list_devices, execute_shell, get_battery_details, get_network_details,
+                                       list_installed_apps, take_screenshot)
+    from src.fan_out import fan_out
+    from src.file_system import list_files, push_file, pull_file
+
+    local_file = work_dir / "payload.bin"
+    local_file.write_bytes(os.urandom(256 * 1024))
+
+    def serial(index: int) -> str:
+        return serials[index % len(serials)]
+
+    async def pull(index: int):
+        # Make sure there is something to pull on every device
+        await push_file(serial(index), str(local_file), "/sdcard/bench/")
+        return await pull_file(serial(index), "/sdcard/bench/payload.bin", str(work_dir))
+
+    return {
+        'list_devices': (lambda index: list_devices(), False),
+        'execute_shell': (lambda index: execute_shell(serial(index), "echo hello"), True),
+        'battery': (lambda index: get_battery_details(serial(index)), True),
+        'network': (lambda index: get_network_details(serial(index)), True),
+        'list_installed_apps': (lambda index: list_installed_apps(serial(index)), True),
+        'get_app_details': (lambda index: get_app_details(serial(index), "com.example.app0001"), True),
+        'list_files': (lambda index: list_files(serial(index), "/sdcard/DCIM"), True),
+        'push_file': (lambda index: push_file(serial(index), str(local_file), "/sdcard/bench/"), True),
+        'pull_file': (pull, True),
+        'take_screenshot': (lambda index: take_screenshot(serial(index), str(work_dir / f"screen{index}.png")),
+                            True),
+        'fan_out_shell': (lambda index: fan_out(serials, lambda s: execute_shell(s, "echo hello")), False),
+    }
+
+
+async def run_backend(args: argparse.Namespace) -> list[dict]:
+    from src.fan_out import connected_serials
+
+    serials = await connected_serials()
+    if not serials:
+        raise RuntimeError("No simulated devices are connected")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="adb-mcp-bench-") as work_dir:
+        scenarios = build_scenarios(serials, Path(work_dir))
+        for name in args.scenarios:
+            operation, concurrent = scenarios[name]
+            # One warm-up call, so one-off costs such as starting the adb server are not measured
+            await operation(0)
+            results.append(await run_scenario(name, operation, args.iterations,
+                                              args.concurrency if concurrent else 1))
+    return results
+
+
+def format_results(backend: str, args: argparse.Namespace, results: list[dict]) -> str:
+    lines = [f"backend={backend} devices={args.devices} latency_ms={args.latency_ms} "
+             f"failure_rate={args.failure_rate} iterations={args.iterations}",
+             f"{'scenario':<22}{'ops':>6}{'conc':>6}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}"]
+    for result in results:
+        lines.append(f"{result['scenario']:<22}{result['ops']:>6}{result['concurrency']:>6}"
+                     f"{result['ops_per_second']:>10.1f}{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                     f"{result['errors']:>8}")
+    return "\n".join(lines) + "\n"
+
+
+def start_fake_server(args: argparse.Namespace) -> subprocess.Popen:
+    command = [sys.executable, "-m", "benchmarks.fake_adb_server", "--port", str(args.port),
+               "--devices", str(args.devices), "--latency-ms", str(args.latency_ms),
+               "--jitter-ms", str(args.jitter_ms), "--failure-rate", str(args.failure_rate),
+               "--getprop-lines", str(args.getprop_lines), "--wifi-kb", str(args.wifi_kb),
+               "--packages", str(args.packages), "--logcat-rate", str(args.logcat_rate),
+               "--screencap-size", args.screencap_size]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    # The server prints one line once it is listening
+    if not server.stdout.readline():
+        raise RuntimeError("Fake ADB server failed to start")
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--port", type=int, default=15037,
+                        help="port of the fake ADB server (5037 would clash with a real one)")
+    parser.add_argument("--iterations", type=int, default=50, help="calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight for concurrent scenarios")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios to run")
+    parser.add_argument("--backends", default="native", help=f"comma-separated, of: {', '.join(BACKENDS)}")
+    parser.add_argument("--output", help="also append the report to this file")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    profile_arguments(parser)
+    args = parser.parse_args()
+    args.scenarios = [name for name in args.scenarios.split(",") if name]
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}'")
+
+    if args.backend:
+        # Child process of one backend, environment already set up by the parent
+        print(format_results(args.backend, args, asyncio.run(run_backend(args))), end="", flush=True)
+        return
+
+    server = start_fake_server(args)
+    try:
+        for backend in args.backends.split(","):
+            if backend not in BACKENDS:
+                parser.error(f"unknown backend '{backend}'")
+            env = {**os.environ, **BACKENDS[backend], 'ANDROID_ADB_SERVER_PORT': str(args.port),
+                   'ADB_SERVER_HOST': "127.0.0.1", 'PATH': f"{FAKE_ADB_DIR}{os.pathsep}{os.environ.get('PATH', '')}",
+                   'ADB_MCP_HASH_CACHE': str(Path(tempfile.gettempdir()) / "adb-mcp-bench-hash-cache.json")}
+            child = subprocess.run([sys.executable, "-m", "benchmarks.run_benchmarks", *sys.argv[1:],
+                                    "--backend", backend], cwd=ROOT, env=env, capture_output=True, text=True)
+            report = child.stdout if child.returncode == 0 else f"backend={backend} failed:\n{child.stderr}"
+            print(report, flush=True)
+            if args.output:
+                with open(args.output, "a") as f:
+                    f.write(report + "\n")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
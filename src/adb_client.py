@@ -0,0 +1,439 @@
+import asyncio
+import os
+import stat
+import struct
+import time
+from collections import deque
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+ADB_SERVER_HOST = os.environ.get("ADB_SERVER_HOST", "127.0.0.1")
+ADB_SERVER_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", "5037"))
+NATIVE_ADB_ENABLED = os.environ.get("ADB_MCP_NATIVE", "1") != "0"
+
+# Shell protocol v2 packet ids
+SHELL_STDIN = 0
+SHELL_STDOUT = 1
+SHELL_STDERR = 2
+SHELL_EXIT = 3
+
+SYNC_DATA_MAX = 64 * 1024
+
+
+class AdbProtocolError(Exception):
+    """Raised when the ADB server answers a request with FAIL"""
+
+
+class AdbLocalFileError(Exception):
+    """Raised when a local file of a transfer cannot be opened; the ADB server is not at fault"""
+
+
+def _open_local(path: str, mode: str):
+    try:
+        return open(path, mode)
+    except OSError as e:
+        action = "create" if "w" in mode else "read"
+        raise AdbLocalFileError(f"cannot {action} '{path}': {e.strerror}") from e
+
+
+class AdbConnection:
+    """A single connection to the ADB server speaking the host protocol"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.created = time.monotonic()
+
+    @classmethod
+    async def open(cls, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT) -> "AdbConnection":
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def send_request(self, request: str):
+        """Send a length-prefixed request and wait for OKAY"""
+        payload = request.encode()
+        self.writer.write(f"{len(payload):04x}".encode() + payload)
+        await self.writer.drain()
+        await self.read_status()
+
+    async def read_status(self):
+        status = await self.reader.readexactly(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbProtocolError(await self.read_string())
+        raise AdbProtocolError(f"unexpected response from adb server: {status!r}")
+
+    async def read_string(self) -> str:
+        length = int(await self.reader.readexactly(4), 16)
+        return (await self.reader.readexactly(length)).decode(errors="ignore")
+
+    async def read_all(self) -> bytes:
+        return await self.reader.read()
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    def is_stale(self) -> bool:
+        return self.reader.at_eof() or self.writer.is_closing()
+
+
+class AdbConnectionPool:
+    """Per-serial pool of connections that have already switched to the device transport.
+
+    A transport connection is consumed by the service it runs, so connections are never
+    returned to the pool. Instead, the pool keeps a few warm connections per serial with
+    the `host:transport:<serial>` handshake already done, and refills them in the background.
+    """
+
+    def __init__(self, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT, warm_size: int = 2,
+                 max_idle: float = 30.0, max_streams: int = 8):
+        self.host = host
+        self.port = port
+        self.warm_size = warm_size
+        self.max_idle = max_idle
+        self.max_streams = max_streams
+        self._idle: dict[str, deque[AdbConnection]] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self._refilling: set[str] = set()
+
+    def streams(self, serial: Optional[str]) -> asyncio.Semaphore:
+        """Semaphore capping the number of concurrent streams for a serial"""
+        key = serial or ""
+        if key not in self._limits:
+            self._limits[key] = asyncio.Semaphore(self.max_streams)
+        return self._limits[key]
+
+    async def connect(self) -> AdbConnection:
+        return await AdbConnection.open(self.host, self.port)
+
+    async def _open_transport(self, serial: Optional[str]) -> AdbConnection:
+        conn = await self.connect()
+        try:
+            await conn.send_request(f"host:transport:{serial}" if serial else "host:transport-any")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    async def acquire(self, serial: Optional[str]) -> AdbConnection:
+        """Return a connection switched to the transport of the given serial"""
+        if serial:
+            idle = self._idle.setdefault(serial, deque())
+            while idle:
+                conn = idle.popleft()
+                if time.monotonic() - conn.created < self.max_idle and not conn.is_stale():
+                    self._schedule_refill(serial)
+                    return conn
+                conn.close()
+        conn = await self._open_transport(serial)
+        if serial:
+            self._schedule_refill(serial)
+        return conn
+
+    def _schedule_refill(self, serial: str):
+        if self.warm_size <= 0 or serial in self._refilling:
+            return
+        self._refilling.add(serial)
+        asyncio.get_running_loop().create_task(self._refill(serial))
+
+    async def _refill(self, serial: str):
+        try:
+            idle = self._idle.setdefault(serial, deque())
+            while len(idle) < self.warm_size:
+                idle.append(await self._open_transport(serial))
+        except Exception:
+            # Device went away or server is down; the next acquire reports the real error
+            pass
+        finally:
+            self._refilling.discard(serial)
+
+    def discard(self, serial: str):
+        """Drop warm connections of a serial, e.g. after the device disconnected"""
+        for conn in self._idle.pop(serial, deque()):
+            conn.close()
+
+    def close(self):
+        for serial in list(self._idle):
+            self.discard(serial)
+
+
+class AdbClient:
+    """Asyncio client for the ADB server host protocol"""
+
+    def __init__(self, host: str = ADB_SERVER_HOST, port: int = ADB_SERVER_PORT, warm_size: int = 2):
+        self.pool = AdbConnectionPool(host, port, warm_size=warm_size)
+        self._no_shell_v2: set[str] = set()
+
+    async def host_query(self, request: str) -> str:
+        """Run a host request that answers with a single length-prefixed string"""
+        conn = await self.pool.connect()
+        try:
+            await conn.send_request(request)
+            return await conn.read_string()
+        finally:
+            conn.close()
+
+    async def server_version(self) -> int:
+        return int(await self.host_query("host:version"), 16)
+
+    async def devices(self, long: bool = False) -> str:
+        return await self.host_query("host:devices-l" if long else "host:devices")
+
+    async def get_state(self, serial: Optional[str]) -> str:
+        return await self.host_query(f"host-serial:{serial}:get-state" if serial else "host:get-state")
+
+    async def get_serialno(self, serial: Optional[str]) -> str:
+        return await self.host_query(f"host-serial:{serial}:get-serialno" if serial else "host:get-serialno")
+
+    async def open_service(self, serial: Optional[str], service: str) -> AdbConnection:
+        """Open a device service stream, retrying once if a warm connection went stale"""
+        for attempt in range(2):
+            conn = await self.pool.acquire(serial)
+            try:
+                await conn.send_request(service)
+                return conn
+            except (ConnectionError, asyncio.IncompleteReadError):
+                conn.close()
+                if attempt:
+                    raise
+            except Exception:
+                conn.close()
+                raise
+
+    async def exec_out(self, serial: Optional[str], command: str) -> bytes:
+        """Run `exec:<command>` and return the raw stdout bytes"""
+        async with self.pool.streams(serial):
+            conn = await self.open_service(serial, f"exec:{command}")
+            try:
+                return await conn.read_all()
+            finally:
+                conn.close()
+
+    async def shell(self, serial: Optional[str], command: str,
+                    on_stdout: Optional[Callable[[bytes], Awaitable[None]]] = None) -> (int, bytes, bytes):
+        """Run a command over the shell v2 protocol, returning exit code, stdout and stderr.
+
+        With `on_stdout`, stdout is handed to the callback as it arrives instead of being collected.
+        """
+        async with self.pool.streams(serial):
+            conn = await self.open_service(serial, f"shell,v2,raw:{command}")
+            try:
+                stdout, stderr, code = bytearray(), bytearray(), 255
+                while True:
+                    try:
+                        header = await conn.reader.readexactly(5)
+                    except asyncio.IncompleteReadError:
+                        break
+                    packet_id, length = struct.unpack("<BI", header)
+                    data = await conn.reader.readexactly(length)
+                    if packet_id == SHELL_STDOUT:
+                        if on_stdout:
+                            await on_stdout(data)
+                        else:
+                            stdout += data
+                    elif packet_id == SHELL_STDERR:
+                        stderr += data
+                    elif packet_id == SHELL_EXIT:
+                        code = data[0] if data else 0
+                        break
+                return code, bytes(stdout), bytes(stderr)
+            finally:
+                conn.close()
+
+    def shell_v2_supported(self, serial: Optional[str]) -> bool:
+        return serial not in self._no_shell_v2
+
+    async def reboot(self, serial: Optional[str], mode: str = "") -> bytes:
+        async with self.pool.streams(serial):
+            conn = await self.open_service(serial, f"reboot:{mode}")
+            try:
+                return await conn.read_all()
+            finally:
+                conn.close()
+
+    async def _sync(self, serial: Optional[str]) -> AdbConnection:
+        return await self.open_service(serial, "sync:")
+
+    @staticmethod
+    async def _sync_stat(conn: AdbConnection, remote_path: str) -> (int, int, int):
+        path = remote_path.encode()
+        conn.writer.write(b"STAT" + struct.pack("<I", len(path)) + path)
+        await conn.writer.drain()
+        response = await conn.reader.readexactly(16)
+        if response[:4] != b"STAT":
+            raise AdbProtocolError(f"unexpected sync response: {response[:4]!r}")
+        return struct.unpack("<III", response[4:])
+
+    @staticmethod
+    async def _sync_quit(conn: AdbConnection):
+        conn.writer.write(b"QUIT" + struct.pack("<I", 0))
+        await conn.writer.drain()
+
+    async def stat(self, serial: Optional[str], remote_path: str) -> (int, int, int):
+        """Return (mode, size, mtime) of a path on the device; mode is 0 if it does not exist"""
+        async with self.pool.streams(serial):
+            conn = await self._sync(serial)
+            try:
+                result = await self._sync_stat(conn, remote_path)
+                await self._sync_quit(conn)
+                return result
+            finally:
+                conn.close()
+
+    async def pull(self, serial: Optional[str], remote_path: str, local_path: str) -> int:
+        """Pull a single regular file over the sync protocol, returning the number of bytes.
+
+        The local file is removed again if the transfer does not complete, like `adb pull` does.
+        """
+        f = _open_local(local_path, "wb")
+        completed = False
+        try:
+            with f:
+                async with self.pool.streams(serial):
+                    conn = await self._sync(serial)
+                    try:
+                        path = remote_path.encode()
+                        conn.writer.write(b"RECV" + struct.pack("<I", len(path)) + path)
+                        await conn.writer.drain()
+                        total = 0
+                        while True:
+                            header = await conn.reader.readexactly(8)
+                            kind, length = header[:4], struct.unpack("<I", header[4:])[0]
+                            if kind == b"DATA":
+                                f.write(await conn.reader.readexactly(length))
+                                total += length
+                            elif kind == b"DONE":
+                                break
+                            elif kind == b"FAIL":
+                                raise AdbProtocolError(
+                                    (await conn.reader.readexactly(length)).decode(errors="ignore"))
+                            else:
+                                raise AdbProtocolError(f"unexpected sync response: {kind!r}")
+                        await self._sync_quit(conn)
+                    finally:
+                        conn.close()
+            completed = True
+            return total
+        finally:
+            if not completed:
+                Path(local_path).unlink(missing_ok=True)
+
+    async def push(self, serial: Optional[str], local_path: str, remote_path: str, mode: int = 0o644) -> int:
+        """Push a single regular file over the sync protocol, returning the number of bytes"""
+        with _open_local(local_path, "rb") as f:
+            mtime = int(os.fstat(f.fileno()).st_mtime)
+            async with self.pool.streams(serial):
+                conn = await self._sync(serial)
+                try:
+                    target = f"{remote_path},{mode}".encode()
+                    conn.writer.write(b"SEND" + struct.pack("<I", len(target)) + target)
+                    total = 0
+                    while chunk := f.read(SYNC_DATA_MAX):
+                        conn.writer.write(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                        await conn.writer.drain()
+                        total += len(chunk)
+                    conn.writer.write(b"DONE" + struct.pack("<I", mtime))
+                    await conn.writer.drain()
+                    header = await conn.reader.readexactly(8)
+                    if header[:4] == b"FAIL":
+                        length = struct.unpack("<I", header[4:])[0]
+                        raise AdbProtocolError((await conn.reader.readexactly(length)).decode(errors="ignore"))
+                    if header[:4] != b"OKAY":
+                        raise AdbProtocolError(f"unexpected sync response: {header[:4]!r}")
+                    await self._sync_quit(conn)
+                    return total
+                finally:
+                    conn.close()
+
+    async def run(self, args: tuple) -> Optional[tuple[int, bytes, bytes]]:
+        """Run an adb CLI-style argument list natively.
+
+        Returns None when the command is not supported by the native client so the caller
+        can fall back to the adb executable.
+        """
+        args = list(args)
+        serial = None
+        if len(args) >= 2 and args[0] == "-s":
+            serial, args = args[1], args[2:]
+        if not args or any(a.startswith("-") for a in args[:1]):
+            return None
+        command, rest = args[0], args[1:]
+
+        try:
+            if command == "devices" and rest in ([], ["-l"]):
+                out = await self.devices(long=rest == ["-l"])
+                return 0, ("List of devices attached\n" + out).encode(), b""
+            if command == "get-state" and not rest:
+                return 0, (await self.get_state(serial)).encode(), b""
+            if command == "get-serialno" and not rest:
+                return 0, (await self.get_serialno(serial)).encode(), b""
+            if command == "shell" and rest and serial not in self._no_shell_v2:
+                try:
+                    return await self.shell(serial, " ".join(rest))
+                except AdbProtocolError as e:
+                    if "device" in str(e).lower():
+                        raise
+                    # Device without shell v2 support, let the CLI handle shell commands
+                    self._no_shell_v2.add(serial)
+                    return None
+            if command == "logcat" and serial not in self._no_shell_v2:
+                return await self.shell(serial, " ".join(["logcat"] + rest))
+            if command == "exec-out" and rest:
+                return 0, await self.exec_out(serial, " ".join(rest)), b""
+            if command == "reboot" and len(rest) <= 1:
+                return 0, await self.reboot(serial, rest[0] if rest else ""), b""
+            if command == "pull" and len(rest) == 2:
+                return await self._run_pull(serial, rest[0], rest[1])
+            if command == "push" and len(rest) == 2:
+                return await self._run_push(serial, rest[0], rest[1])
+        except (AdbProtocolError, AdbLocalFileError) as e:
+            return 1, b"", f"adb: error: {e}".encode()
+        return None
+
+    async def _run_pull(self, serial: Optional[str], remote_path: str, local_path: str):
+        mode, size, _ = await self.stat(serial, remote_path)
+        if not stat.S_ISREG(mode):
+            # Directories and special files keep the CLI semantics
+            return None
+        target = Path(local_path)
+        if target.is_dir():
+            target = target / Path(remote_path).name
+        started = time.monotonic()
+        total = await self.pull(serial, remote_path, str(target))
+        return 0, _transfer_summary(remote_path, "pulled", total, time.monotonic() - started), b""
+
+    async def _run_push(self, serial: Optional[str], local_path: str, remote_path: str):
+        source = Path(local_path)
+        if not source.is_file():
+            return None
+        mode, _, _ = await self.stat(serial, remote_path)
+        if stat.S_ISDIR(mode) or remote_path.endswith("/"):
+            remote_path = remote_path.rstrip("/") + "/" + source.name
+        started = time.monotonic()
+        total = await self.push(serial, str(source), remote_path, stat.S_IMODE(source.stat().st_mode))
+        return 0, _transfer_summary(local_path, "pushed", total, time.monotonic() - started), b""
+
+    def close(self):
+        self.pool.close()
+
+
+def _transfer_summary(path: str, action: str, total: int, elapsed: float) -> bytes:
+    rate = total / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+    return f"{path}: 1 file {action}, 0 skipped. {rate:.1f} MB/s ({total} bytes in {elapsed:.3f}s)".encode()
+
+
+_client: Optional[AdbClient] = None
+
+
+def get_adb_client() -> Optional[AdbClient]:
+    """Return the shared native client, or None if it is disabled"""
+    global _client
+    if not NATIVE_ADB_ENABLED:
+        return None
+    if _client is None:
+        _client = AdbClient()
+    return _client
@@ -1,42 +1,340 @@
 import asyncio
-from typing import Optional
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
 
+from src.adb_client import AdbProtocolError, get_adb_client
+from src.adb_supervisor import supervisor
+from src.scheduler import scheduler, classify_lane, PRIORITY_NORMAL, QUICK_LANE
+from src.shell_session import shell_sessions, ShellSessionError, SHELL_SESSIONS_ENABLED
+from src.telemetry import telemetry
 
-async def run_adb(*args, timeout: Optional[float] = 30.0) -> (int, str, str):
+
+async def run_adb(*args, timeout: Optional[float] = 30.0, priority: int = PRIORITY_NORMAL) -> (int, str, str):
     """Execute ADB command with timeout and error handling"""
     try:
-        await ensure_adb_server()
-        adb_cmd = ["adb"] + list(args)
-        proc = await asyncio.create_subprocess_exec(
-            *adb_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-        except asyncio.TimeoutError:
-            proc.kill()
-            raise TimeoutError(f"ADB command timed out after {timeout} seconds: {' '.join(adb_cmd)}")
-        return proc.returncode, stdout.decode(errors="ignore").strip(), stderr.decode(errors="ignore").strip()
+        code, stdout, stderr = await run_adb_raw(*args, timeout=timeout, priority=priority)
+        return code, stdout.decode(errors="ignore").strip(), stderr.decode(errors="ignore").strip()
     except Exception as e:
         raise RuntimeError(f"Failed to execute ADB command {' '.join(args)}: {str(e)}")
 
 
-async def ensure_adb_server(timeout: Optional[float] = 30.0):
-    """Ensure ADB server is running and accessible"""
+async def run_adb_raw(*args, timeout: Optional[float] = 30.0, priority: int = PRIORITY_NORMAL) -> (int, bytes, bytes):
+    """Execute ADB command and return the undecoded output.
+
+    Commands for a specific device are queued by the scheduler in the quick or bulk lane of
+    that device. They are sent straight to the ADB server over its socket when the native
+    client supports them, otherwise (or if the server cannot be reached) the adb executable is used.
+    """
+    started = time.monotonic()
+    status, received = "failed", 0
     try:
-        command = ["adb", "start-server"]
+        code, stdout, stderr = await _dispatch(args, timeout, priority)
+        status, received = ("ok" if code == 0 else "failed"), len(stdout) + len(stderr)
+        return code, stdout, stderr
+    except TimeoutError:
+        status = "timeout"
+        raise
+    finally:
+        telemetry.observe_adb(args, time.monotonic() - started, status, received)
+
+
+async def _dispatch(args: tuple, timeout: Optional[float], priority: int) -> (int, bytes, bytes):
+    await ensure_adb_server()
+    if len(args) >= 2 and args[0] == "-s":
+        error = supervisor.check_device(args[1])
+        if error:
+            return 1, b"", f"adb: {error}".encode()
+        lane = classify_lane(args, timeout)
+        return await scheduler.run(args[1], lane, lambda: _execute(args, timeout, lane == QUICK_LANE),
+                                   priority, " ".join(args[2:]))
+    return await _execute(args, timeout)
+
+
+async def _execute(args: tuple, timeout: Optional[float], use_session: bool = False) -> (int, bytes, bytes):
+    """Execute ADB command in a shell session or over the native client, falling back to the adb executable"""
+    if use_session and SHELL_SESSIONS_ENABLED and len(args) > 3 and args[2] == "shell" and not args[3].startswith("-"):
+        try:
+            return await shell_sessions.run(args[1], " ".join(args[3:]), timeout)
+        except TimeoutError:
+            raise TimeoutError(f"ADB command timed out after {timeout} seconds: adb {' '.join(args)}")
+        except (ShellSessionError, OSError):
+            # Session could not be started or broke down, run the command on its own
+            pass
+
+    client = get_adb_client()
+    if client is not None:
+        try:
+            result = await asyncio.wait_for(client.run(args), timeout=timeout)
+            if result is not None:
+                return result
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"ADB command timed out after {timeout} seconds: adb {' '.join(args)}")
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            # ADB server went away, have it checked (and restarted) before using the CLI
+            supervisor.mark_unhealthy()
+            await ensure_adb_server()
+    return await _run_adb_cli(*args, timeout=timeout)
+
+
+async def _run_adb_cli(*args, timeout: Optional[float] = 30.0) -> (int, bytes, bytes):
+    """Execute ADB command by spawning the adb executable"""
+    adb_cmd = ["adb"] + list(args)
+    telemetry.count_spawn("adb")
+    proc = await asyncio.create_subprocess_exec(
+        *adb_cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        raise TimeoutError(f"ADB command timed out after {timeout} seconds: {' '.join(adb_cmd)}")
+    except asyncio.CancelledError:
+        # Cancelled through the scheduler or by the caller, do not leave the adb process behind
+        proc.kill()
+        raise
+    return proc.returncode, stdout, stderr
+
+
+class AdbStream:
+    """Stdout of an adb command, read chunk by chunk as it arrives.
+
+    Use as `async with stream_adb(...) as stream: async for chunk in stream`. Leaving the
+    block before the command is done kills it; `returncode` and `stderr` are set once the
+    command has finished on its own. Quick shell commands run in a shell session of the
+    device like with `run_adb`; stopping one early costs that session.
+    """
+
+    def __init__(self, args: tuple, timeout: Optional[float], priority: int, chunk_size: int):
+        self.args = args
+        self.timeout = timeout
+        self.priority = priority
+        self.chunk_size = chunk_size
+        self.returncode: Optional[int] = None
+        self.stderr = b""
+        self.received = 0
+        self._timed_out = False
+        # Bounded, so a slow consumer pauses reading instead of buffering the whole output
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize=16)
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "AdbStream":
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(self):
+        started = time.monotonic()
+        status = "ok"
+        try:
+            await ensure_adb_server()
+            args = self.args
+            if len(args) >= 2 and args[0] == "-s":
+                error = supervisor.check_device(args[1])
+                if error:
+                    self.returncode, self.stderr = 1, f"adb: {error}".encode()
+                    return
+                lane = classify_lane(args, self.timeout)
+                await scheduler.run(args[1], lane, lambda: self._pump(lane == QUICK_LANE), self.priority,
+                                    " ".join(args[2:]))
+            else:
+                await self._pump()
+        except Exception:
+            status = "failed"
+            raise
+        finally:
+            # Stopped by the consumer (returncode None) still counts as ok unless it timed out
+            if self._timed_out:
+                status = "timeout"
+            elif self.returncode not in (None, 0):
+                status = "failed"
+            telemetry.observe_adb(self.args, time.monotonic() - started, status, self.received + len(self.stderr))
+
+    async def _pump(self, use_session: bool = False):
+        if use_session and await self._pump_session():
+            return
+        if await self._pump_native():
+            return
+        telemetry.count_spawn("adb")
         proc = await asyncio.create_subprocess_exec(
-            *command,
+            "adb", *self.args,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
+        stderr_task = asyncio.ensure_future(proc.stderr.read())
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-            if proc.returncode != 0:
-                raise RuntimeError(f"Failed to start ADB server: {stderr.decode(errors='ignore').strip()}")
-        except asyncio.TimeoutError:
-            proc.kill()
-            raise TimeoutError(f"ADB server start timed out after {timeout} seconds")
-    except Exception as e:
-        raise RuntimeError(f"Failed to ensure ADB server is running: {str(e)}")
+            while chunk := await proc.stdout.read(self.chunk_size):
+                self.received += len(chunk)
+                await self._queue.put(chunk)
+            self.stderr = await stderr_task
+            self.returncode = await proc.wait()
+        finally:
+            stderr_task.cancel()
+            if proc.returncode is None:
+                proc.kill()
+
+    async def _pump_session(self) -> bool:
+        """Stream a quick shell command through a shell session; False if no session can run it"""
+        args = self.args
+        if not SHELL_SESSIONS_ENABLED or len(args) < 4 or args[2] != "shell" or args[3].startswith("-"):
+            return False
+        started = False
+
+        async def on_stdout(data: bytes):
+            nonlocal started
+            started = True
+            self.received += len(data)
+            await self._queue.put(data)
+
+        try:
+            self.returncode, _, self.stderr = await shell_sessions.run(args[1], " ".join(args[3:]), self.timeout,
+                                                                       on_stdout)
+            return True
+        except (ShellSessionError, OSError):
+            if started:
+                raise
+            return False
+
+    async def _pump_native(self) -> bool:
+        """Stream a shell command over the native client; False if the adb executable has to be used"""
+        args = self.args
+        client = get_adb_client()
+        if client is None or len(args) < 4 or args[0] != "-s" or args[2] != "shell" or args[3].startswith("-") \
+                or not client.shell_v2_supported(args[1]):
+            return False
+        started = False
+
+        async def on_stdout(data: bytes):
+            nonlocal started
+            started = True
+            self.received += len(data)
+            await self._queue.put(data)
+
+        try:
+            self.returncode, _, self.stderr = await client.shell(args[1], " ".join(args[3:]), on_stdout)
+            return True
+        except (AdbProtocolError, ConnectionError, OSError, asyncio.IncompleteReadError):
+            if started:
+                raise
+            return False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        while not (self._task.done() and self._queue.empty()):
+            getter = asyncio.ensure_future(self._queue.get())
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({getter, self._task}, timeout=remaining,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result()
+                continue
+            getter.cancel()
+            if not done:
+                self._timed_out = True
+                await self.close()
+                raise TimeoutError(f"ADB command timed out after {self.timeout} seconds: adb {' '.join(self.args)}")
+        # Scheduler cancellations and spawn failures surface here
+        self._task.result()
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+def stream_adb(*args, timeout: Optional[float] = 30.0, priority: int = PRIORITY_NORMAL,
+               chunk_size: int = 64 * 1024) -> AdbStream:
+    """Execute ADB command and stream its stdout in chunks instead of buffering it"""
+    return AdbStream(args, timeout, priority, chunk_size)
+
+
+@dataclass
+class AdbOutput:
+    code: int
+    stdout: str
+    stderr: str
+    total_bytes: int
+    truncated: bool = False
+    stopped_early: bool = False
+    spill_path: Optional[str] = None
+
+
+async def run_adb_bounded(*args, max_bytes: int = 1024 * 1024, spill_threshold: Optional[int] = None,
+                          until: Optional[Callable[[str], bool]] = None, timeout: Optional[float] = 30.0,
+                          priority: int = PRIORITY_NORMAL) -> AdbOutput:
+    """Execute ADB command while holding at most `max_bytes` of its output in memory.
+
+    Output beyond `max_bytes` keeps its head and tail with a truncation marker in between.
+    With `spill_threshold`, output larger than that is also written in full to a temp file
+    whose path is returned. With `until`, the command is stopped at the first output line
+    the predicate accepts, so callers can stop reading once they found what they need.
+    """
+    head, tail = bytearray(), deque()
+    tail_size, total = 0, 0
+    half = max(1, max_bytes // 2)
+    pending = bytearray()
+    spill = None
+    partial = b""
+    stopped_early = False
+    try:
+        async with stream_adb(*args, timeout=timeout, priority=priority) as stream:
+            async for chunk in stream:
+                total += len(chunk)
+                if spill_threshold is not None:
+                    if spill is None:
+                        pending += chunk
+                        if len(pending) > spill_threshold:
+                            spill = tempfile.NamedTemporaryFile(prefix="adb-output-", suffix=".txt", delete=False)
+                            spill.write(pending)
+                            pending = bytearray()
+                    else:
+                        spill.write(chunk)
+                rest = chunk
+                if len(head) < half:
+                    taken = half - len(head)
+                    head += rest[:taken]
+                    rest = rest[taken:]
+                if rest:
+                    tail.append(rest)
+                    tail_size += len(rest)
+                    while tail_size - len(tail[0]) >= half:
+                        tail_size -= len(tail.popleft())
+                if until:
+                    lines = (partial + chunk).split(b"\n")
+                    partial = lines.pop()
+                    if any(until(line.decode(errors="ignore")) for line in lines):
+                        stopped_early = True
+                        break
+            code = stream.returncode if stream.returncode is not None else 0
+            stderr = stream.stderr
+    finally:
+        if spill:
+            spill.close()
+    if until and not stopped_early and partial and until(partial.decode(errors="ignore")):
+        stopped_early = True
+
+    tail_bytes = b"".join(tail)
+    truncated = len(head) + len(tail_bytes) < total
+    if truncated:
+        tail_bytes = tail_bytes[-half:]
+        skipped = total - len(head) - len(tail_bytes)
+        stdout = bytes(head) + f"\n... [{skipped} bytes truncated] ...\n".encode() + tail_bytes
+    else:
+        stdout = bytes(head) + tail_bytes
+    return AdbOutput(code, stdout.decode(errors="ignore").strip(), stderr.decode(errors="ignore").strip(), total,
+                     truncated, stopped_early, spill.name if spill else None)
+
+
+async def ensure_adb_server(timeout: Optional[float] = 30.0):
+    """Ensure ADB server is running and accessible, using the cached health of the supervisor"""
+    await supervisor.ensure_server(timeout)
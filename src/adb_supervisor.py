@@ -0,0 +1,175 @@
+import asyncio
+import sys
+import time
+from typing import Callable, Optional
+
+from src.adb_client import get_adb_client
+from src.telemetry import telemetry
+
+# States in which a device cannot serve any transport request
+UNAVAILABLE_STATES = ("offline", "unauthorized", "connecting", "authorizing", "no permissions")
+
+DeviceListener = Callable[[str, Optional[str], Optional[str]], None]
+
+
+class AdbServerSupervisor:
+    """Keeps the ADB server alive and mirrors its device list in memory.
+
+    Server health is checked once and cached until a connection to the server fails.
+    While the native client is enabled, a `host:track-devices` stream keeps the state
+    of every connected device up to date without polling.
+    """
+
+    def __init__(self, retry_delay: float = 1.0, max_retry_delay: float = 10.0):
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.healthy = False
+        self.checked_at: Optional[float] = None
+        self.devices: dict[str, str] = {}
+        self._tracking = False
+        self._tracker: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._listeners: list[DeviceListener] = []
+
+    @property
+    def is_tracking(self) -> bool:
+        """True while the device registry reflects a live track-devices stream"""
+        return self._tracking
+
+    def add_listener(self, listener: DeviceListener):
+        """Register a callback invoked with (serial, old_state, new_state) on every change"""
+        self._listeners.append(listener)
+
+    def device_state(self, serial: str) -> Optional[str]:
+        return self.devices.get(serial)
+
+    def mark_unhealthy(self):
+        """Force the next ensure_server() call to check (and restart) the server"""
+        self.healthy = False
+
+    async def ensure_server(self, timeout: Optional[float] = 30.0):
+        if self.healthy:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.healthy:
+                return
+            if not await self._ping():
+                await start_adb_server(timeout)
+            self.healthy = True
+            self.checked_at = time.monotonic()
+            self._start_tracker()
+
+    async def _ping(self) -> bool:
+        client = get_adb_client()
+        if client is None:
+            return False
+        try:
+            await asyncio.wait_for(client.server_version(), timeout=2.0)
+            return True
+        except Exception:
+            return False
+
+    def _start_tracker(self):
+        if get_adb_client() is None or (self._tracker and not self._tracker.done()):
+            return
+        self._tracker = asyncio.get_running_loop().create_task(self._track_devices())
+
+    async def _track_devices(self):
+        client = get_adb_client()
+        delay = self.retry_delay
+        while True:
+            conn = None
+            try:
+                conn = await client.pool.connect()
+                await conn.send_request("host:track-devices")
+                delay = self.retry_delay
+                while True:
+                    self._update(_parse_device_list(await conn.read_string()))
+                    self._tracking = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[adb] Device tracking interrupted: {e}", file=sys.stderr)
+            finally:
+                self._tracking = False
+                if conn:
+                    conn.close()
+
+            self.mark_unhealthy()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+            try:
+                await self.ensure_server()
+            except Exception as e:
+                print(f"[adb] Failed to restart ADB server: {e}", file=sys.stderr)
+
+    def _update(self, devices: dict[str, str]):
+        previous, self.devices = self.devices, devices
+        for serial in previous.keys() | devices.keys():
+            old, new = previous.get(serial), devices.get(serial)
+            if old == new:
+                continue
+            if new is None:
+                client = get_adb_client()
+                if client:
+                    client.pool.discard(serial)
+            for listener in self._listeners:
+                try:
+                    listener(serial, old, new)
+                except Exception as e:
+                    print(f"[adb] Device listener failed for '{serial}': {e}", file=sys.stderr)
+
+    def check_device(self, serial: str) -> Optional[str]:
+        """Return an error message if the registry knows the device cannot be reached"""
+        if not self._tracking:
+            return None
+        state = self.devices.get(serial)
+        if state is None:
+            return f"device '{serial}' not found"
+        if state in UNAVAILABLE_STATES:
+            return f"device '{serial}' is {state}"
+        return None
+
+    async def stop(self):
+        if self._tracker:
+            self._tracker.cancel()
+            try:
+                await self._tracker
+            except asyncio.CancelledError:
+                pass
+            self._tracker = None
+
+
+def _parse_device_list(output: str) -> dict[str, str]:
+    devices = {}
+    for line in output.splitlines():
+        parts = line.strip().split("\t")
+        if len(parts) >= 2:
+            devices[parts[0]] = parts[1]
+    return devices
+
+
+async def start_adb_server(timeout: Optional[float] = 30.0):
+    """Start the ADB server with `adb start-server`"""
+    try:
+        command = ["adb", "start-server"]
+        telemetry.count_spawn("start-server")
+        proc = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+            if proc.returncode != 0:
+                raise RuntimeError(f"Failed to start ADB server: {stderr.decode(errors='ignore').strip()}")
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise TimeoutError(f"ADB server start timed out after {timeout} seconds")
+    except Exception as e:
+        raise RuntimeError(f"Failed to ensure ADB server is running: {str(e)}")
+
+
+supervisor = AdbServerSupervisor()
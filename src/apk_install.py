@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import shlex
+import struct
+import sys
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from src.adb_manager import run_adb
+from src.app_inventory import app_inventory
+from src.fan_out import fan_out, DEFAULT_PER_HOST_LIMIT
+from src.result_cache import result_cache
+
+# Binary XML chunk types and the resource ids of the manifest attributes we read
+RES_XML_TYPE = 0x0003
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_XML_START_ELEMENT_TYPE = 0x0102
+UTF8_FLAG = 0x100
+TYPE_STRING = 0x03
+ATTR_VERSION_CODE = 0x0101021b
+ATTR_VERSION_NAME = 0x0101021c
+
+
+@dataclass
+class ApkManifest:
+    package: str
+    version_code: int
+    version_name: str = ""
+
+
+def _decode_string_pool(data: bytes, offset: int) -> list[str]:
+    header_size, = struct.unpack_from("<H", data, offset + 2)
+    count, _, flags, strings_start = struct.unpack_from("<IIII", data, offset + 8)
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    base = offset + strings_start
+    strings = []
+    for string_offset in offsets:
+        position = base + string_offset
+        if flags & UTF8_FLAG:
+            # Length in characters, then in bytes, each 1 or 2 bytes long
+            for _ in range(2):
+                length = data[position]
+                position += 1
+                if length & 0x80:
+                    length = ((length & 0x7f) << 8) | data[position]
+                    position += 1
+            strings.append(data[position:position + length].decode("utf-8", errors="replace"))
+        else:
+            length, = struct.unpack_from("<H", data, position)
+            position += 2
+            if length & 0x8000:
+                low, = struct.unpack_from("<H", data, position)
+                length = ((length & 0x7fff) << 16) | low
+                position += 2
+            strings.append(data[position:position + length * 2].decode("utf-16-le", errors="replace"))
+    return strings
+
+
+def parse_binary_manifest(data: bytes) -> ApkManifest:
+    """Read package, versionCode and versionName from a compiled AndroidManifest.xml"""
+    if len(data) < 8 or struct.unpack_from("<H", data, 0)[0] != RES_XML_TYPE:
+        raise ValueError("not a binary XML document")
+    strings: list[str] = []
+    resource_ids: tuple = ()
+    offset = struct.unpack_from("<H", data, 2)[0]
+    while offset + 8 <= len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from("<HHI", data, offset)
+        if chunk_size < 8:
+            break
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _decode_string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f"<{(chunk_size - header_size) // 4}I", data, offset + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            # The first element is <manifest>
+            name_index, = struct.unpack_from("<I", data, offset + 20)
+            if strings[name_index] != "manifest":
+                raise ValueError(f"unexpected root element '{strings[name_index]}'")
+            attribute_start, attribute_size, attribute_count = struct.unpack_from("<HHH", data, offset + 24)
+            values = {}
+            for index in range(attribute_count):
+                position = offset + header_size + attribute_start + index * attribute_size
+                _, name, raw, _, _, data_type, value = struct.unpack_from("<IIIHBBI", data, position)
+                # Obfuscated manifests drop attribute names, the resource ids still identify them
+                key = resource_ids[name] if name < len(resource_ids) and resource_ids[name] else strings[name]
+                values[key] = strings[value] if data_type == TYPE_STRING else (
+                    strings[raw] if raw != 0xffffffff else value)
+            if "package" not in values or ATTR_VERSION_CODE not in values:
+                raise ValueError("manifest has no package or versionCode")
+            version_name = values.get(ATTR_VERSION_NAME, "")
+            return ApkManifest(str(values["package"]), int(values[ATTR_VERSION_CODE]),
+                               version_name if isinstance(version_name, str) else "")
+        offset += chunk_size
+    raise ValueError("manifest element not found")
+
+
+def read_apk_manifest(apk_path: str) -> Optional[ApkManifest]:
+    """Manifest of an APK, or None if it cannot be read"""
+    try:
+        with zipfile.ZipFile(apk_path) as apk:
+            return parse_binary_manifest(apk.read("AndroidManifest.xml"))
+    except (zipfile.BadZipFile, KeyError, IndexError, ValueError, struct.error) as e:
+        print(f"Failed to read manifest of '{apk_path}': {str(e)}", file=sys.stderr)
+        return None
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class ApkBuild:
+    """One app build: the base APK plus its splits, identified by their content hashes"""
+    paths: list[str]
+    manifest: Optional[ApkManifest]
+    sha256s: list[str]
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256("".join(sorted(self.sha256s)).encode()).hexdigest()
+
+
+# Builds keyed by (path, size, mtime) of their files, so a CI step re-running against the same files hashes once
+_builds: dict[tuple, ApkBuild] = {}
+
+# (serial, package) -> (build digest, lastUpdateTime) of what this server verified on the device
+_installed: dict[tuple[str, str], tuple[str, str]] = {}
+
+
+def _load_build(apk_paths: list[str]) -> ApkBuild:
+    key = tuple((path, Path(path).stat().st_size, Path(path).stat().st_mtime_ns) for path in apk_paths)
+    if key not in _builds:
+        _builds[key] = ApkBuild(list(apk_paths), read_apk_manifest(apk_paths[0]),
+                                [_sha256(path) for path in apk_paths])
+    return _builds[key]
+
+
+async def load_build(apk_path: str, split_apk_paths: Optional[list[str]] = None) -> ApkBuild:
+    paths = [str(Path(path).expanduser()) for path in [apk_path, *(split_apk_paths or [])]]
+    for path in paths:
+        if not Path(path).is_file():
+            raise FileNotFoundError(f"APK file '{path}' does not exist")
+    return await asyncio.to_thread(_load_build, paths)
+
+
+async def installed_sha256s(serial: str, package: str) -> list[str]:
+    """SHA-256 of every APK file of an installed package, hashed on the device"""
+    code, out, err = await run_adb("-s", serial, "shell",
+                                   f"pm path {shlex.quote(package)} | sed 's/^package://' | xargs sha256sum",
+                                   timeout=120)
+    if code != 0:
+        return []
+    return [line.split()[0] for line in out.splitlines() if line.strip()]
+
+
+async def is_build_installed(serial: str, build: ApkBuild) -> bool:
+    """True only if the device has exactly this build; failed probes and missing metadata mean it does not"""
+    if build.manifest is None:
+        return False
+    package = build.manifest.package
+    try:
+        record = await app_inventory.get(serial, package)
+        if record is None or not record.installed or record.version_code != build.manifest.version_code \
+                or not record.last_update_time:
+            return False
+        if _installed.get((serial, package)) == (build.digest, record.last_update_time):
+            return True
+        # Same versionCode can still be a different build, compare the actual APK contents
+        if sorted(await installed_sha256s(serial, package)) != sorted(build.sha256s):
+            return False
+    except Exception as e:
+        print(f"Failed to check installed build of '{package}' on device '{serial}': {str(e)}", file=sys.stderr)
+        return False
+    _installed[(serial, package)] = (build.digest, record.last_update_time)
+    return True
+
+
+async def install_build(serial: str, build: ApkBuild, force: bool = False) -> dict:
+    """Install a build unless the device already has exactly that build"""
+    started = time.monotonic()
+    package = build.manifest.package if build.manifest else None
+    version_code = build.manifest.version_code if build.manifest else None
+    if not force and await is_build_installed(serial, build):
+        return {'action': 'skipped', 'package': package, 'versionCode': version_code,
+                'reason': 'build already installed', 'elapsed_ms': round((time.monotonic() - started) * 1000, 1)}
+
+    app_inventory.invalidate(serial)
+    result_cache.invalidate(serial)
+    _installed.pop((serial, package), None)
+    command = "install-multiple" if len(build.paths) > 1 else "install"
+    code, out, err = await run_adb("-s", serial, command, "-r", *build.paths, timeout=600)
+    if code != 0 or "Failure" in out:
+        raise RuntimeError(f"adb failed to install app using apk: {(err.strip() or out.strip())}")
+    return {'action': 'installed', 'package': package, 'versionCode': version_code,
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)}
+
+
+async def install_apks_multi(apk_path: str, split_apk_paths: Optional[list[str]] = None,
+                             serials: Optional[list[str]] = None, max_parallel: int = 8,
+                             timeout: Optional[float] = 300.0, force: bool = False,
+                             per_host_limit: int = DEFAULT_PER_HOST_LIMIT) -> dict:
+    """Install one build on many devices at once, skipping devices that already have it"""
+    build = await load_build(apk_path, split_apk_paths)
+    package = build.manifest.package if build.manifest else None
+    version_code = build.manifest.version_code if build.manifest else None
+    result = await fan_out(serials, lambda serial: install_build(serial, build, force), max_parallel=max_parallel,
+                           per_host_limit=per_host_limit, timeout=timeout)
+    actions = [device['output'].get('action') for device in result['devices'].values() if device['status'] == "ok"]
+    result['summary'].update(installed=actions.count('installed'), skipped=actions.count('skipped'))
+    result['build'] = {'package': package, 'versionCode': version_code,
+                       'versionName': build.manifest.version_name if build.manifest else None, 'sha256': build.digest}
+    return result
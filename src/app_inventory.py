@@ -0,0 +1,246 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.adb_manager import run_adb, stream_adb
+from src.adb_supervisor import supervisor
+
+INVENTORY_MARKER = "@@inventory"
+
+# The package list is re-checked at most this often, in seconds
+CHANGE_CHECK_INTERVAL = 5.0
+
+# `pm list packages --show-versioncode` changes on every install, update and uninstall
+FINGERPRINT_COMMAND = "pm list packages --show-versioncode | md5sum"
+
+PACKAGE_HEADER = re.compile(r"Package \[([^\]]+)\]")
+KEY_VALUE = re.compile(r"(\w+)=(\S+)")
+FULL_LINE_KEYS = ("versionName", "firstInstallTime", "lastUpdateTime", "installerPackageName")
+FLAG_KEYS = ("flags", "pkgFlags", "privateFlags")
+PERMISSION_SECTIONS = {
+    "requested permissions:": "requested",
+    "install permissions:": "granted",
+    "runtime permissions:": "granted",
+}
+
+
+@dataclass
+class AppRecord:
+    package: str
+    version_name: str = ""
+    version_code: Optional[int] = None
+    min_sdk: Optional[int] = None
+    target_sdk: Optional[int] = None
+    first_install_time: str = ""
+    last_update_time: str = ""
+    installer: str = ""
+    code_path: str = ""
+    flags: list[str] = field(default_factory=list)
+    installed: bool = True
+    enabled: Optional[int] = None
+    requested_permissions: list[str] = field(default_factory=list)
+    granted_permissions: list[str] = field(default_factory=list)
+
+    @property
+    def system(self) -> bool:
+        return "SYSTEM" in self.flags
+
+    def details(self) -> dict:
+        return {
+            'package': self.package,
+            'versionName': self.version_name,
+            'versionCode': self.version_code,
+            'minSdk': self.min_sdk,
+            'targetSdk': self.target_sdk,
+            'firstInstallTime': self.first_install_time,
+            'lastUpdateTime': self.last_update_time,
+            'installerPackageName': self.installer,
+            'codePath': self.code_path,
+            'system': self.system,
+            'enabled': self.enabled,
+            'flags': self.flags,
+            'requestedPermissions': self.requested_permissions,
+            'grantedPermissions': self.granted_permissions,
+        }
+
+
+def _int(value: str) -> Optional[int]:
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+class DumpsysPackageParser:
+    """Line-by-line parser of the `Packages:` section of `dumpsys package`"""
+
+    def __init__(self):
+        self.records: dict[str, AppRecord] = {}
+        self._in_packages = False
+        self._record: Optional[AppRecord] = None
+        self._user: Optional[str] = None
+        self._section: Optional[str] = None
+        self._section_indent = 0
+        self._header_indent = 0
+
+    def feed(self, line: str):
+        stripped = line.strip()
+        if not stripped:
+            return
+        indent = len(line) - len(line.lstrip())
+        if indent == 0:
+            # Hidden system packages and the other top-level sections are not installed packages
+            self._in_packages = stripped == "Packages:"
+            self._record = None
+            return
+        if not self._in_packages:
+            return
+
+        header = PACKAGE_HEADER.match(stripped)
+        if header and indent <= 2:
+            self._record = self.records[header.group(1)] = AppRecord(header.group(1))
+            self._header_indent = indent
+            self._user = None
+            self._section = None
+            return
+        record = self._record
+        if record is None:
+            return
+
+        if self._section:
+            if indent > self._section_indent:
+                self._feed_permission(record, stripped)
+                return
+            self._section = None
+
+        if stripped in PERMISSION_SECTIONS:
+            self._section = PERMISSION_SECTIONS[stripped]
+            self._section_indent = indent
+            # Runtime grants are listed for every user, only the primary one is kept
+            if stripped == "runtime permissions:" and self._user != "0":
+                self._section = "ignored"
+        elif stripped.startswith("User "):
+            self._user = stripped[5:].split(":", 1)[0]
+            if self._user == "0":
+                values = dict(KEY_VALUE.findall(stripped))
+                record.installed = values.get("installed", "true") == "true"
+                record.enabled = _int(values.get("enabled", ""))
+        elif "=" in stripped and indent <= self._header_indent + 2:
+            self._feed_values(record, stripped)
+
+    def _feed_permission(self, record: AppRecord, line: str):
+        name = line.split(":", 1)[0].strip()
+        if self._section == "requested":
+            record.requested_permissions.append(name)
+        elif self._section == "granted" and "granted=true" in line and name not in record.granted_permissions:
+            record.granted_permissions.append(name)
+
+    @staticmethod
+    def _feed_values(record: AppRecord, line: str):
+        key, value = line.split("=", 1)
+        if key in FULL_LINE_KEYS:
+            attribute = {'versionName': 'version_name', 'firstInstallTime': 'first_install_time',
+                         'lastUpdateTime': 'last_update_time', 'installerPackageName': 'installer'}[key]
+            setattr(record, attribute, value.strip())
+            return
+        if key in FLAG_KEYS:
+            for flag in value.strip("[] ").split():
+                if flag not in record.flags:
+                    record.flags.append(flag)
+            return
+        for key, value in KEY_VALUE.findall(line):
+            if key == "versionCode":
+                record.version_code = _int(value)
+            elif key == "minSdk":
+                record.min_sdk = _int(value)
+            elif key == "targetSdk":
+                record.target_sdk = _int(value)
+            elif key == "codePath":
+                record.code_path = value
+
+
+@dataclass
+class _Inventory:
+    fingerprint: str
+    records: dict[str, AppRecord]
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+class AppInventory:
+    """Per-device index of installed packages, built from one `dumpsys package packages` pass.
+
+    The index is reused as long as the fingerprint of the package list is unchanged, which
+    is re-checked with one cheap shell command at most every `check_interval` seconds.
+    Installs and uninstalls made through this server drop the index right away.
+    """
+
+    def __init__(self, check_interval: float = CHANGE_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._inventories: dict[str, _Inventory] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def records(self, serial: str) -> dict[str, AppRecord]:
+        async with self._locks.setdefault(serial, asyncio.Lock()):
+            inventory = self._inventories.get(serial)
+            if inventory is not None:
+                if time.monotonic() - inventory.checked_at < self.check_interval:
+                    return inventory.records
+                code, out, err = await run_adb("-s", serial, "shell", FINGERPRINT_COMMAND)
+                if code == 0 and out.split()[:1] == [inventory.fingerprint]:
+                    inventory.checked_at = time.monotonic()
+                    return inventory.records
+            inventory = self._inventories[serial] = await self._build(serial)
+            return inventory.records
+
+    @staticmethod
+    async def _build(serial: str) -> _Inventory:
+        # The dump runs to megabytes, so it is parsed line by line as it streams in instead of buffered
+        parser = DumpsysPackageParser()
+        head: list[str] = []
+        fingerprint: Optional[str] = None
+        partial = b""
+
+        def feed(raw: bytes):
+            nonlocal fingerprint
+            line = raw.decode(errors="ignore").rstrip("\r")
+            if fingerprint is not None:
+                parser.feed(line)
+            elif line.strip() == INVENTORY_MARKER:
+                words = " ".join(head).split()
+                fingerprint = words[0] if words else ""
+            else:
+                head.append(line)
+
+        async with stream_adb("-s", serial, "shell",
+                              f"{FINGERPRINT_COMMAND}; echo {INVENTORY_MARKER}; dumpsys package packages",
+                              timeout=120) as stream:
+            async for chunk in stream:
+                lines = (partial + chunk).split(b"\n")
+                partial = lines.pop()
+                for raw in lines:
+                    feed(raw)
+            if partial:
+                feed(partial)
+        if stream.returncode != 0 or fingerprint is None:
+            error = stream.stderr.decode(errors="ignore").strip() or "\n".join(head).strip()
+            raise RuntimeError(f"adb failed to read package inventory: {error}")
+        return _Inventory(fingerprint, parser.records)
+
+    async def get(self, serial: str, package: str) -> Optional[AppRecord]:
+        return (await self.records(serial)).get(package)
+
+    def invalidate(self, serial: str):
+        self._inventories.pop(serial, None)
+
+
+app_inventory = AppInventory()
+
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]):
+    if new_state != "device":
+        app_inventory.invalidate(serial)
+
+
+supervisor.add_listener(_on_device_change)
@@ -1,41 +1,33 @@
 import json
+from typing import Optional
 
 from src.adb_manager import run_adb
+from src.apk_install import load_build, install_build
+from src.app_inventory import app_inventory
+from src.result_cache import coalesced, result_cache
 
 
+@coalesced("get_app_details")
 async def get_app_details(serial: str, app_package_name: str):
     """Get details of an installed application by app name or package name"""
     try:
-        code, app_details_out, err = await run_adb("-s", serial, "shell", "dumpsys", "package", app_package_name)
-        if code != 0:
-            raise RuntimeError(f"adb failed to get package details: {err.strip()}")
-        else:
-            info = {}
-            lines = app_details_out.split('\n')
-            for line in lines:
-                line = line.strip()
-                if 'versionName=' in line:
-                    info['versionName'] = line.split('versionName=')[1].split()[0]
-                elif 'targetSdk=' in line:
-                    info['targetSdk'] = line.split('targetSdk=')[1].split()[0]
-                elif 'firstInstallTime=' in line:
-                    info['firstInstallTime'] = line.split('firstInstallTime=')[1].split()[0]
-                elif 'lastUpdateTime=' in line:
-                    info['lastUpdateTime'] = line.split('lastUpdateTime=')[1].split()[0]
-
-            return json.dumps(info, indent=4)
+        record = await app_inventory.get(serial, app_package_name)
+        if record is None:
+            raise RuntimeError(f"package '{app_package_name}' is not installed")
+        return json.dumps(record.details(), indent=4)
     except Exception as e:
         return f"Failed to get package/app details for device '{serial}': {str(e)}"
 
 
-async def install_app(serial: str, apk_path: str):
-    """Install an app in an Android device using apk."""
+async def install_app(serial: str, apk_path: str, split_apk_paths: Optional[list[str]] = None, force: bool = False):
+    """Install an app in an Android device using apk, unless that exact build is already installed."""
     try:
-        code, app_details_out, err = await run_adb("-s", serial, "install", apk_path)
-        if code != 0:
-            raise RuntimeError(f"adb failed to install app using apk: {err.strip()}")
-        else:
-            return f"App installed successfully in device '{serial}'"
+        build = await load_build(apk_path, split_apk_paths)
+        result = await install_build(serial, build, force)
+        if result['action'] == 'skipped':
+            return (f"App '{result['package']}' (versionCode {result['versionCode']}) is already installed "
+                    f"in device '{serial}', skipped")
+        return f"App installed successfully in device '{serial}'"
     except Exception as e:
         return f"Failed to install app using apk: {serial}: {str(e)}"
 
@@ -43,6 +35,8 @@ async def install_app(serial: str, apk_path: str):
 async def uninstall_app(serial: str, app_package_name: str):
     """Uninstall an app from an Android device using app or package name"""
     try:
+        app_inventory.invalidate(serial)
+        result_cache.invalidate(serial)
         code, app_details_out, err = await run_adb("-s", serial, "uninstall", app_package_name)
         if code != 0:
             raise RuntimeError(f"adb failed to uninstall app: {err.strip()}")
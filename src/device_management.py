@@ -2,86 +2,196 @@ import asyncio
 from pathlib import Path
 from typing import Optional
 
-from src.adb_manager import run_adb
-from src.file_system import pull_file, remove_file
-
-
-async def list_devices(timeout: Optional[float] = 5.0):
+from src.adb_manager import run_adb, run_adb_bounded, ensure_adb_server
+from src.adb_supervisor import supervisor
+from src.app_inventory import app_inventory
+from src.log_files import RotatingLogWriter
+from src.network_probe import network_probe
+from src.property_cache import BOOT_ID_PATH, property_cache
+from src.result_cache import coalesced, result_cache
+from src.scheduler import PRIORITY_NORMAL
+from src.screen_capture import screenshot_bytes
+from src.screen_recorder import ScreenRecorder, default_recording_path
+from src.telemetry import telemetry
+from src.ui_hierarchy import fetch_ui_hierarchy, refresh_hierarchy
+
+
+# Sections of the combined probe run on each device by list_devices, one shell round-trip per device
+DEVICE_PROBES = {
+    'props': "getprop",
+    'battery': "dumpsys battery",
+}
+PROBE_MARKER = "@@probe:"
+
+
+@coalesced("list_devices")
+async def list_devices(timeout: Optional[float] = 5.0, max_concurrency: int = 8, device_timeout: float = 10.0):
     """List connected Android devices with detailed information"""
     try:
+        await ensure_adb_server()
+        if supervisor.is_tracking:
+            # Device registry is kept up to date by the track-devices stream
+            return await device_details("\n".join(f"{s}\t{state}" for s, state in supervisor.devices.items()),
+                                        max_concurrency, device_timeout)
+
         code, list_devices_out, err = await run_adb("devices", "-l", timeout=timeout)
         if code != 0:
             raise RuntimeError(f"Failed to list devices: {err.strip()}")
         else:
-            return await device_details(list_devices_out)
+            return await device_details(list_devices_out, max_concurrency, device_timeout)
     except Exception as e:
         return f"Failed to list Android devices: {str(e)}"
 
 
-async def device_details(output: str):
-    devices = []
-    serial = None
+async def device_details(output: str, max_concurrency: int = 8, device_timeout: float = 10.0):
+    """Probe all devices of an `adb devices` listing concurrently"""
+    entries = []
     for line in output.splitlines():
         line = line.strip()
         if not line or line.startswith("List of devices"):
             continue
+        parts = line.split()
+        entries.append((parts[0], parts[1] if len(parts) > 1 else 'Unknown'))
 
-        try:
-            info = {}
-            parts = line.split()
-            serial = parts[0]
-
-            code, properties_out, err = await run_adb("-s", serial, "shell", "getprop")
-            if code == 0 and properties_out:
-                props = {}
-                for line in properties_out.split('\n'):
-                    if line.strip() and '[' in line and ']:' in line:
-                        key = line.split('[')[1].split(']')[0]
-                        value = line.split(']: [')[1].rstrip(']')
-                        props[key] = value
-
-                # OS Information
-                info['os'] = {
-                    'android_version': props.get('ro.build.version.release', 'Unknown'),
-                    'api_level': props.get('ro.build.version.sdk', 'Unknown'),
-                    'security_patch': props.get('ro.build.version.security_patch', 'Unknown'),
-                    'build_number': props.get('ro.build.display.id', 'Unknown'),
-                    'build_date': props.get('ro.build.date', 'Unknown')
-                }
-
-                code, serial_no_out, err = await run_adb("-s", serial, "get-serialno")
-                code, device_state_out, err = await run_adb("-s", serial, "get-state")
-
-                # Device Information
-                info['device'] = {
-                    'model': props.get('ro.product.model', 'Unknown'),
-                    'manufacturer': props.get('ro.product.manufacturer', 'Unknown'),
-                    'brand': props.get('ro.product.brand', 'Unknown'),
-                    'device_name': props.get('ro.product.device', 'Unknown'),
-                    'serial': serial_no_out,
-                    'state': device_state_out
-                }
-
-                # Hardware Information
-                info['hardware'] = {
-                    'cpu_abi': props.get('ro.product.cpu.abi', 'Unknown'),
-                    'hardware': props.get('ro.hardware', 'Unknown'),
-                }
-
-            info['battery'] = await get_battery_details(serial)
-            info['network'] = await get_network_details(serial)
-            devices.append(info)
-        except Exception as e:
-            print(f"Failed to get details for device {serial}: {str(e)}")
-            continue
-    return devices
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def probe(serial: str, state: str):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(probe_device(serial, state), timeout=device_timeout)
+            except asyncio.TimeoutError:
+                return {'device': {'serial': serial, 'state': state},
+                        'error': f"Timed out after {device_timeout} seconds"}
+            except Exception as e:
+                print(f"Failed to get details for device {serial}: {str(e)}")
+                return {'device': {'serial': serial, 'state': state}, 'error': str(e)}
+
+    return list(await asyncio.gather(*(probe(serial, state) for serial, state in entries)))
+
+
+async def probe_device(serial: str, state: str = "device"):
+    """Collect properties, battery and network details of a device in a single shell invocation.
+
+    Boot-scoped properties and recently read battery/network details are served from the
+    property cache; only the missing sections are requested from the device.
+    """
+    if state != "device":
+        return {'device': {'serial': serial, 'state': state}}
+
+    cached = property_cache.get_props(serial)
+    battery = property_cache.get_volatile(serial, 'battery')
+    network = property_cache.get_volatile(serial, 'network')
+
+    probes = {}
+    if cached is None:
+        probes['boot_id'] = f"cat {BOOT_ID_PATH}"
+        probes['props'] = DEVICE_PROBES['props']
+    elif not supervisor.is_tracking:
+        # Without the device tracker a reboot may have gone unnoticed, re-read props only if boot_id changed
+        probes['boot_id'] = f"cat {BOOT_ID_PATH}"
+        probes['props'] = f"[ \"$(cat {BOOT_ID_PATH})\" = '{cached[0]}' ] || getprop"
+    if battery is None:
+        probes['battery'] = DEVICE_PROBES['battery']
+    network_commands = network_probe.batch_commands(serial) if network is None else {}
+    for field, command in network_commands.items():
+        probes[f"network_{field}"] = command
+
+    sections = await run_probe_script(serial, probes) if probes else {}
+
+    props = parse_getprop(sections.get('props', ''))
+    boot_id = sections.get('boot_id', '').strip()
+    if props and boot_id:
+        property_cache.set_props(serial, boot_id, props)
+    elif cached is not None:
+        props = cached[1]
+
+    if battery is None:
+        battery = parse_battery(sections.get('battery', ''))
+        if battery != 'Unknown':
+            property_cache.set_volatile(serial, 'battery', battery)
+    if network is None:
+        # Only a source that did not work costs another round-trip
+        network = await network_probe.details(serial, {field: sections.get(f"network_{field}", '')
+                                                       for field in network_commands})
+        property_cache.set_volatile(serial, 'network', network)
+
+    info = {}
+    if props:
+        info.update(props_details(props))
+        info['device']['serial'] = serial
+        info['device']['state'] = state
+
+    info['battery'] = battery
+    info['network'] = network
+    return info
+
+
+async def run_probe_script(serial: str, probes: dict[str, str], timeout: Optional[float] = 30.0,
+                           priority: int = PRIORITY_NORMAL) -> dict[str, str]:
+    """Run several shell commands in one round-trip and split their output by section"""
+    script = "; ".join(f"echo '{PROBE_MARKER}{name}'; {command} 2>/dev/null" for name, command in probes.items())
+    code, out, err = await run_adb("-s", serial, "shell", script, timeout=timeout, priority=priority)
+    if not out:
+        raise RuntimeError(f"adb probe failed: {err.strip()}")
+
+    sections = {}
+    name = None
+    lines = []
+    for line in out.split('\n'):
+        if line.startswith(PROBE_MARKER):
+            if name is not None:
+                sections[name] = "\n".join(lines).strip()
+            name, lines = line[len(PROBE_MARKER):].strip(), []
+        elif name is not None:
+            lines.append(line)
+    if name is not None:
+        sections[name] = "\n".join(lines).strip()
+    return sections
+
+
+def parse_getprop(properties_out: str) -> dict[str, str]:
+    props = {}
+    for line in properties_out.split('\n'):
+        if line.strip() and '[' in line and ']:' in line:
+            key = line.split('[')[1].split(']')[0]
+            value = line.split(']: [')[1].rstrip().rstrip(']')
+            props[key] = value
+    return props
+
+
+def props_details(props: dict[str, str]) -> dict:
+    return {
+        # OS Information
+        'os': {
+            'android_version': props.get('ro.build.version.release', 'Unknown'),
+            'api_level': props.get('ro.build.version.sdk', 'Unknown'),
+            'security_patch': props.get('ro.build.version.security_patch', 'Unknown'),
+            'build_number': props.get('ro.build.display.id', 'Unknown'),
+            'build_date': props.get('ro.build.date', 'Unknown')
+        },
+        # Device Information
+        'device': {
+            'model': props.get('ro.product.model', 'Unknown'),
+            'manufacturer': props.get('ro.product.manufacturer', 'Unknown'),
+            'brand': props.get('ro.product.brand', 'Unknown'),
+            'device_name': props.get('ro.product.device', 'Unknown'),
+        },
+        # Hardware Information
+        'hardware': {
+            'cpu_abi': props.get('ro.product.cpu.abi', 'Unknown'),
+            'hardware': props.get('ro.hardware', 'Unknown'),
+        },
+    }
 
 
 async def get_battery_details(serial: str):
     code, dumpsys_battery_out, err = await run_adb("-s", serial, "shell", "dumpsys", "battery")
-    if code != 0 or not dumpsys_battery_out:
+    if code != 0:
         return "Unknown"
+    return parse_battery(dumpsys_battery_out)
+
 
+def parse_battery(dumpsys_battery_out: str) -> str:
     for line in dumpsys_battery_out.split('\n'):
         line = line.strip()
         if line.startswith('level:'):
@@ -92,72 +202,18 @@ async def get_battery_details(serial: str):
     return "Unknown"
 
 
+@coalesced("get_network_details")
 async def get_network_details(serial: str):
-    network_info = {'ip_address': 'Unknown', 'wifi_name': 'Unknown', 'connection_type': 'Unknown'}
-
-    # Get IP address - try primary method first
-    code, ip_out, err = await run_adb("-s", serial, "shell", "ip", "addr", "show")
-    if code == 0 and ip_out and 'wlan0' in ip_out:
-        for line in ip_out.split('\n'):
-            if line.strip().startswith('inet ') and not line.strip().startswith('inet 127.'):
-                ip_addr = line.split()[1].split('/')[0]
-                if not ip_addr.startswith('127.'):
-                    network_info['ip_address'] = ip_addr
-                    break
-
-    # Fallback for IP if primary failed
-    if network_info['ip_address'] == 'Unknown':
-        code, ip_out, err = await run_adb("-s", serial, "shell", "ifconfig", "wlan0")
-        if code == 0 and ip_out and 'inet addr:' in ip_out:
-            for line in ip_out.split('\n'):
-                if 'inet addr:' in line:
-                    ip_addr = line.split('inet addr:')[1].split()[0]
-                    if not ip_addr.startswith('127.'):
-                        network_info['ip_address'] = ip_addr
-                        break
-
-    # Get Wi-Fi name - try primary method first
-    code, wifi_out, err = await run_adb("-s", serial, "shell", "dumpsys", "wifi")
-    if code == 0 and wifi_out:
-        for line in wifi_out.split('\n'):
-            line = line.strip()
-            if ('mWifiInfo' in line and 'SSID:' in line) or 'Connected to:' in line:
-                try:
-                    if 'SSID:' in line:
-                        ssid = line.split('SSID:')[1].split(',')[0].strip().strip('"')
-                    else:
-                        ssid = line.split('Connected to:')[1].strip().strip('"')
-
-                    if ssid and ssid not in ['<unknown ssid>', 'null', '']:
-                        network_info['wifi_name'] = ssid
-                        break
-                except:
-                    continue
-
-    # Fallback for WiFi name if primary failed
-    if network_info['wifi_name'] == 'Unknown':
-        code, wifi_out, err = await run_adb("-s", serial, "shell", "dumpsys", "connectivity")
-        if code == 0 and wifi_out and 'ExtraInfo:' in wifi_out:
-            for line in wifi_out.split('\n'):
-                if 'ExtraInfo:' in line and '"' in line:
-                    try:
-                        ssid = line.split('"')[1]
-                        if ssid and not ssid.isspace():
-                            network_info['wifi_name'] = ssid
-                            break
-                    except:
-                        continue
-
-    # Set connection type based on available info
-    if network_info['ip_address'] != 'Unknown':
-        network_info['connection_type'] = 'WiFi' if network_info['wifi_name'] != 'Unknown' else 'Mobile Data'
-
-    return network_info
+    network = await network_probe.details(serial)
+    property_cache.set_volatile(serial, 'network', network)
+    return network
 
 
 async def reboot_device(serial: str, mode: Optional[str] = None) -> str:
     """Reboot a specific Android device"""
     try:
+        property_cache.invalidate(serial)
+        result_cache.invalidate(serial)
         if mode is None:
             code, reboot_out, err = await run_adb("-s", serial, "reboot")
         else:
@@ -173,6 +229,8 @@ async def reboot_device(serial: str, mode: Optional[str] = None) -> str:
 async def shutdown_device(serial: str) -> str:
     """Shutdown a specific Android device"""
     try:
+        property_cache.invalidate(serial)
+        result_cache.invalidate(serial)
         code, shutdown_out, err = await run_adb("-s", serial, "reboot", "-p")
         if code != 0:
             raise RuntimeError(f"adb shutdown failed: {err.strip()}")
@@ -182,42 +240,34 @@ async def shutdown_device(serial: str) -> str:
         return f"Failed to shutdown device '{serial}': {str(e)}"
 
 
-async def take_screenshot(serial: str, local_file_path: Optional[str] = None) -> str:
+async def take_screenshot(serial: str, local_file_path: Optional[str] = None, image_format: str = "png",
+                          quality: int = 80, scale: float = 1.0, crop: Optional[list[int]] = None) -> str:
     """Take a screenshot from an Android device"""
     try:
         if local_file_path is None:
-            local_file_path = f"/tmp/{serial}_screenshot_{int(asyncio.get_event_loop().time())}.png"
+            extension = "jpg" if image_format.lower() == "jpeg" else image_format.lower()
+            local_file_path = f"/tmp/{serial}_screenshot_{int(asyncio.get_event_loop().time())}.{extension}"
 
-        path_in_device = f"/sdcard/{serial}_screenshot.png"
-        code, screenshot_out, err = await run_adb("-s", serial, "shell", "screencap", path_in_device)
-
-        if code != 0:
-            raise Exception(f"Failed to take screenshot on device: {serial}")
-        else:
-            await pull_file(serial, path_in_device, local_file_path)
-            await remove_file(serial, path_in_device)
-            return f"Screenshot captured successfully from device '{serial}' and saved to: {local_file_path}"
+        image_data = await screenshot_bytes(serial, image_format, quality, scale, crop)
+        Path(local_file_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(local_file_path).write_bytes(image_data)
+        return f"Screenshot captured successfully from device '{serial}' and saved to: {local_file_path}"
 
     except Exception as e:
         return f"Failed to capture screenshot from device '{serial}': {str(e)}"
 
 
 async def screen_recording(serial: str, time_limit: str, local_file_path: Optional[str] = None) -> str:
-    """Record screen for an Android device"""
+    """Record screen for an Android device, streaming the video straight into a local file"""
     try:
-        if local_file_path is None:
-            local_file_path = f"/tmp/{serial}_video_{int(asyncio.get_event_loop().time())}.mp4"
-
-        path_in_device = f"/sdcard/{serial}_video_recording.mp4"
-        code, recording_out, err = await run_adb("-s", serial, "shell", "screenrecord", "--time-limit", str(time_limit),
-                                                 path_in_device, timeout=2 * int(time_limit))
-
-        if code != 0:
-            raise Exception(f"Failed to record screen for device: {serial}")
-        else:
-            await pull_file(serial, path_in_device, local_file_path)
-            await remove_file(serial, path_in_device)
-            return f"Screen recorded successfully from device '{serial}' and saved to: {local_file_path}"
+        output_format = "h264" if local_file_path and local_file_path.lower().endswith(".h264") else "mp4"
+        recorder = ScreenRecorder(serial, local_file_path or default_recording_path(serial, output_format),
+                                  output_format, max_duration=float(time_limit))
+        await recorder.start()
+        await recorder.wait()
+        if not recorder.bytes_written:
+            raise RuntimeError(recorder.last_error or "no video received")
+        return f"Screen recorded successfully from device '{serial}' and saved to: {recorder.local_file_path}"
 
     except Exception as e:
         return f"Failed to record screen of device '{serial}': {str(e)}"
@@ -229,39 +279,37 @@ async def dump_screen(serial: str, local_file_path: Optional[str] = None) -> str
         if local_file_path is None:
             local_file_path = f"/tmp/{serial}_dump_xml_{int(asyncio.get_event_loop().time())}.xml"
 
-        path_in_device = f"/sdcard/{serial}_dump_xml.xml"
-        code, dump_xml_out, err = await run_adb("-s", serial, "shell", "uiautomator", "dump", path_in_device)
-
-        if code != 0:
-            raise Exception(f"Failed to dump xml for device: {serial}")
-        else:
-            await pull_file(serial, path_in_device, local_file_path)
-            await remove_file(serial, path_in_device)
-            return f"Dumped xml for current screen for device '{serial}' and saved to: {local_file_path}"
+        hierarchy = await fetch_ui_hierarchy(serial, keep_xml=True)
+        Path(local_file_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(local_file_path).write_bytes(hierarchy.xml)
+        # Keep the dump indexed so query_ui/ui_diff can use it without another dump
+        await refresh_hierarchy(serial, hierarchy)
+        return f"Dumped xml for current screen for device '{serial}' and saved to: {local_file_path}"
 
     except Exception as e:
         return f"Failed to dump current screen of device '{serial}': {str(e)}"
 
 
-async def list_installed_apps(serial: str) -> str:
-    """List all the installed packages of an Android device"""
+@coalesced("list_installed_apps")
+async def list_installed_apps(serial: str, name_filter: Optional[str] = None, include_system: bool = True,
+                              limit: int = 500, offset: int = 0) -> str:
+    """List the installed packages of an Android device from the cached app inventory"""
     try:
-        code, installed_packages_out, err = await run_adb("-s", serial, "shell", "pm", "list", "packages", "--user",
-                                                          "0")
-        if code != 0:
-            raise Exception(f"Failed to get installed apps list for device: {serial}")
-        else:
-            installed_packages_out = installed_packages_out.split('\n')
-            if not installed_packages_out or installed_packages_out[0] == "":
-                return f"No installed apps found on device '{serial}'"
-            else:
-                output = f"Count: {len(installed_packages_out)}\n"
-                for i, package in enumerate(installed_packages_out, 1):
-                    if package.startswith("package:"):
-                        app_name = package.replace("package:", "").strip()
-                        output += f"{i:3d}. {app_name}\n"
-
-                return output
+        records = await app_inventory.records(serial)
+        apps = sorted((record for record in records.values() if record.installed), key=lambda record: record.package)
+        if name_filter:
+            apps = [record for record in apps if name_filter.lower() in record.package.lower()]
+        if not include_system:
+            apps = [record for record in apps if not record.system]
+        if not apps:
+            return f"No installed apps found on device '{serial}'"
+        page = apps[offset:offset + limit]
+        output = f"Count: {len(apps)}\n"
+        if len(page) < len(apps):
+            output += f"Showing: {offset + 1}-{offset + len(page)}\n"
+        for i, record in enumerate(page, offset + 1):
+            output += f"{i:3d}. {record.package} ({record.version_name or record.version_code})\n"
+        return output
     except Exception as e:
         return f"Failed to get installed apps list for device '{serial}': {str(e)}"
 
@@ -278,17 +326,26 @@ async def clear_logs(serial: str) -> str:
         return f"Failed to clear logs for device '{serial}': {str(e)}"
 
 
-async def get_logs(serial: str, time_out: float = 10.0, local_log_file_path: Optional[str] = None) -> str:
+async def get_logs(serial: str, time_out: float = 10.0, local_log_file_path: Optional[str] = None,
+                   max_file_size_mb: Optional[float] = None, rotate_seconds: Optional[float] = None,
+                   compression: Optional[str] = None, chunk_size: int = 64 * 1024) -> str:
     """Get logs from logcat of an Android device"""
     proc = None
-    logs_output = []
+    writer = None
 
     try:
         # Determine a log file path if not provided
         if local_log_file_path is None:
             local_log_file_path = f"/tmp/{serial}_logcat_{int(asyncio.get_event_loop().time())}.log"
 
+        # Output is streamed to disk in large chunks so memory use stays flat however long the capture runs
+        writer = RotatingLogWriter(local_log_file_path,
+                                   max_bytes=int(max_file_size_mb * 1024 * 1024) if max_file_size_mb else None,
+                                   max_seconds=rotate_seconds, compression=compression)
+
+        await ensure_adb_server()
         adb_cmd = ["adb", "-s", serial, "logcat"]
+        telemetry.count_spawn("logcat")
         proc = await asyncio.create_subprocess_exec(
             *adb_cmd,
             stdout=asyncio.subprocess.PIPE,
@@ -297,38 +354,34 @@ async def get_logs(serial: str, time_out: float = 10.0, local_log_file_path: Opt
         start_time = asyncio.get_event_loop().time()
 
         while True:
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed >= time_out:
+            remaining = time_out - (asyncio.get_event_loop().time() - start_time)
+            if remaining <= 0:
                 break
 
             try:
-                remaining = time_out - elapsed
-                read_timeout = min(0.5, remaining)
-                line = await asyncio.wait_for(proc.stdout.readline(), timeout=read_timeout)
-                if not line:
+                chunk = await asyncio.wait_for(proc.stdout.read(chunk_size), timeout=remaining)
+                if not chunk:
                     break  # EOF
-                logs_output.append(line.decode(errors="ignore"))
+                await asyncio.to_thread(writer.write, chunk)
             except asyncio.TimeoutError:
-                continue
+                break
             except Exception as e:
                 print(f"[logcat] Error reading output: {e}")
                 break
 
-        # Save collected logs to file
-        try:
-            Path(local_log_file_path).parent.mkdir(parents=True, exist_ok=True)
-            with open(local_log_file_path, "w", encoding="utf-8") as f:
-                f.writelines(logs_output)
-
-            duration = asyncio.get_event_loop().time() - start_time
-            return f"Logs saved for device '{serial}' at '{local_log_file_path}' (collected for {duration:.1f} seconds)"
-        except Exception as e:
-            return f"Failed to write logs for device '{serial}': {e}"
+        writer.close()
+        duration = asyncio.get_event_loop().time() - start_time
+        files = f" in {len(writer.files)} files: {', '.join(writer.files)}" if len(writer.files) > 1 else ""
+        return (f"Logs saved for device '{serial}' at '{writer.files[0]}' (collected for {duration:.1f} seconds, "
+                f"{writer.lines_written} lines, {writer.bytes_written} bytes){files}")
 
     except Exception as e:
         return f"Failed to get logs from device '{serial}': {e}"
 
     finally:
+        # Also on cancellation, so the last compressed segment is complete
+        if writer:
+            writer.close()
         # Ensure the logcat process is cleaned up
         if proc:
             try:
@@ -337,17 +390,22 @@ async def get_logs(serial: str, time_out: float = 10.0, local_log_file_path: Opt
             except asyncio.TimeoutError:
                 proc.kill()
                 await proc.wait()
+            except ProcessLookupError:
+                pass
             except Exception as e:
                 print(f"[logcat] Failed to terminate process cleanly: {e}")
 
 
-async def execute_shell(serial: str, command: str):
+async def execute_shell(serial: str, command: str, max_output_bytes: int = 1024 * 1024):
     """Execute command in an Android device using apk."""
     try:
-        code, execute_command_out, err = await run_adb("-s", serial, "shell", command)
-        if code != 0:
-            raise RuntimeError(f"adb failed to execute command: {err.strip()}")
-        else:
-            return execute_command_out
+        output = await run_adb_bounded("-s", serial, "shell", command, max_bytes=max_output_bytes,
+                                       spill_threshold=max_output_bytes)
+        if output.code != 0:
+            raise RuntimeError(f"adb failed to execute command: {output.stderr}")
+        if output.spill_path:
+            return (f"{output.stdout}\n\n[Output of {output.total_bytes} bytes was truncated, "
+                    f"full output saved to '{output.spill_path}']")
+        return output.stdout
     except Exception as e:
         return f"Failed to execute command: {serial}: {str(e)}"
@@ -0,0 +1,70 @@
+import posixpath
+import time
+from typing import Optional
+
+from src.adb_supervisor import supervisor
+
+# How long a directory listing stays valid, in seconds
+DIRECTORY_TTL = 10.0
+
+
+def _normalize(path: str) -> str:
+    return posixpath.normpath(path) if path else "/"
+
+
+def _related(a: str, b: str) -> bool:
+    """True if one path is the other or lies below it"""
+    if a == b or a == "/" or b == "/":
+        return True
+    return b.startswith(a + "/") or a.startswith(b + "/")
+
+
+class DirectoryCache:
+    """Short-lived per-device cache of directory listings.
+
+    Listings are keyed by (path, depth). Writes made through this server invalidate every
+    listing that could contain the changed path, changes made on the device itself are
+    picked up once the TTL runs out.
+    """
+
+    def __init__(self, ttl: float = DIRECTORY_TTL):
+        self.ttl = ttl
+        self._entries: dict[str, dict[tuple[str, int], tuple[float, list[dict]]]] = {}
+
+    def get(self, serial: str, path: str, depth: int) -> Optional[list[dict]]:
+        listings = self._entries.get(serial, {})
+        key = (_normalize(path), depth)
+        if key not in listings:
+            return None
+        stored_at, entries = listings[key]
+        if time.monotonic() - stored_at > self.ttl:
+            del listings[key]
+            return None
+        return entries
+
+    def set(self, serial: str, path: str, depth: int, entries: list[dict]):
+        self._entries.setdefault(serial, {})[(_normalize(path), depth)] = (time.monotonic(), entries)
+
+    def invalidate(self, serial: str, path: Optional[str] = None):
+        """Drop the listings of a device that contain `path`, or all of them"""
+        if path is None:
+            self._entries.pop(serial, None)
+            return
+        path = _normalize(path)
+        listings = self._entries.get(serial, {})
+        for key in [key for key in listings if _related(key[0], path)]:
+            del listings[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+directory_cache = DirectoryCache()
+
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]):
+    if new_state != "device":
+        directory_cache.invalidate(serial)
+
+
+supervisor.add_listener(_on_device_change)
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from src.adb_manager import run_adb, ensure_adb_server
+from src.adb_supervisor import supervisor
+
+DEFAULT_MAX_PARALLEL = 16
+DEFAULT_PER_HOST_LIMIT = 8
+
+
+async def connected_serials() -> list[str]:
+    """Serials of all devices that are ready to accept commands"""
+    await ensure_adb_server()
+    if supervisor.is_tracking:
+        return [serial for serial, state in supervisor.devices.items() if state == "device"]
+    code, out, err = await run_adb("devices")
+    if code != 0:
+        raise RuntimeError(f"Failed to list devices: {err.strip()}")
+    serials = []
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[1] == "device":
+            serials.append(parts[0])
+    return serials
+
+
+async def resolve_serials(serials: Optional[list[str]] = None) -> list[str]:
+    """Expand None, an empty list or ["all"] to every connected device"""
+    if not serials or serials == ["all"]:
+        return await connected_serials()
+    return list(dict.fromkeys(serials))
+
+
+def device_host(serial: str) -> str:
+    """Host a device is attached through: the IP for network devices, the local machine for emulators.
+
+    USB devices each have their own connection, so every one of them counts as its own host.
+    """
+    if ":" in serial:
+        return serial.rsplit(":", 1)[0]
+    if serial.startswith("emulator-"):
+        return "emulator"
+    return serial
+
+
+def is_failure(output: Any) -> bool:
+    # Operations report errors as "Failed ..." messages instead of raising
+    return isinstance(output, str) and output.startswith("Failed")
+
+
+async def fan_out(serials: Optional[list[str]], operation: Callable[[str], Awaitable[Any]],
+                  max_parallel: int = DEFAULT_MAX_PARALLEL, per_host_limit: int = DEFAULT_PER_HOST_LIMIT,
+                  timeout: Optional[float] = None) -> dict:
+    """Run an operation on many devices concurrently, isolating slow and failing devices from each other"""
+    targets = await resolve_serials(serials)
+    global_limit = asyncio.Semaphore(max(1, max_parallel))
+    host_limits: dict[str, asyncio.Semaphore] = {}
+    started = time.monotonic()
+
+    async def run_one(serial: str) -> dict:
+        host_limit = host_limits.setdefault(device_host(serial), asyncio.Semaphore(max(1, per_host_limit)))
+        # Host slot first, so devices queued behind a busy host do not hold global slots meanwhile
+        async with host_limit, global_limit:
+            device_started = time.monotonic()
+            try:
+                output = await asyncio.wait_for(operation(serial), timeout=timeout)
+                status = "failed" if is_failure(output) else "ok"
+            except asyncio.TimeoutError:
+                output, status = f"Timed out after {timeout} seconds", "timeout"
+            except Exception as e:
+                output, status = str(e), "failed"
+            return {
+                'status': status,
+                'output': output,
+                'elapsed_ms': round((time.monotonic() - device_started) * 1000, 1),
+            }
+
+    results = await asyncio.gather(*(run_one(serial) for serial in targets))
+    summary = {'total': len(targets), 'ok': 0, 'failed': 0, 'timeout': 0}
+    for result in results:
+        summary[result['status']] += 1
+    summary['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return {'summary': summary, 'devices': dict(zip(targets, results))}
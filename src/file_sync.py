@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import os
+import shlex
+import time
+from pathlib import Path
+from typing import Optional
+
+from src.adb_manager import run_adb
+from src.directory_cache import directory_cache
+from src.result_cache import result_cache
+
+HASH_CACHE_PATH = Path(os.environ.get("ADB_MCP_HASH_CACHE",
+                                      Path.home() / ".cache" / "android-device-mcp" / "hash_cache.json"))
+MANIFEST_MARKER = "@@md5"
+
+# Exit status of the manifest script when the device directory does not exist
+MISSING_DIRECTORY_STATUS = 3
+
+
+class LocalHashCache:
+    """MD5 of local files keyed by absolute path, valid while (size, mtime) is unchanged"""
+
+    def __init__(self, path: Path = HASH_CACHE_PATH):
+        self.path = path
+        self._entries: Optional[dict[str, list]] = None
+        self._dirty = False
+
+    def _load(self) -> dict[str, list]:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def md5(self, path: Path) -> str:
+        stat = path.stat()
+        key = str(path.resolve())
+        entries = self._load()
+        entry = entries.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                digest.update(chunk)
+        self.store(path, digest.hexdigest())
+        return entries[key][2]
+
+    def store(self, path: Path, md5: str):
+        stat = path.stat()
+        self._load()[str(path.resolve())] = [stat.st_size, stat.st_mtime_ns, md5]
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._entries))
+        tmp_path.replace(self.path)
+        self._dirty = False
+
+
+hash_cache = LocalHashCache()
+
+
+def local_manifest(local_dir: Path) -> dict[str, tuple[int, str]]:
+    """Relative path -> (size, md5) of every file below a local directory"""
+    manifest = {}
+    if not local_dir.is_dir():
+        return manifest
+    for root, dirs, files in os.walk(local_dir):
+        for name in files:
+            path = Path(root) / name
+            manifest[path.relative_to(local_dir).as_posix()] = (path.stat().st_size, hash_cache.md5(path))
+    return manifest
+
+
+async def device_manifest(serial: str, remote_dir: str, missing_ok: bool = False) -> dict[str, tuple[int, str]]:
+    """Relative path -> (size, md5) of every file below a device directory, in one shell invocation.
+
+    A missing directory is an error unless `missing_ok` is set, in which case it has no files.
+    """
+    quoted = shlex.quote(remote_dir)
+    script = (f"[ -d {quoted} ] || exit {MISSING_DIRECTORY_STATUS}; "
+              f"cd {quoted} && find . -type f -exec stat -c '%s %n' {{}} + ; "
+              f"echo '{MANIFEST_MARKER}'; find . -type f -exec md5sum {{}} +")
+    code, out, err = await run_adb("-s", serial, "shell", script, timeout=600)
+    if code == MISSING_DIRECTORY_STATUS:
+        if missing_ok:
+            return {}
+        raise ValueError(f"Device directory '{remote_dir}' does not exist")
+    if code != 0:
+        raise RuntimeError(f"Failed to read manifest of '{remote_dir}': {err.strip() or out.strip()}")
+
+    sizes, hashes = {}, {}
+    target = sizes
+    for line in out.splitlines():
+        if line.strip() == MANIFEST_MARKER:
+            target = hashes
+            continue
+        parts = line.split(None, 1)
+        if len(parts) != 2 or not parts[1].startswith("./"):
+            continue
+        value, path = parts
+        target[path[2:]] = int(value) if target is sizes else value
+    return {path: (size, hashes.get(path, "")) for path, size in sizes.items()}
+
+
+def _join_remote(remote_dir: str, relative: str) -> str:
+    return f"{remote_dir.rstrip('/')}/{relative}"
+
+
+async def _shell_batches(serial: str, command: str, paths: list[str], batch_size: int = 100):
+    for index in range(0, len(paths), batch_size):
+        quoted = " ".join(shlex.quote(path) for path in paths[index:index + batch_size])
+        code, out, err = await run_adb("-s", serial, "shell", f"{command} {quoted}", timeout=120)
+        if code != 0:
+            raise RuntimeError(f"'{command}' failed: {err.strip() or out.strip()}")
+
+
+async def sync_to_device(serial: str, local_dir: str, remote_dir: str, delete: bool = False,
+                         dry_run: bool = False) -> dict:
+    """Push only the files of a local directory that are missing or different on the device"""
+    started = time.monotonic()
+    source = Path(local_dir).expanduser()
+    if not source.is_dir():
+        raise ValueError(f"Local directory '{local_dir}' does not exist")
+
+    local, remote = await asyncio.gather(asyncio.to_thread(local_manifest, source),
+                                         device_manifest(serial, remote_dir, missing_ok=True))
+    hash_cache.save()
+    changed = sorted(path for path, (size, md5) in local.items() if remote.get(path) != (size, md5))
+    stale = sorted(set(remote) - set(local)) if delete else []
+
+    if not dry_run:
+        directory_cache.invalidate(serial, remote_dir)
+        result_cache.invalidate(serial)
+        directories = sorted({_join_remote(remote_dir, str(Path(path).parent)) for path in changed})
+        if directories:
+            await _shell_batches(serial, "mkdir -p", directories)
+        for path in changed:
+            code, out, err = await run_adb("-s", serial, "push", str(source / path), _join_remote(remote_dir, path),
+                                           timeout=600)
+            if code != 0:
+                raise RuntimeError(f"Failed to push '{path}': {err.strip()}")
+        if stale:
+            await _shell_batches(serial, "rm -f", [_join_remote(remote_dir, path) for path in stale])
+
+    return _sync_report(local, changed, stale, dry_run, started)
+
+
+async def sync_from_device(serial: str, remote_dir: str, local_dir: str, delete: bool = False,
+                           dry_run: bool = False) -> dict:
+    """Pull only the files of a device directory that are missing or different locally"""
+    started = time.monotonic()
+    target = Path(local_dir).expanduser()
+    remote, local = await asyncio.gather(device_manifest(serial, remote_dir),
+                                         asyncio.to_thread(local_manifest, target))
+    changed = sorted(path for path, entry in remote.items() if local.get(path) != entry)
+    stale = sorted(set(local) - set(remote)) if delete else []
+
+    if not dry_run:
+        for path in changed:
+            destination = target / path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            code, out, err = await run_adb("-s", serial, "pull", _join_remote(remote_dir, path), str(destination),
+                                           timeout=600)
+            if code != 0:
+                raise RuntimeError(f"Failed to pull '{path}': {err.strip()}")
+            # The device already told us the hash, no need to hash the pulled file again
+            hash_cache.store(destination, remote[path][1])
+        for path in stale:
+            (target / path).unlink(missing_ok=True)
+    hash_cache.save()
+
+    return _sync_report(remote, changed, stale, dry_run, started)
+
+
+def _sync_report(source: dict[str, tuple[int, str]], changed: list[str], stale: list[str], dry_run: bool,
+                 started: float) -> dict:
+    transferred = sum(source[path][0] for path in changed)
+    return {
+        'dry_run': dry_run,
+        'files_total': len(source),
+        'files_transferred': len(changed),
+        'files_unchanged': len(source) - len(changed),
+        'files_deleted': len(stale),
+        'bytes_transferred': transferred,
+        'bytes_saved': sum(size for size, _ in source.values()) - transferred,
+        'elapsed_seconds': round(time.monotonic() - started, 2),
+        'transferred': changed[:100],
+        'deleted': stale[:100],
+    }
@@ -1,13 +1,30 @@
+import fnmatch
+import json
+import posixpath
+import shlex
+import stat
+from datetime import datetime, timezone
 from typing import Optional
 
 from src.adb_manager import run_adb
+from src.directory_cache import directory_cache
+from src.result_cache import result_cache
+from src.tar_transfer import pull_tar, push_tar
 
+TRANSFER_MODES = ("adb", "tar")
 
-async def pull_file(serial: str, file_path_in_device: str, local_folder: Optional[str] = None):
+
+async def pull_file(serial: str, file_path_in_device: str, local_folder: Optional[str] = None,
+                    transfer_mode: str = "adb", compress: bool = False):
     """Pull a file from an Android device to a local system"""
     try:
         if local_folder is None:
             local_folder = "/tmp"
+        if transfer_mode not in TRANSFER_MODES:
+            raise ValueError(f"Unsupported transfer mode '{transfer_mode}', use one of: {', '.join(TRANSFER_MODES)}")
+        if transfer_mode == "tar":
+            summary = await pull_tar(serial, file_path_in_device, local_folder, compress)
+            return f"File pulled successfully to '{local_folder}' ({summary})"
         code, screenshot, err = await run_adb("-s", serial, "pull", file_path_in_device, local_folder)
         if code != 0:
             raise Exception(f"Failed to pull file '{file_path_in_device}' from device '{serial}': {err.strip()}")
@@ -17,9 +34,17 @@ async def pull_file(serial: str, file_path_in_device: str, local_folder: Optiona
         return f"Failed to pull file '{file_path_in_device}' from device '{serial}': {str(e)}"
 
 
-async def push_file(serial: str, local_file: str, folder_path_in_device: str):
+async def push_file(serial: str, local_file: str, folder_path_in_device: str, transfer_mode: str = "adb",
+                    compress: bool = False):
     """Push a file to an Android device from a local system"""
     try:
+        if transfer_mode not in TRANSFER_MODES:
+            raise ValueError(f"Unsupported transfer mode '{transfer_mode}', use one of: {', '.join(TRANSFER_MODES)}")
+        directory_cache.invalidate(serial, folder_path_in_device)
+        result_cache.invalidate(serial)
+        if transfer_mode == "tar":
+            summary = await push_tar(serial, local_file, folder_path_in_device, compress)
+            return f"File pushed successfully to '{folder_path_in_device}' ({summary})"
         code, screenshot, err = await run_adb("-s", serial, "push", local_file, folder_path_in_device)
         if code != 0:
             raise Exception(f"Failed to push file '{local_file}' to device '{serial}': {err.strip()}")
@@ -32,6 +57,8 @@ async def push_file(serial: str, local_file: str, folder_path_in_device: str):
 async def remove_file(serial: str, file_path_in_device: str):
     """Remove a file from an Android device"""
     try:
+        directory_cache.invalidate(serial, file_path_in_device)
+        result_cache.invalidate(serial)
         code, screenshot, err = await run_adb("-s", serial, "shell", "rm", file_path_in_device)
         if code != 0:
             raise Exception(f"Failed to remove file '{file_path_in_device}' from device '{serial}': {err.strip()}")
@@ -41,14 +68,78 @@ async def remove_file(serial: str, file_path_in_device: str):
         return f"Failed to remove file '{file_path_in_device}' from device '{serial}': {str(e)}"
 
 
-async def list_files(serial: str, file_path_in_device: str) -> str:
-    """List files in a directory on an Android device"""
+def _file_type(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return "directory"
+    if stat.S_ISREG(mode):
+        return "file"
+    if stat.S_ISLNK(mode):
+        return "symlink"
+    return "other"
+
+
+def parse_file_entries(output: str) -> list[dict]:
+    """Parse `stat -c '%f %s %Y %n'` lines of paths relative to the listed directory"""
+    entries = []
+    for line in output.splitlines():
+        parts = line.split(" ", 3)
+        if len(parts) != 4 or not parts[3].startswith("./"):
+            continue
+        raw_mode, size, mtime, path = parts
+        try:
+            mode = int(raw_mode, 16)
+            entries.append({
+                'name': path[2:],
+                'type': _file_type(mode),
+                'size': int(size),
+                'mtime': datetime.fromtimestamp(int(mtime), timezone.utc).isoformat(),
+                'mode': stat.filemode(mode),
+            })
+        except ValueError:
+            continue
+    entries.sort(key=lambda entry: entry['name'])
+    return entries
+
+
+async def read_directory(serial: str, path: str, depth: int = 1) -> list[dict]:
+    """Entries below a device directory up to `depth` levels deep, walked in a single shell command.
+
+    A path that is not a directory lists as its own single entry, like `ls` does.
+    """
+    entries = directory_cache.get(serial, path, depth)
+    if entries is not None:
+        return entries
+    parent, name = posixpath.split(path.rstrip("/"))
+    command = (f"if [ -d {shlex.quote(path)} ]; then cd {shlex.quote(path)} && "
+               f"find . -mindepth 1 -maxdepth {depth} -exec stat -c '%f %s %Y %n' {{}} +; "
+               f"else cd {shlex.quote(parent or '/')} && stat -c '%f %s %Y %n' ./{shlex.quote(name)}; fi")
+    code, out, err = await run_adb("-s", serial, "shell", command, timeout=120)
+    entries = parse_file_entries(out)
+    # Unreadable subdirectories make find fail, but the rest of the listing is still valid
+    if code != 0 and not entries:
+        raise Exception(err.strip() or out.strip() or f"exit code {code}")
+    directory_cache.set(serial, path, depth, entries)
+    return entries
+
+
+async def list_files(serial: str, file_path_in_device: str, recursive: bool = False, max_depth: int = 3,
+                     pattern: Optional[str] = None, limit: int = 200, cursor: Optional[str] = None) -> str:
+    """List files in a directory on an Android device as typed entries, one page at a time"""
     try:
-        code, files, err = await run_adb("-s", serial, "shell", "ls", file_path_in_device)
-        if code != 0:
-            return f"Failed to list files from device '{serial}' at path '{file_path_in_device}': {err.strip()}"
-        if not files.strip():
-            return f"Directory '{file_path_in_device}' on device '{serial}' is empty"
-        return f"Files in '{file_path_in_device}' on device '{serial}':\n{files}"
+        entries = await read_directory(serial, file_path_in_device, max(1, max_depth) if recursive else 1)
+        if pattern:
+            entries = [entry for entry in entries
+                       if fnmatch.fnmatchcase(entry['name'].rsplit("/", 1)[-1], pattern)]
+        total = len(entries)
+        if cursor:
+            entries = [entry for entry in entries if entry['name'] > cursor]
+        page = entries[:max(1, limit)]
+        return json.dumps({
+            'path': file_path_in_device,
+            'total': total,
+            'returned': len(page),
+            'entries': page,
+            'next_cursor': page[-1]['name'] if len(entries) > len(page) else None,
+        }, indent=4)
     except Exception as e:
         return f"Failed to list files from device '{serial}' at path '{file_path_in_device}': {str(e)}"
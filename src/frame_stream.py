@@ -0,0 +1,161 @@
+import asyncio
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from src.adb_manager import run_adb_raw
+from src.screen_capture import decode_screencap
+
+MAX_CONSECUTIVE_FAILURES = 5
+
+
+@dataclass
+class Frame:
+    image: Image.Image
+    captured_at: float
+    capture_ms: float
+
+
+class FrameStream:
+    """Continuously captures raw screencap frames of one device into a bounded ring buffer.
+
+    Capturing the next frame overlaps with decoding the previous one in a worker thread,
+    so the capture rate is bound by the device rather than by decoding.
+    """
+
+    def __init__(self, serial: str, buffer_size: int = 5, interval: float = 0.0):
+        self.serial = serial
+        self.interval = interval
+        self.frames: deque[Frame] = deque(maxlen=max(1, buffer_size))
+        self.started_at: Optional[float] = None
+        self.frame_count = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self.started_at = time.time()
+        self.last_error = None
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        failures = 0
+        pending: Optional[asyncio.Task] = None
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    code, data, err = await run_adb_raw("-s", self.serial, "exec-out", "screencap", timeout=10.0)
+                    if code != 0 or not data:
+                        raise RuntimeError(err.decode(errors="ignore").strip() or "empty screencap output")
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    self.last_error = str(e)
+                    if failures >= MAX_CONSECUTIVE_FAILURES:
+                        print(f"[frames] Stopping frame stream for device '{self.serial}': {e}", file=sys.stderr)
+                        return
+                    await asyncio.sleep(min(1.0, 0.1 * failures))
+                    continue
+
+                if pending:
+                    await pending
+                pending = asyncio.create_task(self._decode(data, time.time(), time.monotonic() - started))
+                if self.interval > 0:
+                    await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        finally:
+            if pending and not pending.done():
+                pending.cancel()
+
+    async def _decode(self, data: bytes, captured_at: float, capture_seconds: float):
+        try:
+            image = await asyncio.to_thread(decode_screencap, data)
+        except Exception as e:
+            self.last_error = f"Failed to decode frame: {e}"
+            return
+        self.frames.append(Frame(image, captured_at, capture_seconds * 1000))
+        self.frame_count += 1
+
+    def latest(self) -> Optional[Frame]:
+        return self.frames[-1] if self.frames else None
+
+    def stats(self) -> dict:
+        now = time.time()
+        fps = 0.0
+        if len(self.frames) > 1:
+            span = self.frames[-1].captured_at - self.frames[0].captured_at
+            fps = (len(self.frames) - 1) / span if span > 0 else 0.0
+        latest = self.latest()
+        return {
+            'serial': self.serial,
+            'running': self.running,
+            'frames_captured': self.frame_count,
+            'buffered_frames': len(self.frames),
+            'capture_fps': round(fps, 2),
+            'frame_age_ms': round((now - latest.captured_at) * 1000, 1) if latest else None,
+            'last_capture_ms': round(latest.capture_ms, 1) if latest else None,
+            'last_error': self.last_error,
+        }
+
+
+frame_streams: dict[str, FrameStream] = {}
+
+
+async def start_frame_stream(serial: str, buffer_size: int = 5, interval: float = 0.0) -> str:
+    """Start continuous frame capture for an Android device"""
+    try:
+        stream = frame_streams.get(serial)
+        if stream and stream.running:
+            return f"Frame stream already running for device '{serial}'"
+        stream = frame_streams[serial] = FrameStream(serial, buffer_size, interval)
+        stream.start()
+        return f"Frame stream started for device '{serial}' (buffer of {stream.frames.maxlen} frames)"
+    except Exception as e:
+        return f"Failed to start frame stream for device '{serial}': {str(e)}"
+
+
+async def stop_frame_stream(serial: str) -> str:
+    """Stop continuous frame capture for an Android device"""
+    try:
+        stream = frame_streams.pop(serial, None)
+        if stream is None:
+            return f"No frame stream running for device '{serial}'"
+        await stream.stop()
+        return f"Frame stream stopped for device '{serial}' after {stream.frame_count} frames"
+    except Exception as e:
+        return f"Failed to stop frame stream for device '{serial}': {str(e)}"
+
+
+async def wait_for_frame(serial: str, max_age: Optional[float] = None, timeout: float = 5.0) -> tuple[Frame, dict]:
+    """Return the latest buffered frame, waiting for one not older than `max_age` seconds if needed"""
+    stream = frame_streams.get(serial)
+    if stream is None:
+        raise RuntimeError(f"No frame stream running for device '{serial}', start one with start_frame_stream")
+    deadline = time.monotonic() + timeout
+    while True:
+        frame = stream.latest()
+        if frame and (max_age is None or time.time() - frame.captured_at <= max_age):
+            return frame, stream.stats()
+        if not stream.running:
+            raise RuntimeError(f"Frame stream for device '{serial}' stopped: {stream.last_error}")
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"No frame available within {timeout} seconds")
+        await asyncio.sleep(0.02)
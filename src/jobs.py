@@ -0,0 +1,305 @@
+import asyncio
+import inspect
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from src.adb_manager import run_adb
+from src.app_management import install_app
+from src.device_management import get_logs, reboot_device
+from src.fan_out import is_failure
+from src.file_system import pull_file, push_file
+from src.property_cache import BOOT_ID_PATH
+from src.screen_recorder import ScreenRecorder, default_recording_path
+
+JOB_STATUSES = ("running", "succeeded", "failed", "cancelled")
+
+# Finished jobs kept for polling; the oldest are evicted first
+MAX_FINISHED_JOBS = 100
+
+# Seconds between progress updates of running jobs
+PROGRESS_INTERVAL = 1.0
+
+
+class Job:
+    """A long-running operation running in the background under the server's event loop"""
+
+    def __init__(self, operation: str, serial: Optional[str], arguments: dict):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.operation = operation
+        self.serial = serial
+        self.arguments = arguments
+        self.status = "running"
+        self.progress = 0.0
+        self.total: Optional[float] = None
+        self.message: Optional[str] = None
+        self.result: Any = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def report(self, progress: float, total: Optional[float] = None, message: Optional[str] = None):
+        self.progress = progress
+        self.total = total
+        self.message = message
+        self._notify()
+
+    def _notify(self):
+        # Wake everyone waiting for a change, later waiters get a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_changed(self, timeout: Optional[float]) -> bool:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.job_id,
+            'operation': self.operation,
+            'serial': self.serial,
+            'status': self.status,
+            'progress': round(self.progress, 1),
+            'total': self.total,
+            'message': self.message,
+            'elapsed_seconds': round(end - self.created_at, 1),
+            'result': self.result,
+        }
+
+
+class JobStore:
+    """Running jobs plus a bounded history of finished ones"""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+
+    def submit(self, operation: str, serial: Optional[str], arguments: dict,
+               run: Callable[[Job], Awaitable[Any]]) -> Job:
+        job = Job(operation, serial, arguments)
+        self.jobs[job.job_id] = job
+        job._task = asyncio.get_running_loop().create_task(self._run(job, run))
+        return job
+
+    async def _run(self, job: Job, run: Callable[[Job], Awaitable[Any]]):
+        try:
+            job.result = await run(job)
+            job.status = "failed" if is_failure(job.result) else "succeeded"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.result = f"Failed to run job '{job.operation}': {str(e)}"
+        finally:
+            job.finished_at = time.time()
+            job._notify()
+            self._evict()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Job:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Unknown job '{job_id}', it may have been evicted")
+        return job
+
+    async def wait(self, job_id: str, timeout: Optional[float] = None,
+                   on_progress: Optional[Callable[[Job], Awaitable]] = None) -> Job:
+        """Wait until the job is done or `timeout` seconds passed, calling `on_progress` on every update"""
+        job = self.get(job_id)
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not job.done:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                break
+            if await job.wait_changed(remaining) and on_progress and not job.done:
+                await on_progress(job)
+        return job
+
+    async def cancel(self, job_id: str) -> Job:
+        job = self.get(job_id)
+        if not job.done and job._task:
+            job._task.cancel()
+            try:
+                await job._task
+            except asyncio.CancelledError:
+                pass
+        return job
+
+    def list(self, status: Optional[str] = None, serial: Optional[str] = None) -> list[Job]:
+        return [job for job in self.jobs.values()
+                if (status is None or job.status == status) and (serial is None or job.serial == serial)]
+
+
+job_store = JobStore()
+
+
+async def track(job: Job, awaitable: Awaitable, progress: Callable[[float], Awaitable[tuple]]) -> Any:
+    """Await `awaitable`, reporting `await progress(elapsed)` as (progress, total, message) meanwhile"""
+    task = asyncio.ensure_future(awaitable)
+    started = time.monotonic()
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+            if done:
+                return task.result()
+            job.report(*await progress(time.monotonic() - started))
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+def local_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    if path.is_dir():
+        return sum(child.stat().st_size for child in path.rglob("*") if child.is_file())
+    return 0
+
+
+async def remote_size(serial: str, path: str) -> Optional[int]:
+    try:
+        code, out, err = await run_adb("-s", serial, "shell", "stat", "-c", "%s", path, timeout=5.0)
+        return int(out) if code == 0 else None
+    except (RuntimeError, ValueError):
+        return None
+
+
+# Operations that can run as jobs, each takes the job followed by the arguments of the tool it wraps
+
+async def screen_recording_job(job: Job, serial: str, time_limit: float = 30.0, local_file_path: Optional[str] = None,
+                               output_format: str = "mp4", bit_rate: Optional[int] = None,
+                               size: Optional[str] = None) -> str:
+    recorder = ScreenRecorder(serial, local_file_path or default_recording_path(serial, output_format), output_format,
+                              float(time_limit), bit_rate, size)
+    await recorder.start()
+    try:
+        async def progress(elapsed: float):
+            return elapsed, float(time_limit), f"{recorder.bytes_written} bytes recorded"
+
+        await track(job, recorder.wait(), progress)
+    finally:
+        # Cancelling the job stops the recording but keeps what was recorded so far
+        await recorder.stop()
+    if not recorder.bytes_written:
+        return f"Failed to record screen of device '{serial}': {recorder.last_error or 'no video received'}"
+    return f"Screen recorded successfully from device '{serial}' and saved to: {recorder.local_file_path}"
+
+
+async def get_logs_job(job: Job, serial: str, time_out: float = 10.0, local_log_file_path: Optional[str] = None,
+                       max_file_size_mb: Optional[float] = None, rotate_seconds: Optional[float] = None,
+                       compression: Optional[str] = None) -> str:
+    async def progress(elapsed: float):
+        return elapsed, float(time_out), f"{elapsed:.0f} of {time_out:.0f} seconds collected"
+
+    return await track(job, get_logs(serial, time_out, local_log_file_path, max_file_size_mb, rotate_seconds,
+                                     compression), progress)
+
+
+async def install_app_job(job: Job, serial: str, apk_path: str, split_apk_paths: Optional[list[str]] = None,
+                          force: bool = False) -> str:
+    size = sum(os.path.getsize(path) for path in [apk_path, *(split_apk_paths or [])] if os.path.exists(path))
+
+    async def progress(elapsed: float):
+        return elapsed, None, f"installing {size} bytes, {elapsed:.0f} seconds elapsed"
+
+    return await track(job, install_app(serial, apk_path, split_apk_paths, force), progress)
+
+
+async def pull_file_job(job: Job, serial: str, file_path_in_device: str, local_folder: Optional[str] = None,
+                        transfer_mode: str = "adb", compress: bool = False) -> str:
+    target = Path(local_folder or "/tmp") / Path(file_path_in_device.rstrip("/")).name
+    total = await remote_size(serial, file_path_in_device) if transfer_mode == "adb" else None
+
+    async def progress(elapsed: float):
+        transferred = await asyncio.to_thread(local_size, target)
+        return transferred, total, f"{transferred} bytes transferred in {elapsed:.0f} seconds"
+
+    return await track(job, pull_file(serial, file_path_in_device, local_folder, transfer_mode, compress), progress)
+
+
+async def push_file_job(job: Job, serial: str, local_file: str, folder_path_in_device: str,
+                        transfer_mode: str = "adb", compress: bool = False) -> str:
+    total = local_size(Path(local_file))
+    # Bytes on the device can only be followed for single files pushed with adb
+    target = f"{folder_path_in_device.rstrip('/')}/{Path(local_file).name}" \
+        if transfer_mode == "adb" and Path(local_file).is_file() else None
+
+    async def progress(elapsed: float):
+        transferred = await remote_size(serial, target) if target else None
+        if transferred is None:
+            return elapsed, None, f"pushing {total} bytes, {elapsed:.0f} seconds elapsed"
+        return transferred, total, f"{transferred} bytes transferred in {elapsed:.0f} seconds"
+
+    return await track(job, push_file(serial, local_file, folder_path_in_device, transfer_mode, compress), progress)
+
+
+async def reboot_device_job(job: Job, serial: str, mode: Optional[str] = None, wait_for_boot: bool = True,
+                            boot_timeout: float = 180.0) -> str:
+    boot_id = await _boot_state(serial)
+    result = await reboot_device(serial, mode)
+    if is_failure(result) or mode or not wait_for_boot:
+        return result
+    started = time.monotonic()
+    while (elapsed := time.monotonic() - started) < boot_timeout:
+        job.report(elapsed, boot_timeout, "waiting for the device to boot")
+        await asyncio.sleep(2.0)
+        state = await _boot_state(serial)
+        # A changed boot ID tells the device went down and came back, not that it has yet to go down
+        if state and state[0] != (boot_id[0] if boot_id else None) and state[1] == "1":
+            return f"Device '{serial}' rebooted and finished booting in {time.monotonic() - started:.0f} seconds"
+    return f"Failed to wait for device '{serial}' to boot: not booted after {boot_timeout:.0f} seconds"
+
+
+async def _boot_state(serial: str) -> Optional[tuple[str, str]]:
+    """Boot ID and sys.boot_completed of the device, None while it is unreachable"""
+    try:
+        code, out, err = await run_adb("-s", serial, "shell", f"cat {BOOT_ID_PATH}; getprop sys.boot_completed",
+                                       timeout=5.0)
+        lines = out.splitlines()
+        return (lines[0].strip(), lines[1].strip() if len(lines) > 1 else "") if code == 0 and lines else None
+    except RuntimeError:
+        return None
+
+
+JOB_OPERATIONS: dict[str, Callable[..., Awaitable[str]]] = {
+    'screen_recording': screen_recording_job,
+    'get_logs': get_logs_job,
+    'install_app': install_app_job,
+    'pull_file': pull_file_job,
+    'push_file': push_file_job,
+    'reboot_device': reboot_device_job,
+}
+
+
+def submit_job(operation: str, arguments: Optional[dict] = None) -> Job:
+    """Start an operation as a background job"""
+    run = JOB_OPERATIONS.get(operation)
+    if run is None:
+        raise ValueError(f"Unsupported job operation '{operation}', use one of: {', '.join(JOB_OPERATIONS)}")
+    arguments = dict(arguments or {})
+    try:
+        inspect.signature(run).bind(None, **arguments)
+    except TypeError as e:
+        raise ValueError(f"Invalid arguments for '{operation}': {e}")
+    return job_store.submit(operation, arguments.get("serial"), arguments, lambda job: run(job, **arguments))
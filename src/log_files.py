@@ -0,0 +1,108 @@
+import gzip
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+COMPRESSIONS = (None, "gzip", "zstd")
+
+
+class RotatingLogWriter:
+    """Writes a byte stream to disk incrementally, rotating by size and/or age and optionally compressing.
+
+    The first segment is written to `path` itself, later ones to `<stem>.<n><suffix>`.
+    """
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, max_seconds: Optional[float] = None,
+                 compression: Optional[str] = None, flush_interval: float = 1.0):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported compression '{compression}', use gzip or zstd")
+        self._zstandard = None
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("zstd compression requires the 'zstandard' package, use gzip instead")
+            self._zstandard = zstandard
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.compression = compression
+        self.flush_interval = flush_interval
+        self.files: list[str] = []
+        self.bytes_written = 0
+        self.lines_written = 0
+        self._file = None
+        self._closed = False
+        self._segment_bytes = 0
+        self._segment_started = 0.0
+        self._last_flush = 0.0
+        # Writes run in a worker thread, a cancelled capture may close the writer while one is in flight
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _segment_path(self, index: int) -> Path:
+        path = self.path if index == 0 else self.path.with_name(f"{self.path.stem}.{index}{self.path.suffix}")
+        if self.compression == "gzip":
+            return path.with_name(path.name + ".gz")
+        if self.compression == "zstd":
+            return path.with_name(path.name + ".zst")
+        return path
+
+    def _open_segment(self):
+        path = self._segment_path(len(self.files))
+        if self.compression == "gzip":
+            self._file = gzip.open(path, "wb", compresslevel=6)
+        elif self.compression == "zstd":
+            self._file = self._zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+        else:
+            self._file = open(path, "wb")
+        self.files.append(str(path))
+        self._segment_bytes = 0
+        self._segment_started = time.monotonic()
+
+    def _should_rotate(self) -> bool:
+        if self._segment_bytes == 0:
+            return False
+        if self.max_bytes and self._segment_bytes >= self.max_bytes:
+            return True
+        return bool(self.max_seconds and time.monotonic() - self._segment_started >= self.max_seconds)
+
+    def write(self, data: bytes):
+        with self._lock:
+            if self._closed:
+                return
+            if self._file is None:
+                self._open_segment()
+            elif self._should_rotate():
+                # Rotate at the end of a line, so every segment can be read and grepped on its own
+                end = data.find(b"\n") + 1
+                if end:
+                    self._write(data[:end])
+                    self._file.close()
+                    self._open_segment()
+                    data = data[end:]
+            self._write(data)
+            now = time.monotonic()
+            if now - self._last_flush >= self.flush_interval:
+                # Keep what was captured so far on disk even if the server is killed
+                self._file.flush()
+                self._last_flush = now
+
+    def _write(self, data: bytes):
+        if not data:
+            return
+        self._file.write(data)
+        self._segment_bytes += len(data)
+        self.bytes_written += len(data)
+        self.lines_written += data.count(b"\n")
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._file is None:
+                # Nothing was captured, still leave an empty log behind
+                self._open_segment()
+            self._file.close()
@@ -0,0 +1,262 @@
+import asyncio
+import itertools
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from src.adb_manager import ensure_adb_server
+from src.scheduler import scheduler, BULK_LANE
+from src.telemetry import telemetry
+
+PRIORITIES = "VDIWEF"
+
+# Header line of `logcat -v long -v epoch`: [ 1700000000.123  1234: 5678 I/Tag ]
+LONG_HEADER_PATTERN = re.compile(r"^\[\s+(\d+\.\d+)\s+(\d+):\s*(\d+)\s+([VDIWEFS])/(.*?)\s*\]$")
+
+
+@dataclass
+class LogRecord:
+    seq: int
+    timestamp: float
+    pid: int
+    tid: int
+    priority: str
+    tag: str
+    message: str
+
+    def to_dict(self) -> dict:
+        return {
+            'seq': self.seq,
+            'time': self.timestamp,
+            'pid': self.pid,
+            'tid': self.tid,
+            'priority': self.priority,
+            'tag': self.tag,
+            'message': self.message,
+        }
+
+
+def logcat_filter_specs(tags: Optional[list[str]] = None, min_priority: str = "V") -> list[str]:
+    """Build logcat filterspecs so tag/priority filtering happens on the device"""
+    min_priority = min_priority.upper()
+    if tags:
+        return [f"{tag}:{min_priority}" for tag in tags] + ["*:S"]
+    return [f"*:{min_priority}"] if min_priority != "V" else []
+
+
+class LogcatCollector:
+    """Long-running logcat reader of one device, parsing `-v long` records into a ring buffer"""
+
+    def __init__(self, serial: str, buffer_size: int = 50000, tags: Optional[list[str]] = None,
+                 min_priority: str = "V", buffers: Optional[list[str]] = None):
+        self.serial = serial
+        self.records: deque[LogRecord] = deque(maxlen=max(1, buffer_size))
+        self.tags = tags
+        self.min_priority = min_priority.upper()
+        self.buffers = buffers
+        self.started_at: Optional[float] = None
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._proc: Optional[asyncio.subprocess.Process] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def command(self) -> list[str]:
+        # Only records logged from now on, history is available through `logcat -d`
+        args = ["adb", "-s", self.serial, "logcat", "-v", "long", "-v", "epoch", "-T", "1"]
+        for buffer in self.buffers or []:
+            args += ["-b", buffer]
+        return args + logcat_filter_specs(self.tags, self.min_priority)
+
+    async def start(self):
+        if self.running:
+            return
+        await ensure_adb_server()
+        self.started_at = time.time()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        scheduler.track(self.serial, BULK_LANE, self._task, "logcat collector")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        delay = 1.0
+        while True:
+            try:
+                telemetry.count_spawn("logcat")
+                self._proc = await asyncio.create_subprocess_exec(
+                    *self.command(),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                await self._read(self._proc.stdout)
+                self.last_error = f"logcat exited with code {await self._proc.wait()}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                await self._terminate()
+            # Device rebooted or the connection dropped, reattach after a short delay
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    async def _read(self, stream: asyncio.StreamReader):
+        header = None
+        lines: list[str] = []
+        while True:
+            raw = await stream.readline()
+            if not raw:
+                break
+            line = raw.decode(errors="ignore").rstrip("\r\n")
+            match = LONG_HEADER_PATTERN.match(line)
+            if match:
+                if header:
+                    self._append(header, lines)
+                header, lines = match, []
+            elif header is not None:
+                lines.append(line)
+        if header:
+            self._append(header, lines)
+
+    def _append(self, header: re.Match, lines: list[str]):
+        # Records are separated by an empty line
+        while lines and not lines[-1]:
+            lines.pop()
+        if len(self.records) == self.records.maxlen:
+            self.dropped += 1
+        self._seq += 1
+        timestamp, pid, tid, priority, tag = header.groups()
+        self.records.append(LogRecord(self._seq, float(timestamp), int(pid), int(tid), priority, tag,
+                                      "\n".join(lines)))
+
+    async def _terminate(self):
+        proc, self._proc = self._proc, None
+        if proc and proc.returncode is None:
+            try:
+                proc.terminate()
+                await asyncio.wait_for(proc.wait(), timeout=2.0)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+            except ProcessLookupError:
+                pass
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None, after_seq: Optional[int] = None,
+              tag: Optional[str] = None, pid: Optional[int] = None, min_priority: str = "V",
+              pattern: Optional[str] = None, limit: int = 200) -> dict:
+        """Filter buffered records and return a cursor for the next query.
+
+        After a cursor the oldest `limit` matches are returned and the cursor stops at the last one returned,
+        so paging with it never skips a record; without one the newest `limit` matches are returned.
+        """
+        regex = re.compile(pattern) if pattern else None
+        min_level = PRIORITIES.find(min_priority.upper())
+        if after_seq is not None:
+            # Sequence numbers are contiguous, so the records after the cursor start at a known offset
+            first = self.records[0].seq if self.records else 0
+            candidates = itertools.islice(self.records, max(0, after_seq - first + 1), None)
+        else:
+            candidates = reversed(self.records)
+        matches = []
+        truncated = False
+        for record in candidates:
+            if since is not None and record.timestamp < since:
+                if after_seq is None:
+                    break
+                continue
+            if until is not None and record.timestamp > until:
+                continue
+            if tag is not None and record.tag != tag:
+                continue
+            if pid is not None and record.pid != pid:
+                continue
+            if min_level > 0 and PRIORITIES.find(record.priority) < min_level:
+                continue
+            if regex and not regex.search(record.message) and not regex.search(record.tag):
+                continue
+            if len(matches) >= limit:
+                truncated = True
+                break
+            matches.append(record)
+        if after_seq is None:
+            matches.reverse()
+        if truncated and after_seq is not None:
+            cursor = matches[-1].seq if matches else after_seq
+        else:
+            cursor = self.records[-1].seq if self.records else (after_seq or 0)
+        return {
+            'count': len(matches),
+            'truncated': truncated,
+            'cursor': cursor,
+            'records': [record.to_dict() for record in matches],
+        }
+
+    def stats(self) -> dict:
+        return {
+            'serial': self.serial,
+            'running': self.running,
+            'buffered_records': len(self.records),
+            'buffer_size': self.records.maxlen,
+            'dropped_records': self.dropped,
+            'started_at': self.started_at,
+            'filters': logcat_filter_specs(self.tags, self.min_priority),
+            'last_error': self.last_error,
+        }
+
+
+collectors: dict[str, LogcatCollector] = {}
+
+
+async def start_log_collector(serial: str, buffer_size: int = 50000, tags: Optional[list[str]] = None,
+                              min_priority: str = "V", buffers: Optional[list[str]] = None) -> str:
+    """Start a background logcat collector for an Android device"""
+    try:
+        if min_priority.upper() not in PRIORITIES:
+            raise ValueError(f"Invalid priority '{min_priority}', use one of: {', '.join(PRIORITIES)}")
+        collector = collectors.get(serial)
+        if collector and collector.running:
+            return f"Log collector already running for device '{serial}'"
+        collector = collectors[serial] = LogcatCollector(serial, buffer_size, tags, min_priority, buffers)
+        await collector.start()
+        return f"Log collector started for device '{serial}' (buffer of {collector.records.maxlen} records)"
+    except Exception as e:
+        return f"Failed to start log collector for device '{serial}': {str(e)}"
+
+
+async def stop_log_collector(serial: str) -> str:
+    """Stop the background logcat collector of an Android device"""
+    try:
+        collector = collectors.pop(serial, None)
+        if collector is None:
+            return f"No log collector running for device '{serial}'"
+        await collector.stop()
+        return f"Log collector stopped for device '{serial}' ({len(collector.records)} records discarded)"
+    except Exception as e:
+        return f"Failed to stop log collector for device '{serial}': {str(e)}"
+
+
+async def query_logs(serial: str, since_seconds: Optional[float] = None, after_cursor: Optional[int] = None,
+                     tag: Optional[str] = None, pid: Optional[int] = None, min_priority: str = "V",
+                     pattern: Optional[str] = None, limit: int = 200) -> dict:
+    """Query the records buffered by the collector of an Android device"""
+    collector = collectors.get(serial)
+    if collector is None:
+        raise RuntimeError(f"No log collector running for device '{serial}', start one with start_log_collector")
+    since = time.time() - since_seconds if since_seconds is not None else None
+    result = collector.query(since=since, after_seq=after_cursor, tag=tag, pid=pid, min_priority=min_priority,
+                             pattern=pattern, limit=limit)
+    result['collector'] = collector.stats()
+    return result
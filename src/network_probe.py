@@ -0,0 +1,227 @@
+import asyncio
+import re
+import sys
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from src.adb_manager import run_adb
+from src.adb_supervisor import supervisor
+
+UNKNOWN = 'Unknown'
+
+_INTERFACE = re.compile(r"^\d+:\s+([^:@\s]+)")
+
+
+class LineParser(ABC):
+    """Reads a probe output line by line until the field is found.
+
+    `feed` returns the value as soon as it is known. `result` gives the best value seen
+    once the output ended without a definite match.
+    """
+
+    @abstractmethod
+    def feed(self, line: str) -> Optional[str]:
+        pass
+
+    def result(self) -> Optional[str]:
+        return None
+
+
+class _AddressParser(LineParser):
+    """Wi-Fi addresses win right away, other non-loopback ones are kept as a fallback"""
+
+    def __init__(self):
+        self.interface = None
+        self.candidate = None
+
+    def address(self, interface: Optional[str], address: str) -> Optional[str]:
+        if address.startswith('127.') or interface == 'lo':
+            return None
+        if interface and interface.startswith('wlan'):
+            return address
+        self.candidate = self.candidate or address
+        return None
+
+    def result(self) -> Optional[str]:
+        return self.candidate
+
+
+class IpOneLineParser(_AddressParser):
+    """`ip -o -4 addr show`: 3: wlan0    inet 192.168.1.5/24 brd 192.168.1.255 scope global wlan0"""
+
+    def feed(self, line: str) -> Optional[str]:
+        parts = line.split()
+        if len(parts) < 4 or 'inet' not in parts:
+            return None
+        return self.address(parts[1], parts[parts.index('inet') + 1].split('/')[0])
+
+
+class IpAddrParser(_AddressParser):
+    """`ip addr show`, where the interface is named on the line before its addresses"""
+
+    def feed(self, line: str) -> Optional[str]:
+        interface = _INTERFACE.match(line)
+        if interface:
+            self.interface = interface.group(1)
+            return None
+        line = line.strip()
+        if line.startswith('inet '):
+            return self.address(self.interface, line.split()[1].split('/')[0])
+        return None
+
+
+class IfconfigParser(LineParser):
+    def feed(self, line: str) -> Optional[str]:
+        if 'inet addr:' in line:
+            address = line.split('inet addr:')[1].split()[0]
+            if not address.startswith('127.'):
+                return address
+        return None
+
+
+class DhcpPropParser(LineParser):
+    def feed(self, line: str) -> Optional[str]:
+        line = line.strip()
+        return line if re.fullmatch(r"\d+\.\d+\.\d+\.\d+", line) and not line.startswith('127.') else None
+
+
+def _ssid(value: str) -> Optional[str]:
+    ssid = value.strip().strip('"')
+    return ssid if ssid and not ssid.isspace() and ssid not in ('<unknown ssid>', 'null') else None
+
+
+class CmdWifiParser(LineParser):
+    """`cmd wifi status` (Android 11+), which also tells for sure when Wi-Fi is not connected"""
+
+    def feed(self, line: str) -> Optional[str]:
+        line = line.strip()
+        if line.startswith('Wifi is connected to'):
+            return _ssid(line[len('Wifi is connected to'):])
+        if line in ('Wifi is disabled', 'Wifi is not connected'):
+            return UNKNOWN
+        if line.startswith('WifiInfo:') and 'SSID:' in line:
+            return _ssid(line.split('SSID:')[1].split(',')[0])
+        return None
+
+
+class WifiInfoParser(LineParser):
+    """The mWifiInfo line of `dumpsys wifi`"""
+
+    def feed(self, line: str) -> Optional[str]:
+        line = line.strip()
+        if 'mWifiInfo' in line and 'SSID:' in line:
+            return _ssid(line.split('SSID:')[1].split(',')[0])
+        if 'Connected to:' in line:
+            return _ssid(line.split('Connected to:')[1])
+        return None
+
+
+class ConnectivityParser(LineParser):
+    def feed(self, line: str) -> Optional[str]:
+        if 'ExtraInfo:' in line and '"' in line:
+            return _ssid(line.split('"')[1])
+        return None
+
+
+@dataclass(frozen=True)
+class ProbeSource:
+    name: str
+    command: str
+    parser: Callable[[], LineParser]
+
+
+# Cheapest and most targeted sources first. Output is narrowed on the device where possible,
+# so dumpsys stops as soon as grep has its line instead of sending megabytes.
+PROBE_SOURCES = {
+    'ip_address': (
+        ProbeSource('ip_oneline', "ip -o -4 addr show", IpOneLineParser),
+        ProbeSource('ip_addr', "ip addr show", IpAddrParser),
+        ProbeSource('ifconfig', "ifconfig wlan0", IfconfigParser),
+        ProbeSource('dhcp_prop', "getprop dhcp.wlan0.ipaddress", DhcpPropParser),
+    ),
+    'wifi_name': (
+        ProbeSource('cmd_wifi', "cmd wifi status", CmdWifiParser),
+        ProbeSource('wifi_info', "dumpsys wifi | grep -m 1 -E 'mWifiInfo|Connected to:'", WifiInfoParser),
+        ProbeSource('connectivity', "dumpsys connectivity | grep -m 1 ExtraInfo", ConnectivityParser),
+    ),
+}
+
+
+def parse_source(source: ProbeSource, output: str, complete: bool = True) -> Optional[str]:
+    """Value of the field in the output of a source; fallback values only count if `complete`"""
+    parser = source.parser()
+    for line in output.split('\n'):
+        value = parser.feed(line)
+        if value is not None:
+            return value
+    return parser.result() if complete else None
+
+
+class NetworkProbe:
+    """Finds the IP address and Wi-Fi name of a device from the cheapest source that works.
+
+    Sources are tried in order until one yields the field. The source that worked is
+    remembered per device, so later calls go straight to it.
+    """
+
+    def __init__(self):
+        self._preferred: dict[str, dict[str, str]] = {}
+
+    def sources(self, serial: str, field: str) -> list[ProbeSource]:
+        """Sources of a field in the order to try them, the remembered one first"""
+        sources = list(PROBE_SOURCES[field])
+        preferred = self._preferred.get(serial, {}).get(field)
+        sources.sort(key=lambda source: source.name != preferred)
+        return sources
+
+    def batch_commands(self, serial: str) -> dict[str, str]:
+        """First choice command of every field, for callers batching them into one shell round-trip"""
+        return {field: self.sources(serial, field)[0].command for field in PROBE_SOURCES}
+
+    async def details(self, serial: str, batched: Optional[dict[str, str]] = None) -> dict[str, str]:
+        """IP address, Wi-Fi name and connection type; `batched` holds outputs of `batch_commands`"""
+        fields = list(PROBE_SOURCES)
+        values = await asyncio.gather(*(self.probe(serial, field, (batched or {}).get(field)) for field in fields))
+        network = dict(zip(fields, values))
+        network['connection_type'] = UNKNOWN
+        if network['ip_address'] != UNKNOWN:
+            network['connection_type'] = 'WiFi' if network['wifi_name'] != UNKNOWN else 'Mobile Data'
+        return network
+
+    async def probe(self, serial: str, field: str, first_output: Optional[str] = None) -> str:
+        for index, source in enumerate(self.sources(serial, field)):
+            if index == 0 and first_output is not None:
+                value = parse_source(source, first_output)
+            else:
+                value = await self._run_source(serial, source)
+            if value is not None:
+                self._preferred.setdefault(serial, {})[field] = source.name
+                return value
+        self._preferred.get(serial, {}).pop(field, None)
+        return UNKNOWN
+
+    @staticmethod
+    async def _run_source(serial: str, source: ProbeSource) -> Optional[str]:
+        # The sources are narrowed on the device, so their output is small enough to take in one go
+        try:
+            code, output, err = await run_adb("-s", serial, "shell", source.command, timeout=10.0)
+        except Exception as e:
+            print(f"Network probe '{source.name}' failed on device {serial}: {str(e)}", file=sys.stderr)
+            return None
+        return parse_source(source, output, complete=code == 0)
+
+    def forget(self, serial: str):
+        self._preferred.pop(serial, None)
+
+
+network_probe = NetworkProbe()
+
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]):
+    # A reboot may come with a different Android version or network setup
+    if new_state != "device":
+        network_probe.forget(serial)
+
+
+supervisor.add_listener(_on_device_change)
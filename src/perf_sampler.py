@@ -0,0 +1,335 @@
+import asyncio
+import math
+import shlex
+import sys
+import time
+from array import array
+from typing import Optional
+
+from src.device_management import run_probe_script
+from src.scheduler import PRIORITY_LOW
+
+MAX_CONSECUTIVE_FAILURES = 5
+
+# Frames taking longer than one 60 Hz vsync count as janky
+JANK_THRESHOLD_MS = 1000 / 60
+
+# Thermal zones above this (millidegrees) are bogus readings some kernels report
+MAX_PLAUSIBLE_TEMP = 150000
+
+SYSTEM_METRICS = ("cpu_percent", "mem_used_percent", "mem_available_mb", "battery_level", "battery_temp_c",
+                  "thermal_c")
+APP_METRICS = ("app_cpu_percent", "app_rss_mb", "fps", "jank_frames", "frame_p95_ms")
+
+
+class SampleBuffer:
+    """Fixed-size ring buffer of samples, one array of doubles per metric with NaN for missing values"""
+
+    def __init__(self, metrics: tuple[str, ...], capacity: int):
+        self.metrics = metrics
+        self.capacity = max(1, capacity)
+        self.times = array('d', [0.0]) * self.capacity
+        self.values = {metric: array('d', [math.nan]) * self.capacity for metric in metrics}
+        self.start = 0
+        self.count = 0
+
+    def append(self, timestamp: float, sample: dict[str, float]):
+        index = (self.start + self.count) % self.capacity
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+        else:
+            self.count += 1
+        self.times[index] = timestamp
+        for metric, values in self.values.items():
+            values[index] = sample.get(metric, math.nan)
+
+    def indices(self, since: Optional[float] = None) -> list[int]:
+        """Buffer indices of the samples taken at or after `since`, oldest first"""
+        indices = [(self.start + offset) % self.capacity for offset in range(self.count)]
+        if since is not None:
+            indices = [index for index in indices if self.times[index] >= since]
+        return indices
+
+
+def aggregate(values: list[float]) -> Optional[dict]:
+    values = sorted(value for value in values if not math.isnan(value))
+    if not values:
+        return None
+    return {
+        'min': round(values[0], 2),
+        'max': round(values[-1], 2),
+        'avg': round(sum(values) / len(values), 2),
+        'p95': round(values[max(0, math.ceil(0.95 * len(values)) - 1)], 2),
+    }
+
+
+def _number(text: str) -> float:
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class PerfSampler:
+    """Samples CPU, memory, frame timing, battery and thermal state of one device at a fixed interval.
+
+    All reads of a tick are batched into one shell round-trip at low priority. CPU usage is
+    derived from the jiffies delta between consecutive ticks, frame timing from the frames
+    `dumpsys gfxinfo framestats` reports since the previous tick.
+    """
+
+    def __init__(self, serial: str, package: Optional[str] = None, interval: float = 1.0, buffer_size: int = 3600):
+        self.serial = serial
+        self.package = package
+        self.interval = max(0.2, interval)
+        self.buffer = SampleBuffer(SYSTEM_METRICS + (APP_METRICS if package else ()), buffer_size)
+        self.started_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._previous_cpu: Optional[tuple[float, float]] = None
+        self._previous_app_jiffies: Optional[float] = None
+        self._last_vsync = 0
+        self._last_frames_read: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def probes(self) -> dict[str, str]:
+        probes = {
+            'cpu': "head -n 1 /proc/stat",
+            'meminfo': "grep -E '^(MemTotal|MemAvailable):' /proc/meminfo",
+            'battery': "dumpsys battery | grep -E 'level:|temperature:'",
+            'thermal': "cat /sys/class/thermal/thermal_zone*/temp",
+        }
+        if self.package:
+            package = shlex.quote(self.package)
+            # Sections run in one shell, so $pid carries over to the following ones
+            probes['pid'] = f"pid=$(pidof -s {package}); echo $pid"
+            probes['app_stat'] = '[ -n "$pid" ] && cat /proc/$pid/stat'
+            probes['app_status'] = '[ -n "$pid" ] && grep VmRSS /proc/$pid/status'
+            probes['frames'] = f"dumpsys gfxinfo {package} framestats | grep -E '^(Flags|[0-9]+,)'"
+        return probes
+
+    def start(self):
+        if self.running:
+            return
+        self.started_at = time.time()
+        self.last_error = None
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        failures = 0
+        probes = self.probes()
+        while True:
+            started = time.monotonic()
+            try:
+                sections = await run_probe_script(self.serial, probes, timeout=max(10.0, self.interval * 5),
+                                                  priority=PRIORITY_LOW)
+                self.buffer.append(time.time(), self.parse(sections, time.monotonic()))
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.last_error = str(e)
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    print(f"[perf] Stopping performance sampler for device '{self.serial}': {e}", file=sys.stderr)
+                    return
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def parse(self, sections: dict[str, str], now: float) -> dict[str, float]:
+        sample = {}
+        total_jiffies = self._parse_cpu(sections.get('cpu', ''), sample)
+        self._parse_meminfo(sections.get('meminfo', ''), sample)
+        self._parse_battery(sections.get('battery', ''), sample)
+        temps = [_number(line) for line in sections.get('thermal', '').split()]
+        temps = [temp for temp in temps if 0 < temp < MAX_PLAUSIBLE_TEMP]
+        if temps:
+            # Zones report millidegrees, a few older kernels whole degrees
+            sample['thermal_c'] = max(temp / 1000 if temp > 1000 else temp for temp in temps)
+        if self.package:
+            self._parse_app(sections, total_jiffies, sample)
+            self._parse_frames(sections.get('frames', ''), now, sample)
+        return sample
+
+    def _parse_cpu(self, output: str, sample: dict) -> Optional[float]:
+        """System CPU usage; returns the jiffies elapsed since the previous tick"""
+        fields = output.split()
+        if len(fields) < 5 or fields[0] != "cpu":
+            return None
+        values = [_number(field) for field in fields[1:9]]
+        total = sum(value for value in values if not math.isnan(value))
+        idle = values[3] + (values[4] if len(values) > 4 and not math.isnan(values[4]) else 0)
+        previous, self._previous_cpu = self._previous_cpu, (total, idle)
+        if previous is None or total <= previous[0]:
+            return None
+        elapsed = total - previous[0]
+        sample['cpu_percent'] = 100 * (1 - (idle - previous[1]) / elapsed)
+        return elapsed
+
+    @staticmethod
+    def _parse_meminfo(output: str, sample: dict):
+        memory = {}
+        for line in output.splitlines():
+            name, _, value = line.partition(":")
+            memory[name.strip()] = _number(value.split()[0]) if value.split() else math.nan
+        total, available = memory.get("MemTotal"), memory.get("MemAvailable")
+        if total and available is not None and not math.isnan(available):
+            sample['mem_available_mb'] = available / 1024
+            sample['mem_used_percent'] = 100 * (1 - available / total)
+
+    @staticmethod
+    def _parse_battery(output: str, sample: dict):
+        for line in output.splitlines():
+            name, _, value = line.strip().partition(":")
+            if name == "level":
+                sample['battery_level'] = _number(value)
+            elif name == "temperature":
+                # Tenths of a degree Celsius
+                sample['battery_temp_c'] = _number(value) / 10
+
+    def _parse_app(self, sections: dict[str, str], total_jiffies: Optional[float], sample: dict):
+        stat = sections.get('app_stat', '')
+        if ")" not in stat:
+            # App not running, the next start begins a new CPU time series
+            self._previous_app_jiffies = None
+            return
+        # Fields after the command name, which may itself contain spaces and parentheses
+        fields = stat[stat.rindex(")") + 2:].split()
+        jiffies = _number(fields[11]) + _number(fields[12]) if len(fields) > 12 else math.nan
+        previous, self._previous_app_jiffies = self._previous_app_jiffies, jiffies
+        if previous is not None and total_jiffies and not math.isnan(jiffies) and jiffies >= previous:
+            sample['app_cpu_percent'] = 100 * (jiffies - previous) / total_jiffies
+        for line in sections.get('app_status', '').splitlines():
+            if line.startswith("VmRSS:") and len(line.split()) > 1:
+                sample['app_rss_mb'] = _number(line.split()[1]) / 1024
+
+    def _parse_frames(self, output: str, now: float, sample: dict):
+        columns = {}
+        durations = []
+        newest = self._last_vsync
+        for line in output.splitlines():
+            fields = line.strip().rstrip(",").split(",")
+            if fields[0] == "Flags":
+                # Columns differ between Android versions, every window's block starts with a header
+                columns = {name: index for index, name in enumerate(fields)}
+                continue
+            start_index, end_index = columns.get("IntendedVsync"), columns.get("FrameCompleted")
+            if start_index is None or end_index is None or len(fields) <= max(start_index, end_index):
+                continue
+            try:
+                flags, start, end = int(fields[0]), int(fields[start_index]), int(fields[end_index])
+            except ValueError:
+                continue
+            # Only frames completed since the previous tick, skipping frames flagged as not drawn normally
+            if flags != 0 or start <= self._last_vsync or end <= start:
+                continue
+            durations.append((end - start) / 1e6)
+            newest = max(newest, start)
+        previous_read, self._last_frames_read = self._last_frames_read, now
+        self._last_vsync = newest
+        if previous_read is None or now <= previous_read:
+            # The first read holds the frames of before the sampler started
+            return
+        sample['fps'] = len(durations) / (now - previous_read)
+        sample['jank_frames'] = float(sum(1 for duration in durations if duration > JANK_THRESHOLD_MS))
+        if durations:
+            sample['frame_p95_ms'] = aggregate(durations)['p95']
+
+    def query(self, metrics: Optional[list[str]] = None, window_seconds: Optional[float] = None,
+              buckets: int = 0) -> dict:
+        """Aggregates of each metric over the window, optionally split into `buckets` time buckets"""
+        unknown = [metric for metric in metrics or [] if metric not in self.buffer.metrics]
+        if unknown:
+            raise ValueError(f"Unknown metrics {', '.join(unknown)}, use any of: {', '.join(self.buffer.metrics)}")
+        since = time.time() - window_seconds if window_seconds else None
+        indices = self.buffer.indices(since)
+        result = {
+            'serial': self.serial,
+            'package': self.package,
+            'samples': len(indices),
+            'from': self.buffer.times[indices[0]] if indices else None,
+            'to': self.buffer.times[indices[-1]] if indices else None,
+            'metrics': {},
+        }
+        groups = []
+        if buckets > 0 and indices:
+            first, last = self.buffer.times[indices[0]], self.buffer.times[indices[-1]]
+            width = (last - first) / buckets or 1.0
+            for index in indices:
+                position = min(buckets - 1, int((self.buffer.times[index] - first) / width))
+                if not groups or groups[-1][0] != position:
+                    groups.append((position, []))
+                groups[-1][1].append(index)
+        for metric in metrics or self.buffer.metrics:
+            values = self.buffer.values[metric]
+            summary = aggregate([values[index] for index in indices])
+            if summary is None:
+                continue
+            if groups:
+                summary['series'] = [{'time': round(self.buffer.times[group[0]], 3),
+                                      **(aggregate([values[index] for index in group]) or {})}
+                                     for _, group in groups]
+            result['metrics'][metric] = summary
+        return result
+
+    def stats(self) -> dict:
+        return {
+            'serial': self.serial,
+            'running': self.running,
+            'package': self.package,
+            'interval': self.interval,
+            'buffered_samples': self.buffer.count,
+            'buffer_size': self.buffer.capacity,
+            'started_at': self.started_at,
+            'last_error': self.last_error,
+        }
+
+
+perf_samplers: dict[str, PerfSampler] = {}
+
+
+async def start_perf_sampler(serial: str, package: Optional[str] = None, interval: float = 1.0,
+                             buffer_size: int = 3600) -> str:
+    """Start sampling performance metrics of an Android device in the background"""
+    try:
+        sampler = perf_samplers.get(serial)
+        if sampler and sampler.running:
+            return f"Performance sampler already running for device '{serial}'"
+        sampler = perf_samplers[serial] = PerfSampler(serial, package, interval, buffer_size)
+        sampler.start()
+        return (f"Performance sampler started for device '{serial}' every {sampler.interval} seconds "
+                f"(buffer of {sampler.buffer.capacity} samples)")
+    except Exception as e:
+        return f"Failed to start performance sampler for device '{serial}': {str(e)}"
+
+
+async def stop_perf_sampler(serial: str) -> str:
+    """Stop the performance sampler of an Android device"""
+    try:
+        sampler = perf_samplers.pop(serial, None)
+        if sampler is None:
+            return f"No performance sampler running for device '{serial}'"
+        await sampler.stop()
+        return f"Performance sampler stopped for device '{serial}' ({sampler.buffer.count} samples discarded)"
+    except Exception as e:
+        return f"Failed to stop performance sampler for device '{serial}': {str(e)}"
+
+
+async def query_perf_samples(serial: str, metrics: Optional[list[str]] = None, window_seconds: Optional[float] = None,
+                             buckets: int = 0) -> dict:
+    """Aggregate the samples buffered by the performance sampler of an Android device"""
+    sampler = perf_samplers.get(serial)
+    if sampler is None:
+        raise RuntimeError(f"No performance sampler running for device '{serial}', start one with start_perf_sampler")
+    result = sampler.query(metrics, window_seconds, buckets)
+    result['sampler'] = sampler.stats()
+    return result
@@ -0,0 +1,78 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from src.adb_supervisor import supervisor
+
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+# How long volatile device details stay valid, in seconds
+VOLATILE_TTLS = {
+    'battery': 30.0,
+    'network': 60.0,
+}
+
+
+@dataclass
+class _DeviceEntry:
+    boot_id: Optional[str] = None
+    props: dict[str, str] = field(default_factory=dict)
+    volatile: dict[str, tuple[float, Any]] = field(default_factory=dict)
+
+
+class DevicePropertyCache:
+    """Per-device cache of read-only `ro.*` properties, scoped to a single boot.
+
+    Properties are stored together with the kernel boot_id they were read under, so a
+    reboot is detected even if the disconnect was missed. Volatile details such as
+    battery and network are cached separately with short TTLs.
+    """
+
+    def __init__(self, ttls: Optional[dict[str, float]] = None):
+        self.ttls = dict(VOLATILE_TTLS if ttls is None else ttls)
+        self._entries: dict[str, _DeviceEntry] = {}
+
+    def get_props(self, serial: str) -> Optional[tuple[str, dict[str, str]]]:
+        """Return (boot_id, props) cached for the device, if any"""
+        entry = self._entries.get(serial)
+        if entry is None or entry.boot_id is None:
+            return None
+        return entry.boot_id, entry.props
+
+    def set_props(self, serial: str, boot_id: str, props: dict[str, str]):
+        entry = self._entries.get(serial)
+        if entry is None or entry.boot_id != boot_id:
+            entry = self._entries[serial] = _DeviceEntry()
+        entry.boot_id = boot_id
+        entry.props = {key: value for key, value in props.items() if key.startswith('ro.')}
+
+    def get_volatile(self, serial: str, name: str) -> Optional[Any]:
+        entry = self._entries.get(serial)
+        if entry is None or name not in entry.volatile:
+            return None
+        stored_at, value = entry.volatile[name]
+        if time.monotonic() - stored_at > self.ttls.get(name, 0.0):
+            del entry.volatile[name]
+            return None
+        return value
+
+    def set_volatile(self, serial: str, name: str, value: Any):
+        self._entries.setdefault(serial, _DeviceEntry()).volatile[name] = (time.monotonic(), value)
+
+    def invalidate(self, serial: str):
+        self._entries.pop(serial, None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+property_cache = DevicePropertyCache()
+
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]):
+    # Disconnects, reboots and authorization changes all pass through a non-"device" state
+    if new_state != "device":
+        property_cache.invalidate(serial)
+
+
+supervisor.add_listener(_on_device_change)
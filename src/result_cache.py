@@ -0,0 +1,100 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from src.adb_supervisor import supervisor
+from src.fan_out import is_failure
+
+# How long results of read-only tools are reused, in seconds; unset only coalesces concurrent calls
+RESULT_CACHE_TTL = float(os.environ.get("ADB_MCP_RESULT_CACHE_TTL") or 0)
+RESULT_CACHE_MAX_ENTRIES = 256
+
+
+class ResultCache:
+    """Singleflight plus an optional short-lived LRU cache for results of read-only operations.
+
+    Identical calls made while one is in flight share its execution. With a TTL, successful
+    results are also reused for that long. Operations that change a device invalidate its
+    entries, together with device-independent ones such as the device list.
+    """
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+    async def call(self, name: str, serial: Optional[str], arguments: dict,
+                   operation: Callable[[], Awaitable[Any]]) -> Any:
+        key = (name, serial, json.dumps(arguments, sort_keys=True, default=str))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = self._inflight[key] = asyncio.ensure_future(operation())
+            task.add_done_callback(functools.partial(self._finished, key))
+        # One caller giving up must not cancel the execution the others are waiting for
+        return await asyncio.shield(task)
+
+    def _finished(self, key: tuple, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        else:
+            # Invalidated while running, the result may predate the change
+            return
+        if self.ttl <= 0 or task.cancelled() or task.exception() is not None or is_failure(task.result()):
+            return
+        self._entries[key] = (time.monotonic(), task.result())
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, serial: Optional[str] = None):
+        """Drop the results of a device and of device-independent calls, or everything"""
+        for key in [key for key in self._entries if serial is None or key[1] in (serial, None)]:
+            del self._entries[key]
+        # Calls already running may have read the old state, later callers start a new one
+        for key in [key for key in self._inflight if serial is None or key[1] in (serial, None)]:
+            del self._inflight[key]
+
+    def clear(self):
+        self.invalidate()
+
+
+result_cache = ResultCache()
+
+
+def coalesced(name: str):
+    """Run a read-only async function through the result cache, keyed by its arguments"""
+    def decorator(fn: Callable[..., Awaitable[Any]]):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            return await result_cache.call(name, arguments.get("serial"), arguments, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]):
+    result_cache.invalidate(serial)
+
+
+supervisor.add_listener(_on_device_change)
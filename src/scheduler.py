@@ -0,0 +1,205 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+QUICK_LANE = "quick"
+BULK_LANE = "bulk"
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# Concurrent commands per device and across all devices, per lane
+DEVICE_LANE_LIMITS = {QUICK_LANE: 4, BULK_LANE: 1}
+GLOBAL_LANE_LIMITS = {QUICK_LANE: 64, BULK_LANE: 8}
+
+BULK_COMMANDS = ("push", "pull", "install", "install-multiple", "sync", "backup", "restore", "bugreport", "sideload")
+BULK_SHELL_PROGRAMS = ("screenrecord", "tar", "dd", "md5sum", "sha256sum")
+
+
+class CommandCancelled(RuntimeError):
+    """Raised in the caller of a command that was cancelled through the scheduler"""
+
+
+def classify_lane(args: tuple, timeout: Optional[float] = None) -> str:
+    """Put transfers, installs, recordings and streaming commands in the bulk lane"""
+    args = list(args)
+    if len(args) >= 2 and args[0] == "-s":
+        args = args[2:]
+    if not args:
+        return QUICK_LANE
+    command, rest = args[0], args[1:]
+    if command in BULK_COMMANDS:
+        return BULK_LANE
+    if command == "logcat" and not ({"-d", "-c"} & set(rest)):
+        return BULK_LANE
+    if command in ("shell", "exec-out", "exec-in") and rest:
+        program = rest[0].split()[0] if rest[0].split() else ""
+        if program in BULK_SHELL_PROGRAMS:
+            return BULK_LANE
+    if timeout is None or timeout > 120:
+        return BULK_LANE
+    return QUICK_LANE
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    future: asyncio.Future = field(compare=False)
+    cancelled_by_scheduler: bool = field(default=False, compare=False)
+
+
+@dataclass
+class _Running:
+    lane: str
+    task: asyncio.Task
+    description: str
+    started: float = field(default_factory=time.monotonic)
+    cancelled_by_scheduler: bool = False
+
+
+class CommandScheduler:
+    """Queues adb commands per device in priority lanes.
+
+    Each device gets a separate concurrency cap for quick and bulk commands, so short
+    interactive commands are not stuck behind transfers. Free global slots are handed to
+    waiting devices in round-robin order, so one busy device cannot starve the others.
+    """
+
+    def __init__(self, device_limits: Optional[dict[str, int]] = None, global_limits: Optional[dict[str, int]] = None):
+        self.device_limits = dict(device_limits or DEVICE_LANE_LIMITS)
+        self.global_limits = dict(global_limits or GLOBAL_LANE_LIMITS)
+        self._seq = itertools.count()
+        self._queues: dict[tuple[str, str], list[_Waiter]] = {}
+        self._running: dict[tuple[str, str], int] = {}
+        self._global_running: dict[str, int] = {lane: 0 for lane in self.global_limits}
+        self._ready: dict[str, deque[str]] = {lane: deque() for lane in self.global_limits}
+        self._tasks: dict[str, list[_Running]] = {}
+
+    async def run(self, serial: str, lane: str, factory: Callable[[], Awaitable[Any]],
+                  priority: int = PRIORITY_NORMAL, description: str = "") -> Any:
+        """Wait for a slot in the lane of the device, then run the coroutine produced by `factory`"""
+        await self._acquire(serial, lane, priority)
+        task = asyncio.ensure_future(factory())
+        running = _Running(lane, task, description)
+        self._tasks.setdefault(serial, []).append(running)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if running.cancelled_by_scheduler and task.cancelled():
+                raise CommandCancelled(f"Command cancelled on device '{serial}'")
+            raise
+        finally:
+            self._untrack(serial, running)
+            self._release(serial, lane)
+
+    def track(self, serial: str, lane: str, task: asyncio.Task, description: str = ""):
+        """Make a long-running task visible to `status` and `cancel` without holding a lane slot.
+
+        For recordings and log collectors, which run for minutes and would otherwise block
+        the lane of the device for as long.
+        """
+        running = _Running(lane, task, description)
+        self._tasks.setdefault(serial, []).append(running)
+        task.add_done_callback(lambda _: self._untrack(serial, running))
+
+    def _untrack(self, serial: str, running: _Running):
+        entries = self._tasks.get(serial, [])
+        if running in entries:
+            entries.remove(running)
+            if not entries:
+                del self._tasks[serial]
+
+    async def _acquire(self, serial: str, lane: str, priority: int):
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queues.setdefault((serial, lane), []), waiter)
+        if serial not in self._ready[lane]:
+            self._ready[lane].append(serial)
+        self._dispatch(lane)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted right as the caller went away, hand it on
+                self._release(serial, lane)
+            if waiter.cancelled_by_scheduler:
+                raise CommandCancelled(f"Queued command cancelled on device '{serial}'")
+            raise
+
+    def _dispatch(self, lane: str):
+        ready = self._ready[lane]
+        blocked = []
+        while ready and self._global_running[lane] < self.global_limits[lane]:
+            serial = ready.popleft()
+            key = (serial, lane)
+            queue = self._queues.get(key, [])
+            while queue and queue[0].future.done():
+                heapq.heappop(queue)
+            if not queue:
+                self._queues.pop(key, None)
+                continue
+            if self._running.get(key, 0) >= self.device_limits[lane]:
+                blocked.append(serial)
+                continue
+            waiter = heapq.heappop(queue)
+            self._running[key] = self._running.get(key, 0) + 1
+            self._global_running[lane] += 1
+            waiter.future.set_result(None)
+            if queue:
+                ready.append(serial)
+        ready.extend(blocked)
+
+    def _release(self, serial: str, lane: str):
+        key = (serial, lane)
+        self._running[key] -= 1
+        if not self._running[key]:
+            del self._running[key]
+        self._global_running[lane] -= 1
+        self._dispatch(lane)
+
+    def cancel(self, serial: str, lane: Optional[str] = None, include_running: bool = True) -> dict:
+        """Cancel queued (and running) commands of a device; running adb streams are killed"""
+        queued = 0
+        for (queue_serial, queue_lane), queue in self._queues.items():
+            if queue_serial != serial or (lane and queue_lane != lane):
+                continue
+            for waiter in queue:
+                if not waiter.future.done():
+                    waiter.cancelled_by_scheduler = True
+                    waiter.future.cancel()
+                    queued += 1
+        running = 0
+        if include_running:
+            for entry in self._tasks.get(serial, []):
+                if (lane is None or entry.lane == lane) and not entry.task.done():
+                    entry.cancelled_by_scheduler = True
+                    entry.task.cancel()
+                    running += 1
+        return {'queued_cancelled': queued, 'running_cancelled': running}
+
+    def status(self) -> dict:
+        devices = {}
+        for (serial, lane), queue in self._queues.items():
+            waiting = sum(1 for waiter in queue if not waiter.future.done())
+            if waiting:
+                devices.setdefault(serial, {}).setdefault(lane, {})['queued'] = waiting
+        now = time.monotonic()
+        for serial, entries in self._tasks.items():
+            for entry in entries:
+                lane_info = devices.setdefault(serial, {}).setdefault(entry.lane, {})
+                lane_info.setdefault('running', []).append(
+                    {'command': entry.description, 'seconds': round(now - entry.started, 1)})
+        return {
+            'device_limits': self.device_limits,
+            'global_limits': self.global_limits,
+            'global_running': dict(self._global_running),
+            'devices': devices,
+        }
+
+
+scheduler = CommandScheduler()
@@ -0,0 +1,92 @@
+import asyncio
+import io
+import struct
+from typing import Optional
+
+from PIL import Image
+
+from src.adb_manager import run_adb_raw
+
+# screencap raw pixel formats: format id -> (bytes per pixel, Pillow raw mode, image mode)
+RAW_PIXEL_FORMATS = {
+    1: (4, "RGBA", "RGBA"),  # RGBA_8888
+    2: (4, "RGBX", "RGB"),  # RGBX_8888
+    3: (3, "RGB", "RGB"),  # RGB_888
+    4: (2, "BGR;16", "RGB"),  # RGB_565
+    5: (4, "BGRA", "RGBA"),  # BGRA_8888
+}
+
+IMAGE_FORMATS = {
+    'png': "PNG",
+    'jpeg': "JPEG",
+    'jpg': "JPEG",
+    'webp': "WEBP",
+}
+
+
+async def capture_screen(serial: str, raw: bool = True, timeout: Optional[float] = 30.0) -> Image.Image:
+    """Capture the screen over exec-out straight into memory, without staging a file on the device"""
+    args = ("-s", serial, "exec-out", "screencap") if raw else ("-s", serial, "exec-out", "screencap", "-p")
+    code, data, err = await run_adb_raw(*args, timeout=timeout)
+    if code != 0 or not data:
+        raise RuntimeError(f"screencap failed: {err.decode(errors='ignore').strip()}")
+    return await asyncio.to_thread(decode_screencap, data)
+
+
+def decode_screencap(data: bytes) -> Image.Image:
+    """Decode screencap output, either the raw framebuffer dump or a PNG"""
+    if data.startswith(b"\x89PNG"):
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+    return decode_raw_framebuffer(data)
+
+
+def decode_raw_framebuffer(data: bytes) -> Image.Image:
+    if len(data) < 12:
+        raise ValueError("screencap output is too short")
+    width, height, pixel_format = struct.unpack("<III", data[:12])
+    if pixel_format not in RAW_PIXEL_FORMATS:
+        raise ValueError(f"Unsupported screencap pixel format: {pixel_format}")
+    bytes_per_pixel, raw_mode, mode = RAW_PIXEL_FORMATS[pixel_format]
+    size = width * height * bytes_per_pixel
+    # Android 9+ adds a 4 byte color space field to the header
+    header = 12 if len(data) - 12 == size else 16
+    if len(data) - header < size:
+        raise ValueError(f"screencap output is truncated: expected {size} bytes of pixels")
+    return Image.frombuffer(mode, (width, height), data[header:header + size], "raw", raw_mode, 0, 1)
+
+
+def process_image(image: Image.Image, scale: float = 1.0, crop: Optional[list[int]] = None) -> Image.Image:
+    """Crop to (left, top, right, bottom) and then scale the image"""
+    if crop:
+        if len(crop) != 4:
+            raise ValueError("crop must be [left, top, right, bottom]")
+        image = image.crop(tuple(crop))
+    if scale and scale != 1.0:
+        if not 0 < scale <= 1.0:
+            raise ValueError("scale must be between 0 and 1")
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.Resampling.BILINEAR)
+    return image
+
+
+def encode_image(image: Image.Image, image_format: str = "png", quality: int = 80) -> bytes:
+    pil_format = IMAGE_FORMATS.get(image_format.lower())
+    if pil_format is None:
+        raise ValueError(f"Unsupported image format '{image_format}', use one of: png, jpeg, webp")
+    if pil_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    if pil_format == "PNG":
+        image.save(buffer, format=pil_format, compress_level=1)
+    else:
+        image.save(buffer, format=pil_format, quality=quality)
+    return buffer.getvalue()
+
+
+async def screenshot_bytes(serial: str, image_format: str = "png", quality: int = 80, scale: float = 1.0,
+                           crop: Optional[list[int]] = None) -> bytes:
+    """Capture, optionally crop/downscale, and encode a screenshot in memory"""
+    image = await capture_screen(serial)
+    return await asyncio.to_thread(lambda: encode_image(process_image(image, scale, crop), image_format, quality))
@@ -0,0 +1,236 @@
+import asyncio
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from src.adb_manager import ensure_adb_server
+from src.scheduler import scheduler, BULK_LANE
+from src.telemetry import telemetry
+
+# screenrecord stops on its own after this many seconds
+SEGMENT_SECONDS = 180
+MAX_CONSECUTIVE_FAILURES = 3
+RECORDING_FORMATS = ("mp4", "h264")
+
+
+class ScreenRecorder:
+    """Streams the screen of one device as H.264 over exec-out straight into a local file.
+
+    Nothing is staged on the device. screenrecord stops after 3 minutes, so segments are
+    chained back to back into one stream; every segment starts with its own SPS/PPS, so
+    the concatenated stream stays decodable. MP4 output is muxed on the fly by ffmpeg,
+    using the arrival time of the data as timestamps; without ffmpeg the raw H.264 stream
+    is written instead.
+    """
+
+    def __init__(self, serial: str, local_file_path: str, output_format: str = "mp4",
+                 max_duration: Optional[float] = None, bit_rate: Optional[int] = None, size: Optional[str] = None):
+        output_format = output_format.lower()
+        if output_format not in RECORDING_FORMATS:
+            raise ValueError(f"Unsupported recording format '{output_format}', use one of: "
+                             f"{', '.join(RECORDING_FORMATS)}")
+        if output_format == "mp4" and shutil.which("ffmpeg") is None:
+            print(f"[recording] ffmpeg not found, recording device '{serial}' as raw H.264", file=sys.stderr)
+            output_format = "h264"
+            local_file_path = str(Path(local_file_path).with_suffix(".h264"))
+        self.serial = serial
+        self.local_file_path = local_file_path
+        self.output_format = output_format
+        self.max_duration = max_duration
+        self.bit_rate = bit_rate
+        self.size = size
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.segments = 0
+        self.bytes_written = 0
+        self.last_error: Optional[str] = None
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._muxer: Optional[asyncio.subprocess.Process] = None
+        self._file = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def command(self, time_limit: int) -> list[str]:
+        args = ["adb", "-s", self.serial, "exec-out", "screenrecord", "--output-format=h264",
+                "--time-limit", str(time_limit)]
+        if self.bit_rate:
+            args += ["--bit-rate", str(self.bit_rate)]
+        if self.size:
+            args += ["--size", self.size]
+        return args + ["-"]
+
+    async def start(self):
+        if self.running:
+            return
+        await ensure_adb_server()
+        Path(self.local_file_path).parent.mkdir(parents=True, exist_ok=True)
+        if self.output_format == "mp4":
+            telemetry.count_spawn("ffmpeg")
+            self._muxer = await asyncio.create_subprocess_exec(
+                "ffmpeg", "-y", "-loglevel", "error", "-f", "h264", "-use_wallclock_as_timestamps", "1",
+                "-i", "-", "-c", "copy", "-movflags", "+faststart", self.local_file_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        else:
+            self._file = open(self.local_file_path, "wb")
+        self.started_at = time.time()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        # Cancelling the device commands through the scheduler ends the recording
+        scheduler.track(self.serial, BULK_LANE, self._task, "screenrecord")
+
+    async def stop(self):
+        """Stop recording and wait until the output file is complete"""
+        self._stopping.set()
+        proc = self._proc
+        if proc and proc.returncode is None:
+            try:
+                proc.terminate()
+            except ProcessLookupError:
+                pass
+        if self._task:
+            await self._task
+
+    async def wait(self):
+        if self._task:
+            await self._task
+
+    async def _run(self):
+        failures = 0
+        try:
+            while not self._stopping.is_set():
+                time_limit = SEGMENT_SECONDS
+                if self.max_duration is not None:
+                    remaining = self.max_duration - (time.time() - self.started_at)
+                    if remaining < 1:
+                        break
+                    time_limit = min(SEGMENT_SECONDS, int(remaining + 0.5))
+                received = await self._record_segment(time_limit)
+                if received:
+                    failures = 0
+                    self.segments += 1
+                    continue
+                if self._stopping.is_set():
+                    break
+                failures += 1
+                if failures >= MAX_CONSECUTIVE_FAILURES:
+                    print(f"[recording] Stopping screen recording of device '{self.serial}': {self.last_error}",
+                          file=sys.stderr)
+                    break
+                await asyncio.sleep(min(2.0, 0.5 * failures))
+        except asyncio.CancelledError:
+            # Cancelled through the scheduler, keep what was recorded so far
+            self.last_error = "Recording cancelled"
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            await self._finish()
+
+    async def _record_segment(self, time_limit: int) -> int:
+        """Record one screenrecord run into the output, returning the number of bytes received"""
+        telemetry.count_spawn("screenrecord")
+        self._proc = await asyncio.create_subprocess_exec(
+            *self.command(time_limit),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        received = 0
+        try:
+            while chunk := await self._proc.stdout.read(64 * 1024):
+                received += len(chunk)
+                await self._write(chunk)
+            stderr = await self._proc.stderr.read()
+            code = await self._proc.wait()
+            if code != 0 and not self._stopping.is_set():
+                self.last_error = stderr.decode(errors="ignore").strip() or f"screenrecord exited with code {code}"
+        finally:
+            proc, self._proc = self._proc, None
+            if proc.returncode is None:
+                proc.kill()
+        return received
+
+    async def _write(self, chunk: bytes):
+        self.bytes_written += len(chunk)
+        if self._muxer:
+            self._muxer.stdin.write(chunk)
+            await self._muxer.stdin.drain()
+        else:
+            self._file.write(chunk)
+
+    async def _finish(self):
+        self.stopped_at = time.time()
+        if self._file:
+            self._file.close()
+            self._file = None
+        if self._muxer:
+            muxer, self._muxer = self._muxer, None
+            try:
+                muxer.stdin.close()
+                _, err = await asyncio.wait_for(muxer.communicate(), timeout=60.0)
+                if muxer.returncode != 0:
+                    self.last_error = f"ffmpeg failed: {err.decode(errors='ignore').strip()}"
+            except asyncio.TimeoutError:
+                muxer.kill()
+                self.last_error = "ffmpeg did not finish writing the recording"
+            except (BrokenPipeError, ConnectionResetError) as e:
+                self.last_error = f"ffmpeg failed: {e}"
+
+    def stats(self) -> dict:
+        end = self.stopped_at or time.time()
+        return {
+            'serial': self.serial,
+            'running': self.running,
+            'local_file_path': self.local_file_path,
+            'format': self.output_format,
+            'duration_seconds': round(end - self.started_at, 1) if self.started_at else 0.0,
+            'segments': self.segments,
+            'bytes': self.bytes_written,
+            'last_error': self.last_error,
+        }
+
+
+screen_recorders: dict[str, ScreenRecorder] = {}
+
+
+def default_recording_path(serial: str, output_format: str = "mp4") -> str:
+    return f"/tmp/{serial}_video_{int(time.time())}.{output_format.lower()}"
+
+
+async def start_screen_recording(serial: str, local_file_path: Optional[str] = None, output_format: str = "mp4",
+                                 max_duration: Optional[float] = None, bit_rate: Optional[int] = None,
+                                 size: Optional[str] = None) -> str:
+    """Start recording the screen of an Android device in the background"""
+    try:
+        recorder = screen_recorders.get(serial)
+        if recorder and recorder.running:
+            return f"Screen recording already running for device '{serial}' into {recorder.local_file_path}"
+        recorder = ScreenRecorder(serial, local_file_path or default_recording_path(serial, output_format),
+                                  output_format, max_duration, bit_rate, size)
+        await recorder.start()
+        screen_recorders[serial] = recorder
+        return f"Screen recording started for device '{serial}' into {recorder.local_file_path}"
+    except Exception as e:
+        return f"Failed to start screen recording of device '{serial}': {str(e)}"
+
+
+async def stop_screen_recording(serial: str) -> str:
+    """Stop the background screen recording of an Android device"""
+    try:
+        recorder = screen_recorders.pop(serial, None)
+        if recorder is None:
+            return f"No screen recording running for device '{serial}'"
+        await recorder.stop()
+        stats = recorder.stats()
+        if not stats['bytes']:
+            return f"Failed to record screen of device '{serial}': {stats['last_error'] or 'no video received'}"
+        return (f"Screen recording stopped for device '{serial}' after {stats['duration_seconds']} seconds "
+                f"({stats['segments']} segments) and saved to: {recorder.local_file_path}")
+    except Exception as e:
+        return f"Failed to stop screen recording of device '{serial}': {str(e)}"
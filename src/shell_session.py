@@ -0,0 +1,255 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from src.adb_supervisor import supervisor
+from src.telemetry import telemetry
+
+SHELL_SESSIONS_ENABLED = os.environ.get("ADB_MCP_SHELL_SESSIONS", "1") != "0"
+
+READ_CHUNK = 64 * 1024
+
+
+class ShellSessionError(Exception):
+    """The session broke down and has been closed; the command can be retried elsewhere"""
+
+
+class ShellSession:
+    """A long-lived `adb shell` of one device that runs commands one at a time.
+
+    Every command runs in a subshell with stdin from /dev/null, followed by unique sentinels
+    on stdout (with the exit code) and stderr, so the output of each command can be split off
+    the open streams. Output passes through `cat`, so the sentinels are only written once
+    every process holding the command's stdout or stderr is gone; a child left running in
+    the background cannot write into the output of later commands. A command that times
+    out takes the session down with it.
+    """
+
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.last_used = 0.0
+        self.commands_run = 0
+        self._buffers = {'stdout': bytearray(), 'stderr': bytearray()}
+
+    def command(self) -> list[str]:
+        return ["adb", "-s", self.serial, "shell", "-T", "sh"]
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self):
+        telemetry.count_spawn("shell_session")
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        # Keep the session's stdout on fd 3, the output of each command is copied there by `cat`
+        self.proc.stdin.write(b"exec 3>&1\n")
+        self.last_used = time.monotonic()
+
+    async def run(self, command: str, timeout: Optional[float] = 30.0,
+                  on_stdout: Optional[Callable[[bytes], Awaitable]] = None) -> (int, bytes, bytes):
+        """Run a command, returning its exit code and output; with `on_stdout`, stdout is handed
+        to the callback as it arrives instead and returned empty"""
+        if not self.alive:
+            raise ShellSessionError(f"Shell session of device '{self.serial}' is not running")
+        marker = f"__adb_mcp_{uuid.uuid4().hex}__"
+        # The exit code travels through the command substitution, which ends once both `cat`s saw EOF
+        script = (f"__rc=$({{ {{ {{ ( {command}\n) </dev/null 3>&- 4>&- 5>&-; echo $? >&4; }} 2>&1 >&5 "
+                  f"| cat >&2; }} 5>&1 | cat >&3; }} 4>&1); "
+                  f"printf '\\n{marker} %s\\n' \"$__rc\"; printf '\\n{marker}\\n' >&2\n")
+        try:
+            self.proc.stdin.write(script.encode())
+            await self.proc.stdin.drain()
+            stdout_separator = f"\n{marker} ".encode()
+            if on_stdout:
+                read_stdout = self._stream_until(self.proc.stdout, stdout_separator, on_stdout)
+            else:
+                read_stdout = self._read_until(self.proc.stdout, 'stdout', stdout_separator)
+            stdout, stderr = await asyncio.wait_for(
+                asyncio.gather(read_stdout, self._read_until(self.proc.stderr, 'stderr', f"\n{marker}\n".encode())),
+                timeout=timeout)
+            code_line = await asyncio.wait_for(self._read_until(self.proc.stdout, 'stdout', b"\n"), timeout=5.0)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise TimeoutError(f"Shell command timed out after {timeout} seconds: {command}")
+        except (asyncio.CancelledError, ConnectionError, ShellSessionError):
+            # Output of an interrupted command would leak into the next one
+            await self.close()
+            raise
+        self.last_used = time.monotonic()
+        self.commands_run += 1
+        return int(code_line.strip() or b"255"), stdout, stderr
+
+    async def _read_until(self, stream: asyncio.StreamReader, name: str, separator: bytes) -> bytes:
+        buffer = self._buffers[name]
+        searched = 0
+        while True:
+            index = buffer.find(separator, searched)
+            if index != -1:
+                data = bytes(buffer[:index])
+                del buffer[:index + len(separator)]
+                return data
+            searched = max(0, len(buffer) - len(separator) + 1)
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                raise ShellSessionError(f"Shell session of device '{self.serial}' closed unexpectedly")
+            buffer += chunk
+
+    async def _stream_until(self, stream: asyncio.StreamReader, separator: bytes,
+                            on_data: Callable[[bytes], Awaitable]) -> bytes:
+        """Like `_read_until` on stdout, but hands the data before the separator on as it arrives"""
+        buffer = self._buffers['stdout']
+        while True:
+            index = buffer.find(separator)
+            if index != -1:
+                if index:
+                    await on_data(bytes(buffer[:index]))
+                del buffer[:index + len(separator)]
+                return b""
+            # Hold back what may be the start of the separator
+            ready = len(buffer) - len(separator) + 1
+            if ready > 0:
+                data = bytes(buffer[:ready])
+                del buffer[:ready]
+                await on_data(data)
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                raise ShellSessionError(f"Shell session of device '{self.serial}' closed unexpectedly")
+            buffer += chunk
+
+    async def ping(self, timeout: float = 2.0) -> bool:
+        try:
+            code, out, err = await self.run("echo ok", timeout=timeout)
+            return code == 0 and out.strip() == b"ok"
+        except Exception:
+            return False
+
+    async def close(self):
+        proc, self.proc = self.proc, None
+        if proc and proc.returncode is None:
+            try:
+                proc.kill()
+                await proc.wait()
+            except ProcessLookupError:
+                pass
+
+
+class ShellSessionPool:
+    """Up to `max_sessions` shell sessions of one device, spawned on demand"""
+
+    def __init__(self, serial: str, max_sessions: int = 4, health_check_after: float = 30.0):
+        self.serial = serial
+        self.max_sessions = max_sessions
+        self.health_check_after = health_check_after
+        self.sessions: list[ShellSession] = []
+        self.idle: list[ShellSession] = []
+        self._available = asyncio.Condition()
+
+    async def acquire(self) -> ShellSession:
+        while True:
+            async with self._available:
+                while not self.idle and len(self.sessions) >= self.max_sessions:
+                    await self._available.wait()
+                if self.idle:
+                    session = self.idle.pop()
+                else:
+                    session = ShellSession(self.serial)
+                    self.sessions.append(session)
+                    break
+            # Checked outside the lock, so a slow ping does not hold up the other callers
+            if await self._healthy(session):
+                return session
+            await session.close()
+            await self.release(session)
+        try:
+            await session.start()
+        except Exception:
+            await self.release(session)
+            raise
+        return session
+
+    async def _healthy(self, session: ShellSession) -> bool:
+        if not session.alive:
+            return False
+        if time.monotonic() - session.last_used < self.health_check_after:
+            return True
+        return await session.ping()
+
+    def _drop(self, session: ShellSession):
+        if session in self.sessions:
+            self.sessions.remove(session)
+
+    async def release(self, session: ShellSession):
+        async with self._available:
+            if session.alive:
+                self.idle.append(session)
+            else:
+                self._drop(session)
+            self._available.notify()
+
+    async def run(self, command: str, timeout: Optional[float] = 30.0,
+                  on_stdout: Optional[Callable[[bytes], Awaitable]] = None) -> (int, bytes, bytes):
+        session = await self.acquire()
+        try:
+            return await session.run(command, timeout, on_stdout)
+        finally:
+            await self.release(session)
+
+    async def close(self):
+        for session in list(self.sessions):
+            await session.close()
+        self.sessions.clear()
+        self.idle.clear()
+
+
+class ShellSessionManager:
+    def __init__(self, max_sessions: int = 4, retry_after: float = 30.0):
+        self.max_sessions = max_sessions
+        self.retry_after = retry_after
+        self.pools: dict[str, ShellSessionPool] = {}
+        self._failed_at: dict[str, float] = {}
+
+    def pool(self, serial: str) -> ShellSessionPool:
+        if serial not in self.pools:
+            self.pools[serial] = ShellSessionPool(serial, self.max_sessions)
+        return self.pools[serial]
+
+    async def run(self, serial: str, command: str, timeout: Optional[float] = 30.0,
+                  on_stdout: Optional[Callable[[bytes], Awaitable]] = None) -> (int, bytes, bytes):
+        failed_at = self._failed_at.get(serial)
+        if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+            raise ShellSessionError(f"Shell sessions of device '{serial}' recently failed")
+        try:
+            return await self.pool(serial).run(command, timeout, on_stdout)
+        except (ShellSessionError, OSError):
+            # Avoid paying for a failing spawn on every command
+            self._failed_at[serial] = time.monotonic()
+            raise
+
+    async def close(self, serial: str):
+        pool = self.pools.pop(serial, None)
+        if pool:
+            await pool.close()
+
+    def status(self) -> dict:
+        return {serial: {'sessions': len(pool.sessions), 'idle': len(pool.idle),
+                         'commands_run': sum(session.commands_run for session in pool.sessions)}
+                for serial, pool in self.pools.items()}
+
+
+shell_sessions = ShellSessionManager()
+
+
+def _on_device_change(serial: str, old_state: Optional[str], new_state: Optional[str]):
+    if new_state != "device" and serial in shell_sessions.pools:
+        asyncio.get_running_loop().create_task(shell_sessions.close(serial))
+
+
+supervisor.add_listener(_on_device_change)
@@ -0,0 +1,196 @@
+import asyncio
+import posixpath
+import shlex
+import subprocess
+import tarfile
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from src.adb_manager import ensure_adb_server
+from src.scheduler import scheduler, BULK_LANE
+from src.telemetry import telemetry
+
+ProgressCallback = Callable[[int], None]
+
+# exec-out carries no exit status and mixes stderr into stdout, so the device shell captures
+# the errors of tar and sends them with its exit code after the archive, between these markers
+TAR_ERRORS_MARKER = b"\n__adb_mcp_tar_errors__\n"
+TAR_STATUS_MARKER = b"\n__adb_mcp_tar_status__ "
+STATUS_TAIL_BYTES = 256 * 1024
+
+
+class _CountingStream:
+    """File-like wrapper counting the bytes passing through a pipe, optionally keeping the last ones read"""
+
+    def __init__(self, stream, progress: Optional[ProgressCallback] = None, keep_tail: int = 0):
+        self.stream = stream
+        self.progress = progress
+        self.bytes = 0
+        self.keep_tail = keep_tail
+        self.tail = bytearray()
+
+    def _count(self, size: int):
+        self.bytes += size
+        if self.progress:
+            self.progress(self.bytes)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self._count(len(data))
+        if self.keep_tail:
+            self.tail += data
+            del self.tail[:-self.keep_tail]
+        return data
+
+    def write(self, data: bytes) -> int:
+        self.stream.write(data)
+        self._count(len(data))
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def _transfer_summary(action: str, files: int, total: int, elapsed: float) -> str:
+    rate = total / elapsed / (1024 * 1024) if elapsed > 0 else 0.0
+    return f"tar stream: {files} files, {total} bytes {action} in {elapsed:.1f}s, {rate:.1f} MB/s"
+
+
+def _tar_status(tail: bytes) -> tuple[Optional[int], str]:
+    """Exit code and errors of the device-side tar from the end of the stream; no code if it is missing"""
+    index = tail.rfind(TAR_STATUS_MARKER)
+    if index == -1:
+        return None, ""
+    try:
+        code = int(tail[index + len(TAR_STATUS_MARKER):].split()[0])
+    except (IndexError, ValueError):
+        return None, ""
+    errors = tail[:index]
+    start = errors.rfind(TAR_ERRORS_MARKER)
+    errors = errors[start + len(TAR_ERRORS_MARKER):] if start != -1 else errors[-4096:]
+    return code, errors.decode(errors="ignore").strip()
+
+
+def _with_status(command: str, stdout: str) -> str:
+    """Wrap a device command so its errors and exit code are printed after its output, between the markers"""
+    errors_marker, status_marker = (marker.decode().replace("\n", "\\n") for marker in
+                                    (TAR_ERRORS_MARKER, TAR_STATUS_MARKER))
+    return (f"{{ err=$({{ {command}; }} 2>&1 >{stdout}); code=$?; }} 3>&1; "
+            f"printf '{errors_marker}%s{status_marker}%d\\n' \"$err\" \"$code\"")
+
+
+def _pull(serial: str, remote_path: str, local_folder: str, compress: bool, progress: Optional[ProgressCallback],
+          procs: list) -> str:
+    parent, name = posixpath.split(remote_path.rstrip("/"))
+    tar = f"tar c{'z' if compress else ''}f - -C {shlex.quote(parent or '/')} {shlex.quote(name)}"
+    telemetry.count_spawn("tar")
+    proc = subprocess.Popen(["adb", "-s", serial, "exec-out", _with_status(tar, "&3")], stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE)
+    procs.append(proc)
+    stream = _CountingStream(proc.stdout, progress, keep_tail=STATUS_TAIL_BYTES)
+    started = time.monotonic()
+    files = 0
+    Path(local_folder).mkdir(parents=True, exist_ok=True)
+    try:
+        # Members are extracted while the archive streams in, nothing is staged on either side
+        with tarfile.open(fileobj=stream, mode="r|gz" if compress else "r|") as archive:
+            for member in archive:
+                archive.extract(member, local_folder, filter="data")
+                files += member.isfile()
+        archive_bytes = stream.bytes
+        # The exit status of tar follows the archive
+        while stream.read(64 * 1024):
+            pass
+    except tarfile.TarError as e:
+        proc.stdout.close()
+        proc.wait()
+        error = proc.stderr.read().decode(errors="ignore").strip()
+        code, errors = _tar_status(bytes(stream.tail))
+        if not error and code:
+            error = f"tar failed on the device with exit code {code}: {errors or 'no error output'}"
+        raise RuntimeError(f"Invalid tar stream after {files} files: {e}" + (f" ({error})" if error else ""))
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    stderr = proc.stderr.read().decode(errors="ignore").strip()
+    if proc.returncode != 0 or stderr:
+        raise RuntimeError(stderr or f"adb exited with {proc.returncode}")
+    code, errors = _tar_status(bytes(stream.tail))
+    if code is None:
+        raise RuntimeError(f"tar stream ended early after {files} files, the device sent no exit status")
+    if code != 0:
+        raise RuntimeError(f"tar failed on the device with exit code {code} after {files} files: "
+                           f"{errors or 'no error output'}")
+    return _transfer_summary("pulled", files, archive_bytes, time.monotonic() - started)
+
+
+def _push(serial: str, local_path: str, remote_folder: str, compress: bool, progress: Optional[ProgressCallback],
+          procs: list) -> str:
+    source = Path(local_path)
+    if not source.exists():
+        raise FileNotFoundError(f"Local path '{local_path}' does not exist")
+    folder = shlex.quote(remote_folder)
+    tar = f"mkdir -p {folder} && tar x{'z' if compress else ''}f - -C {folder}"
+    telemetry.count_spawn("tar")
+    # exec-in sends nothing back, so the archive goes through the stdin of `adb shell`, which returns
+    # the errors and exit status of tar once the archive is consumed
+    proc = subprocess.Popen(["adb", "-s", serial, "shell", "-T", _with_status(tar, "/dev/null")],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    procs.append(proc)
+    stream = _CountingStream(proc.stdin, progress)
+    started = time.monotonic()
+    files = sum(1 for path in source.rglob("*") if path.is_file()) if source.is_dir() else 1
+    broken_pipe = False
+    try:
+        # The archive is built straight into the pipe of `tar x` on the device
+        with tarfile.open(fileobj=stream, mode="w|gz" if compress else "w|") as archive:
+            archive.add(str(source), arcname=source.name)
+    except BrokenPipeError:
+        # tar on the device stopped reading, its errors follow on stdout
+        broken_pipe = True
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            broken_pipe = True
+        proc.stdin = None
+    stdout, stderr = proc.communicate()
+    code, errors = _tar_status(stdout)
+    if code:
+        raise RuntimeError(f"tar failed on the device with exit code {code}: {errors or 'no error output'}")
+    if proc.returncode != 0 or stderr.strip() or code is None:
+        raise RuntimeError(stderr.decode(errors="ignore").strip() or
+                           f"adb exited with {proc.returncode}, the device sent no tar exit status")
+    if broken_pipe:
+        raise RuntimeError(f"tar on the device stopped reading after {stream.bytes} bytes: "
+                           f"{errors or 'no error output'}")
+    return _transfer_summary("pushed", files, stream.bytes, time.monotonic() - started)
+
+
+async def _run_transfer(serial: str, function, *args) -> str:
+    await ensure_adb_server()
+    procs: list[subprocess.Popen] = []
+
+    async def transfer():
+        try:
+            return await asyncio.to_thread(function, *args, procs)
+        except asyncio.CancelledError:
+            # Killing adb ends the blocking read/write of the worker thread
+            for proc in procs:
+                proc.kill()
+            raise
+
+    return await scheduler.run(serial, BULK_LANE, transfer, description=f"tar {function.__name__.strip('_')}")
+
+
+async def pull_tar(serial: str, remote_path: str, local_folder: str, compress: bool = False,
+                   progress: Optional[ProgressCallback] = None) -> str:
+    """Pull a file or directory as one tar stream over exec-out, extracting it locally on the fly"""
+    return await _run_transfer(serial, _pull, serial, remote_path, local_folder, compress, progress)
+
+
+async def push_tar(serial: str, local_path: str, remote_folder: str, compress: bool = False,
+                   progress: Optional[ProgressCallback] = None) -> str:
+    """Push a file or directory into a device folder as one tar stream over exec-in"""
+    return await _run_transfer(serial, _push, serial, local_path, remote_folder, compress, progress)
@@ -0,0 +1,230 @@
+import functools
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from typing import Any, Optional
+
+# Latency buckets in seconds, shared by all histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Calls slower than this are logged with their full adb argv, disabled if unset
+SLOW_CALL_MS = float(os.environ["ADB_MCP_SLOW_CALL_MS"]) if os.environ.get("ADB_MCP_SLOW_CALL_MS") else None
+
+ADB_STATUSES = ("ok", "failed", "timeout")
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets, in the Prometheus sense"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile, capped at the largest observation"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.sum / self.count * 1000, 1) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.5) * 1000, 1),
+            'p99_ms': round(self.quantile(0.99) * 1000, 1),
+            'max_ms': round(self.max * 1000, 1),
+        }
+
+
+def adb_subcommand(args: tuple) -> str:
+    """Label of an adb call: the subcommand, plus the program for shell and exec commands"""
+    args = list(args)
+    if len(args) >= 2 and args[0] == "-s":
+        args = args[2:]
+    if not args:
+        return "adb"
+    if args[0] in ("shell", "exec-out", "exec-in") and len(args) > 1:
+        words = args[1].split() if not args[1].startswith("-") else args[2:3]
+        return f"{args[0]} {words[0]}" if words else args[0]
+    return args[0]
+
+
+class Telemetry:
+    """Latency histograms and counters of tool calls and adb commands"""
+
+    def __init__(self, slow_call_ms: Optional[float] = SLOW_CALL_MS):
+        self.slow_call_ms = slow_call_ms
+        self.started = time.time()
+        self.tools: dict[str, Histogram] = {}
+        self.tool_failures: dict[str, int] = {}
+        self.tool_bytes_in: dict[str, int] = {}
+        self.tool_bytes_out: dict[str, int] = {}
+        self.adb_commands: dict[str, Histogram] = {}
+        self.adb_devices: dict[str, Histogram] = {}
+        self.adb_statuses: dict[tuple[str, str], int] = {}
+        self.adb_bytes_in: dict[str, int] = {}
+        self.spawns: dict[str, int] = {}
+
+    def observe_tool(self, name: str, seconds: float, failed: bool, bytes_in: int = 0, bytes_out: int = 0):
+        self.tools.setdefault(name, Histogram()).observe(seconds)
+        if failed:
+            self.tool_failures[name] = self.tool_failures.get(name, 0) + 1
+        self.tool_bytes_in[name] = self.tool_bytes_in.get(name, 0) + bytes_in
+        self.tool_bytes_out[name] = self.tool_bytes_out.get(name, 0) + bytes_out
+        self._log_slow(seconds, f"tool {name}")
+
+    def observe_adb(self, args: tuple, seconds: float, status: str, bytes_in: int = 0):
+        subcommand = adb_subcommand(args)
+        serial = args[1] if len(args) >= 2 and args[0] == "-s" else "host"
+        self.adb_commands.setdefault(subcommand, Histogram()).observe(seconds)
+        self.adb_devices.setdefault(serial, Histogram()).observe(seconds)
+        self.adb_statuses[(subcommand, status)] = self.adb_statuses.get((subcommand, status), 0) + 1
+        self.adb_bytes_in[serial] = self.adb_bytes_in.get(serial, 0) + bytes_in
+        self._log_slow(seconds, f"adb {' '.join(str(arg) for arg in args)} ({status})")
+
+    def count_spawn(self, kind: str):
+        """Count a spawned process by kind, e.g. 'adb', 'shell_session' or 'logcat'"""
+        self.spawns[kind] = self.spawns.get(kind, 0) + 1
+
+    def _log_slow(self, seconds: float, what: str):
+        if self.slow_call_ms is not None and seconds * 1000 >= self.slow_call_ms:
+            # stdout carries the MCP protocol
+            print(f"Slow call ({seconds * 1000:.0f} ms): {what}", file=sys.stderr)
+
+    def snapshot(self) -> dict:
+        adb_totals = {status: sum(count for (_, s), count in self.adb_statuses.items() if s == status)
+                      for status in ADB_STATUSES}
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'tools': {name: {**histogram.summary(), 'failures': self.tool_failures.get(name, 0),
+                             'bytes_in': self.tool_bytes_in.get(name, 0),
+                             'bytes_out': self.tool_bytes_out.get(name, 0)}
+                      for name, histogram in sorted(self.tools.items())},
+            'adb': {
+                **adb_totals,
+                'spawns': dict(self.spawns),
+                'commands': {name: {**histogram.summary(),
+                                    **{status: self.adb_statuses.get((name, status), 0) for status in ADB_STATUSES}}
+                             for name, histogram in sorted(self.adb_commands.items())},
+                'devices': {serial: {**histogram.summary(), 'bytes_in': self.adb_bytes_in.get(serial, 0)}
+                            for serial, histogram in sorted(self.adb_devices.items())},
+            },
+        }
+
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        self._histograms(lines, "adb_mcp_tool_duration_seconds", "Duration of MCP tool calls", "tool", self.tools)
+        self._counters(lines, "adb_mcp_tool_failures_total", "Tool calls that returned a failure", "tool",
+                       self.tool_failures)
+        self._counters(lines, "adb_mcp_tool_request_bytes_total", "Bytes of tool arguments", "tool",
+                       self.tool_bytes_in)
+        self._counters(lines, "adb_mcp_tool_response_bytes_total", "Bytes of tool results", "tool",
+                       self.tool_bytes_out)
+        self._histograms(lines, "adb_mcp_adb_command_duration_seconds", "Duration of adb commands by subcommand",
+                         "subcommand", self.adb_commands)
+        self._histograms(lines, "adb_mcp_adb_device_duration_seconds", "Duration of adb commands by device",
+                         "serial", self.adb_devices)
+        lines += ["# HELP adb_mcp_adb_commands_total adb commands by subcommand and outcome",
+                  "# TYPE adb_mcp_adb_commands_total counter"]
+        for (subcommand, status), count in sorted(self.adb_statuses.items()):
+            lines.append(f'adb_mcp_adb_commands_total{{subcommand="{_escape(subcommand)}",status="{status}"}} {count}')
+        self._counters(lines, "adb_mcp_adb_received_bytes_total", "Bytes of adb command output", "serial",
+                       self.adb_bytes_in)
+        self._counters(lines, "adb_mcp_process_spawns_total", "Processes spawned", "kind", self.spawns)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histograms(lines: list, metric: str, help_text: str, label: str, histograms: dict[str, Histogram]):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for key, histogram in sorted(histograms.items()):
+            value = _escape(key)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label}="{value}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{label}="{value}"}} {histogram.sum:.6f}')
+            lines.append(f'{metric}_count{{{label}="{value}"}} {histogram.count}')
+
+    @staticmethod
+    def _counters(lines: list, metric: str, help_text: str, label: str, counters: dict[str, int]):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for key, count in sorted(counters.items()):
+            lines.append(f'{metric}{{{label}="{_escape(key)}"}} {count}')
+
+    def write_prometheus(self, path: str):
+        """Write the Prometheus dump atomically, e.g. for the node_exporter textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        self.__init__(self.slow_call_ms)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+telemetry = Telemetry()
+
+
+def instrument_tools(mcp):
+    """Time every tool registered on `mcp` from now on.
+
+    Tools report errors as "Failed ..." results rather than raising, so those count as
+    failures too.
+    """
+    register = mcp.tool
+
+    @functools.wraps(register)
+    def tool(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+
+        def wrap(fn):
+            name = kwargs.get("name") or (args[0] if args and isinstance(args[0], str) else fn.__name__)
+
+            @functools.wraps(fn)
+            async def timed(*fn_args, **fn_kwargs):
+                started = time.monotonic()
+                failed = True
+                result = None
+                try:
+                    result = await fn(*fn_args, **fn_kwargs)
+                    failed = isinstance(result, str) and result.startswith("Failed")
+                    return result
+                finally:
+                    telemetry.observe_tool(name, time.monotonic() - started, failed,
+                                           _size(fn_kwargs) + _size(fn_args), _size(result))
+            return decorator(timed)
+        return wrap
+
+    mcp.tool = tool
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from mcp.server.fastmcp import FastMCP
 
 from src.app_management import get_app_details, install_app, uninstall_app, launch_app
@@ -8,10 +10,15 @@ def register_app_tools(mcp: FastMCP):
     """Register app management tools with the MCP server"""
 
     @mcp.tool(name="list_installed_apps", title="List Installed Applications",
-              description="List all installed applications on a specific Android device")
-    async def list_installed_apps_tool(serial: str):
-        """List installed applications on a specific Android device"""
-        return await list_installed_apps(serial)
+              description="List installed applications on a specific Android device, optionally filtered by name")
+    async def list_installed_apps_tool(serial: str, name_filter: Optional[str] = None, include_system: bool = True,
+                                       limit: int = 500, offset: int = 0):
+        """
+        List installed applications on a specific Android device.
+        `name_filter` keeps packages containing the text, `include_system` False hides system apps and
+        `limit`/`offset` page through long lists.
+        """
+        return await list_installed_apps(serial, name_filter, include_system, limit, offset)
 
     @mcp.tool(name="get_app_details", title="Get app details",
               description="Retrieve detailed information about an installed app using its name or package name.")
@@ -20,10 +27,16 @@ def register_app_tools(mcp: FastMCP):
         return await get_app_details(serial, app_package_name)
 
     @mcp.tool(name="install_app", title="Install app",
-              description="Install an APK file on an Android device.")
-    async def install_app_tool(serial: str, apk_path: str):
-        """Install an APK file on a connected Android device."""
-        return await install_app(serial, apk_path)
+              description="Install an APK file (and optional split APKs) on an Android device. "
+                          "Skipped if the device already has exactly this build.")
+    async def install_app_tool(serial: str, apk_path: str, split_apk_paths: Optional[list[str]] = None,
+                               force: bool = False):
+        """
+        Install an APK file on a connected Android device.
+        Split APKs are installed together with the base APK via install-multiple. The install is skipped when the
+        device already has the same package, versionCode and APK contents, unless `force` is set.
+        """
+        return await install_app(serial, apk_path, split_apk_paths, force)
 
     @mcp.tool(name="uninstall_app", title="Uninstall app",
               description="Uninstall an APP from an Android device.")
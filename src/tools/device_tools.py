@@ -1,9 +1,15 @@
+import asyncio
+import json
 from typing import Optional
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Image
 
 from src.device_management import reboot_device, shutdown_device, take_screenshot, list_devices, screen_recording, \
     get_network_details, dump_screen
+from src.frame_stream import start_frame_stream, stop_frame_stream, wait_for_frame
+from src.screen_capture import screenshot_bytes, encode_image, process_image
+from src.screen_recorder import start_screen_recording, stop_screen_recording
+from src.ui_hierarchy import query_ui, ui_diff
 
 
 def register_device_tools(mcp: FastMCP):
@@ -11,9 +17,13 @@ def register_device_tools(mcp: FastMCP):
 
     @mcp.tool(name="list_devices", title="List Devices",
               description="List all connected Android devices with their serial numbers and detailed info.")
-    async def list_devices_tool():
-        """Returns a list of connected Android devices with serial numbers and detailed information."""
-        return await list_devices()
+    async def list_devices_tool(max_concurrency: int = 8, device_timeout: float = 10.0):
+        """
+            Returns a list of connected Android devices with serial numbers and detailed information.
+            Devices are probed concurrently; a device not answering within `device_timeout` seconds
+            is listed with its serial, state and an error instead of its details.
+        """
+        return await list_devices(max_concurrency=max_concurrency, device_timeout=device_timeout)
 
     @mcp.tool(name="reboot_device", title="Reboot Device",
               description="Reboot a specific Android device using its serial number.")
@@ -31,17 +41,53 @@ def register_device_tools(mcp: FastMCP):
         return await shutdown_device(serial)
 
     @mcp.tool(name="take_screenshot", title="Take Screenshot",
-              description="Capture a screenshot from an Android device using its serial number.")
-    async def take_screenshot_tool(serial: str, local_file_path: Optional[str] = None):
-        """Captures a screenshot from the Android device identified by the given serial number."""
-        return await take_screenshot(serial, local_file_path)
+              description="Capture a screenshot from an Android device using its serial number. "
+                          "The image can be cropped, downscaled and encoded as png, jpeg or webp, "
+                          "and either saved to a local file or returned directly as image content.")
+    async def take_screenshot_tool(serial: str, local_file_path: Optional[str] = None, image_format: str = "png",
+                                   quality: int = 80, scale: float = 1.0, crop: Optional[list[int]] = None,
+                                   return_image: bool = False):
+        """
+            Captures a screenshot from the Android device identified by the given serial number.
+            `scale` (0-1] downscales the image, `crop` is [left, top, right, bottom] in device pixels
+            and `quality` applies to jpeg/webp. Set `return_image` to get the image instead of a file.
+        """
+        if not return_image:
+            return await take_screenshot(serial, local_file_path, image_format, quality, scale, crop)
+        try:
+            image_format = "jpeg" if image_format.lower() == "jpg" else image_format.lower()
+            return Image(data=await screenshot_bytes(serial, image_format, quality, scale, crop), format=image_format)
+        except Exception as e:
+            return f"Failed to capture screenshot from device '{serial}': {str(e)}"
 
     @mcp.tool(name="screen_recording", title="Screen Recording",
               description="Record the screen of an Android device using its serial number.")
     async def screen_recording_tool(serial: str, time_limit: str = "5", local_file_path: Optional[str] = None):
-        """Records the screen of the Android device identified by the given serial number."""
+        """
+            Records the screen of the Android device identified by the given serial number for `time_limit`
+            seconds, which may exceed the 3 minute limit of the device. Ending the path in .h264 keeps raw H.264.
+        """
         return await screen_recording(serial, time_limit, local_file_path)
 
+    @mcp.tool(name="start_screen_recording", title="Start Screen Recording",
+              description="Start recording the screen of an Android device in the background, streamed straight "
+                          "into a local MP4 or raw H.264 file. Recordings are not limited to 3 minutes.")
+    async def start_screen_recording_tool(serial: str, local_file_path: Optional[str] = None,
+                                          output_format: str = "mp4", max_duration: Optional[float] = None,
+                                          bit_rate: Optional[int] = None, size: Optional[str] = None):
+        """
+            Starts recording the screen of the Android device identified by the given serial number and returns
+            immediately. Recording runs until stop_screen_recording or `max_duration` seconds. `output_format` is
+            mp4 (needs ffmpeg, raw H.264 otherwise) or h264; `bit_rate` is in bits per second, `size` like 720x1280.
+        """
+        return await start_screen_recording(serial, local_file_path, output_format, max_duration, bit_rate, size)
+
+    @mcp.tool(name="stop_screen_recording", title="Stop Screen Recording",
+              description="Stop the background screen recording of an Android device and finish the video file.")
+    async def stop_screen_recording_tool(serial: str):
+        """Stops the screen recording of the Android device identified by the given serial number."""
+        return await stop_screen_recording(serial)
+
     @mcp.tool(name="dump_screen", title="Dump screen",
               description="Dump current screen of Android device.")
     async def dump_screen_tool(serial: str, local_file_path: Optional[str] = None):
@@ -53,3 +99,64 @@ def register_device_tools(mcp: FastMCP):
     async def network_details_tool(serial: str):
         """Retrieve network, Wi-Fi information for a connected Android device."""
         return await get_network_details(serial)
+
+    @mcp.tool(name="start_frame_stream", title="Start Frame Stream",
+              description="Start continuously capturing the screen of an Android device into a small buffer, "
+                          "so the latest frame can be fetched almost instantly with get_latest_frame.")
+    async def start_frame_stream_tool(serial: str, buffer_size: int = 5, interval: float = 0.0):
+        """
+            Starts continuous screen capture for the Android device identified by the given serial number.
+            The last `buffer_size` frames are kept; `interval` is the minimum number of seconds between captures.
+        """
+        return await start_frame_stream(serial, buffer_size, interval)
+
+    @mcp.tool(name="stop_frame_stream", title="Stop Frame Stream",
+              description="Stop continuous screen capture of an Android device.")
+    async def stop_frame_stream_tool(serial: str):
+        """Stops continuous screen capture for the Android device identified by the given serial number."""
+        return await stop_frame_stream(serial)
+
+    @mcp.tool(name="get_latest_frame", title="Get Latest Frame",
+              description="Return the most recent frame captured by a running frame stream, together with "
+                          "its age and the capture FPS.")
+    async def get_latest_frame_tool(serial: str, image_format: str = "jpeg", quality: int = 70, scale: float = 0.5,
+                                    max_age: Optional[float] = None):
+        """
+            Returns the latest buffered frame of the Android device identified by the given serial number.
+            If `max_age` (seconds) is set, waits briefly for a frame at most that old.
+        """
+        try:
+            frame, stats = await wait_for_frame(serial, max_age)
+            image_format = "jpeg" if image_format.lower() == "jpg" else image_format.lower()
+            data = await asyncio.to_thread(
+                lambda: encode_image(process_image(frame.image, scale), image_format, quality))
+            return [Image(data=data, format=image_format), json.dumps(stats, indent=4)]
+        except Exception as e:
+            return f"Failed to get latest frame from device '{serial}': {str(e)}"
+
+    @mcp.tool(name="query_ui", title="Query UI",
+              description="Find UI elements on the current screen of an Android device by resource-id, text, "
+                          "content-desc and/or class. Returns only the matching nodes with their bounds and center.")
+    async def query_ui_tool(serial: str, resource_id: Optional[str] = None, text: Optional[str] = None,
+                            content_desc: Optional[str] = None, class_name: Optional[str] = None,
+                            partial: bool = False, refresh: bool = True, include_subtree: bool = False,
+                            limit: int = 20):
+        """
+            Query the UI hierarchy of a connected Android device. All given selectors must match;
+            `partial` enables case-insensitive substring matching. Set `refresh` to False to reuse the last dump.
+        """
+        try:
+            return json.dumps(await query_ui(serial, resource_id, text, content_desc, class_name, partial, refresh,
+                                             include_subtree, limit), indent=4)
+        except Exception as e:
+            return f"Failed to query UI of device '{serial}': {str(e)}"
+
+    @mcp.tool(name="ui_diff", title="UI Diff",
+              description="Compare the current screen of an Android device with the previous UI dump and "
+                          "return added, removed and changed elements.")
+    async def ui_diff_tool(serial: str, refresh: bool = True):
+        """Structural diff of the UI hierarchy of a connected Android device against its previous dump."""
+        try:
+            return json.dumps(await ui_diff(serial, refresh), indent=4)
+        except Exception as e:
+            return f"Failed to diff UI of device '{serial}': {str(e)}"
@@ -0,0 +1,72 @@
+import json
+from typing import Optional
+
+from mcp.server.fastmcp import FastMCP
+
+from src.apk_install import install_apks_multi
+from src.device_management import execute_shell, clear_logs
+from src.fan_out import fan_out, DEFAULT_PER_HOST_LIMIT
+from src.file_system import push_file
+
+
+def register_fan_out_tools(mcp: FastMCP):
+    """Register tools that run one operation on many devices at once"""
+
+    async def run(serials: Optional[list[str]], operation, max_parallel: int, per_host_limit: int,
+                  timeout: Optional[float]) -> str:
+        try:
+            return json.dumps(await fan_out(serials, operation, max_parallel=max_parallel,
+                                            per_host_limit=per_host_limit, timeout=timeout), indent=4)
+        except Exception as e:
+            return f"Failed to run operation on devices: {str(e)}"
+
+    @mcp.tool(name="execute_shell_command_multi", title="Execute shell command on many devices",
+              description="Execute the same shell command on several Android devices concurrently. "
+                          "Leave `serials` empty to use all connected devices. `per_host_limit` caps the devices in "
+                          "flight behind one network host or on the emulator host.")
+    async def execute_shell_command_multi_tool(command: str, serials: Optional[list[str]] = None,
+                                               max_parallel: int = 16, timeout: Optional[float] = 60.0,
+                                               per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        """Execute a shell command on many connected Android devices and return per-device results."""
+        return await run(serials, lambda serial: execute_shell(serial, command), max_parallel, per_host_limit,
+                         timeout)
+
+    @mcp.tool(name="install_app_multi", title="Install app on many devices",
+              description="Install an APK file on several Android devices concurrently, skipping devices that "
+                          "already have this exact build. Leave `serials` empty to use all connected devices. "
+                          "`per_host_limit` caps the devices in flight behind one network host or on the emulator "
+                          "host.")
+    async def install_app_multi_tool(apk_path: str, split_apk_paths: Optional[list[str]] = None,
+                                     serials: Optional[list[str]] = None, max_parallel: int = 8,
+                                     timeout: Optional[float] = 300.0, force: bool = False,
+                                     per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        """
+        Install an APK file (and optional split APKs) on many connected Android devices.
+        Returns per-device status, timing and whether the build was installed or skipped.
+        """
+        try:
+            return json.dumps(await install_apks_multi(apk_path, split_apk_paths, serials, max_parallel, timeout,
+                                                       force, per_host_limit), indent=4)
+        except Exception as e:
+            return f"Failed to install app on devices: {str(e)}"
+
+    @mcp.tool(name="push_file_multi", title="Copy File to many Devices",
+              description="Push a local file to several Android devices concurrently. "
+                          "Leave `serials` empty to use all connected devices. `per_host_limit` caps the devices in "
+                          "flight behind one network host or on the emulator host.")
+    async def push_file_multi_tool(local_file: str, folder_path_in_device: str, serials: Optional[list[str]] = None,
+                                   max_parallel: int = 8, timeout: Optional[float] = 300.0,
+                                   per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        """Push a local file to many connected Android devices and return per-device results."""
+        return await run(serials, lambda serial: push_file(serial, local_file, folder_path_in_device), max_parallel,
+                         per_host_limit, timeout)
+
+    @mcp.tool(name="clear_device_logs_multi", title="Clear Logs on many devices",
+              description="Clear logcat logs on several Android devices concurrently. "
+                          "Leave `serials` empty to use all connected devices. `per_host_limit` caps the devices in "
+                          "flight behind one network host or on the emulator host.")
+    async def clear_device_logs_multi_tool(serials: Optional[list[str]] = None, max_parallel: int = 16,
+                                           timeout: Optional[float] = 30.0,
+                                           per_host_limit: int = DEFAULT_PER_HOST_LIMIT):
+        """Clear logcat logs on many connected Android devices and return per-device results."""
+        return await run(serials, clear_logs, max_parallel, per_host_limit, timeout)
@@ -1,7 +1,9 @@
+import json
 from typing import Optional
 
 from mcp.server.fastmcp import FastMCP
 
+from src.file_sync import sync_to_device, sync_from_device
 from src.file_system import list_files, pull_file, push_file
 
 
@@ -9,19 +11,62 @@ def register_file_tools(mcp: FastMCP):
     """Register file system tools with the MCP server"""
 
     @mcp.tool(name="list_files", title="List Files",
-              description="List all files in a given directory on an Android device using its serial number.")
-    async def list_files_tool(serial: str, file_path_in_device: str):
-        """Lists all files in the specified directory on the Android device identified by the serial number."""
-        return await list_files(serial, file_path_in_device)
+              description="List files in a given directory on an Android device using its serial number, "
+                          "with type, size, mtime and mode. Supports recursion, glob filters and pagination.")
+    async def list_files_tool(serial: str, file_path_in_device: str, recursive: bool = False, max_depth: int = 3,
+                              pattern: Optional[str] = None, limit: int = 200, cursor: Optional[str] = None):
+        """
+        Lists files in the specified directory on the Android device identified by the serial number.
+        With `recursive`, the tree is walked up to `max_depth` levels in one device command and entry names are
+        relative paths. `pattern` is a glob matched against file names, e.g. '*.jpg'. Pass the returned
+        `next_cursor` as `cursor` to get the next page of up to `limit` entries.
+        """
+        return await list_files(serial, file_path_in_device, recursive, max_depth, pattern, limit, cursor)
 
     @mcp.tool(name="pull_file", title="Copy Files from Device",
-              description="Pull or copy files from a given directory on an Android device using its serial number.")
-    async def pull_file_tool(serial: str, file_path_in_device: str, local_folder: Optional[str] = None):
-        """Pull or copy a file from the specified directory on the Android device identified by the serial number."""
-        return await pull_file(serial, file_path_in_device, local_folder)
+              description="Pull or copy files from a given directory on an Android device using its serial number. "
+                          "Use transfer_mode 'tar' for directories with many small files.")
+    async def pull_file_tool(serial: str, file_path_in_device: str, local_folder: Optional[str] = None,
+                             transfer_mode: str = "adb", compress: bool = False):
+        """
+        Pull or copy a file from the specified directory on the Android device identified by the serial number.
+        transfer_mode 'tar' streams the whole path as one tar archive (gzip-compressed on the device if `compress`)
+        and extracts it locally on the fly, which is much faster than 'adb' for many small files.
+        """
+        return await pull_file(serial, file_path_in_device, local_folder, transfer_mode, compress)
 
     @mcp.tool(name="push_file", title="Copy File to Device",
-              description="Push or copy files from a given directory on local machine to an Android device using its serial number.")
-    async def push_file_tool(serial: str, local_file: str, folder_path_in_device: str):
-        """Push or copy a file from the specified local directory to the Android device identified by the serial number."""
-        return await push_file(serial, local_file, folder_path_in_device)
+              description="Push or copy files from a given directory on local machine to an Android device using its serial number. "
+                          "Use transfer_mode 'tar' for directories with many small files.")
+    async def push_file_tool(serial: str, local_file: str, folder_path_in_device: str, transfer_mode: str = "adb",
+                             compress: bool = False):
+        """
+        Push or copy a file from the specified local directory to the Android device identified by the serial number.
+        transfer_mode 'tar' streams the file or directory as one tar archive into `folder_path_in_device`.
+        """
+        return await push_file(serial, local_file, folder_path_in_device, transfer_mode, compress)
+
+    @mcp.tool(name="sync_to_device", title="Sync Directory to Device",
+              description="Incrementally copy a local directory to an Android device, transferring only files that "
+                          "are missing or changed on the device. Optionally delete device files not present locally.")
+    async def sync_to_device_tool(serial: str, local_dir: str, folder_path_in_device: str, delete: bool = False,
+                                  dry_run: bool = False):
+        """Sync a local directory to a directory on the Android device identified by the serial number."""
+        try:
+            return json.dumps(await sync_to_device(serial, local_dir, folder_path_in_device, delete, dry_run),
+                              indent=4)
+        except Exception as e:
+            return f"Failed to sync '{local_dir}' to device '{serial}': {str(e)}"
+
+    @mcp.tool(name="sync_from_device", title="Sync Directory from Device",
+              description="Incrementally copy a directory from an Android device to the local machine, transferring "
+                          "only files that are missing or changed locally. Optionally delete local files not on the "
+                          "device.")
+    async def sync_from_device_tool(serial: str, folder_path_in_device: str, local_dir: str, delete: bool = False,
+                                    dry_run: bool = False):
+        """Sync a directory of the Android device identified by the serial number to a local directory."""
+        try:
+            return json.dumps(await sync_from_device(serial, folder_path_in_device, local_dir, delete, dry_run),
+                              indent=4)
+        except Exception as e:
+            return f"Failed to sync '{folder_path_in_device}' from device '{serial}': {str(e)}"
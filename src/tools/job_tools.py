@@ -0,0 +1,67 @@
+import json
+from typing import Any, Optional
+
+from mcp.server.fastmcp import Context, FastMCP
+
+from src.jobs import JOB_OPERATIONS, JOB_STATUSES, Job, job_store, submit_job
+
+
+def register_job_tools(mcp: FastMCP):
+    """Register background job tools with the MCP server"""
+
+    @mcp.tool(name="submit_job", title="Submit Job",
+              description="Start a long-running operation in the background and return its job ID right away. "
+                          f"Operations: {', '.join(JOB_OPERATIONS)}. Follow it with get_job, wait_job or cancel_job.")
+    async def submit_job_tool(operation: str, arguments: dict[str, Any]):
+        """
+            Submit `operation` with the `arguments` of the tool of the same name, e.g. operation 'pull_file' with
+            {"serial": ..., "file_path_in_device": ..., "local_folder": ...}. screen_recording takes `time_limit`
+            seconds, and reboot_device waits for the device to boot unless `wait_for_boot` is false.
+        """
+        try:
+            return json.dumps(submit_job(operation, arguments).to_dict(), indent=4)
+        except Exception as e:
+            return f"Failed to submit job '{operation}': {str(e)}"
+
+    @mcp.tool(name="get_job", title="Get Job",
+              description="Get the status, progress and (once finished) result of a background job.")
+    async def get_job_tool(job_id: str):
+        """Returns status, progress and result of the job with the given ID."""
+        try:
+            return json.dumps(job_store.get(job_id).to_dict(), indent=4)
+        except Exception as e:
+            return f"Failed to get job '{job_id}': {str(e)}"
+
+    @mcp.tool(name="wait_job", title="Wait For Job",
+              description="Wait up to `timeout` seconds for a background job to finish, sending progress "
+                          "notifications meanwhile, and return its status and result.")
+    async def wait_job_tool(job_id: str, ctx: Context, timeout: float = 30.0):
+        """
+            Waits for the job with the given ID to finish or for `timeout` seconds, whichever comes first.
+            The job keeps running when the wait times out.
+        """
+        async def report(job: Job):
+            await ctx.report_progress(job.progress, job.total, job.message)
+
+        try:
+            return json.dumps((await job_store.wait(job_id, timeout, report)).to_dict(), indent=4)
+        except Exception as e:
+            return f"Failed to wait for job '{job_id}': {str(e)}"
+
+    @mcp.tool(name="cancel_job", title="Cancel Job",
+              description="Cancel a running background job.")
+    async def cancel_job_tool(job_id: str):
+        """Cancels the job with the given ID; finished jobs are left as they are."""
+        try:
+            return json.dumps((await job_store.cancel(job_id)).to_dict(), indent=4)
+        except Exception as e:
+            return f"Failed to cancel job '{job_id}': {str(e)}"
+
+    @mcp.tool(name="list_jobs", title="List Jobs",
+              description=f"List background jobs, optionally by status ({', '.join(JOB_STATUSES)}) and device.")
+    async def list_jobs_tool(status: Optional[str] = None, serial: Optional[str] = None):
+        """Lists running jobs and recently finished ones, oldest first."""
+        try:
+            return json.dumps([job.to_dict() for job in job_store.list(status, serial)], indent=4)
+        except Exception as e:
+            return f"Failed to list jobs: {str(e)}"
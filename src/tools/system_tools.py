@@ -1,8 +1,12 @@
+import json
 from typing import Optional
 
 from mcp.server.fastmcp import FastMCP
 
 from src.device_management import clear_logs, get_logs, execute_shell
+from src.logcat_collector import start_log_collector, stop_log_collector, query_logs
+from src.perf_sampler import start_perf_sampler, stop_perf_sampler, query_perf_samples
+from src.scheduler import scheduler
 
 
 def register_system_tools(mcp: FastMCP):
@@ -16,15 +20,110 @@ def register_system_tools(mcp: FastMCP):
 
     @mcp.tool(name="get_device_logs", title="Get and Save Logs",
               description="Get and save logs from logcat on a specific Android device")
-    async def get_device_logs_tool(serial: str, time_out: float = 10.0, local_log_file_path: Optional[str] = None):
-        """Get and save logs from logcat on a specific Android device"""
-        return await get_logs(serial, time_out, local_log_file_path)
+    async def get_device_logs_tool(serial: str, time_out: float = 10.0, local_log_file_path: Optional[str] = None,
+                                   max_file_size_mb: Optional[float] = None, rotate_seconds: Optional[float] = None,
+                                   compression: Optional[str] = None):
+        """
+        Get and save logs from logcat on a specific Android device.
+        Logs are written while they are captured; files can be rotated by size or age and compressed with gzip or zstd.
+        """
+        return await get_logs(serial, time_out, local_log_file_path, max_file_size_mb, rotate_seconds, compression)
 
     @mcp.tool(name="execute_shell_command", title="Execute shell command",
               description="Execute shell command in an Android device.")
-    async def execute_shell_command_tool(serial: str, command: str):
+    async def execute_shell_command_tool(serial: str, command: str, max_output_bytes: int = 1024 * 1024):
         """
         Execute shell command in a connected Android device.
         E.g., If you want to execute `adb shell ls /sdcard/` then just provide `ls /sdcard`
+        Output larger than `max_output_bytes` is cut down to its head and tail, and the full output is saved
+        to a local temp file whose path is returned.
+        """
+        return await execute_shell(serial, command, max_output_bytes)
+
+    @mcp.tool(name="start_log_collector", title="Start Log Collector",
+              description="Start a background logcat collector on an Android device that keeps parsed log "
+                          "records in memory, so they can be queried later with query_device_logs.")
+    async def start_log_collector_tool(serial: str, buffer_size: int = 50000, tags: Optional[list[str]] = None,
+                                       min_priority: str = "V", buffers: Optional[list[str]] = None):
+        """
+        Start collecting logcat records of a connected Android device in the background.
+        `tags` and `min_priority` (V, D, I, W, E, F) are applied by logcat on the device;
+        `buffers` selects logcat buffers such as main, system or crash.
+        """
+        return await start_log_collector(serial, buffer_size, tags, min_priority, buffers)
+
+    @mcp.tool(name="stop_log_collector", title="Stop Log Collector",
+              description="Stop the background logcat collector of an Android device.")
+    async def stop_log_collector_tool(serial: str):
+        """Stop the background logcat collector of a connected Android device"""
+        return await stop_log_collector(serial)
+
+    @mcp.tool(name="query_device_logs", title="Query Logs",
+              description="Query log records gathered by the background logcat collector of an Android device, "
+                          "filtered by time window, tag, PID, minimum priority and regex.")
+    async def query_device_logs_tool(serial: str, since_seconds: Optional[float] = None,
+                                     after_cursor: Optional[int] = None, tag: Optional[str] = None,
+                                     pid: Optional[int] = None, min_priority: str = "V",
+                                     pattern: Optional[str] = None, limit: int = 200):
+        """
+        Query collected logcat records of a connected Android device.
+        Pass the `cursor` of a previous result as `after_cursor` to get only records logged since then,
+        e.g. `min_priority="E"` with the last cursor returns the errors since the previous step.
+        With a cursor the oldest `limit` matches are returned; when `truncated` is set, query again with the new
+        cursor for the rest.
         """
-        return await execute_shell(serial, command)
+        try:
+            return json.dumps(await query_logs(serial, since_seconds, after_cursor, tag, pid, min_priority, pattern,
+                                               limit), indent=4)
+        except Exception as e:
+            return f"Failed to query logs for device '{serial}': {str(e)}"
+
+    @mcp.tool(name="start_perf_sampler", title="Start Performance Sampler",
+              description="Start sampling CPU, memory, battery and thermal metrics of an Android device in the "
+                          "background, plus CPU, memory and frame timing of an app when `package` is given.")
+    async def start_perf_sampler_tool(serial: str, package: Optional[str] = None, interval: float = 1.0,
+                                      buffer_size: int = 3600):
+        """
+        Start sampling performance metrics of a connected Android device every `interval` seconds.
+        The last `buffer_size` samples are kept in memory and can be queried with query_perf_samples.
+        """
+        return await start_perf_sampler(serial, package, interval, buffer_size)
+
+    @mcp.tool(name="stop_perf_sampler", title="Stop Performance Sampler",
+              description="Stop the background performance sampler of an Android device.")
+    async def stop_perf_sampler_tool(serial: str):
+        """Stop the performance sampler of a connected Android device"""
+        return await stop_perf_sampler(serial)
+
+    @mcp.tool(name="query_perf_samples", title="Query Performance Samples",
+              description="Get min/max/avg/p95 of the metrics sampled by the performance sampler of an Android "
+                          "device over a time window, optionally downsampled into time buckets.")
+    async def query_perf_samples_tool(serial: str, metrics: Optional[list[str]] = None,
+                                      window_seconds: Optional[float] = None, buckets: int = 0):
+        """
+        Query aggregated performance samples of a connected Android device.
+        Metrics: cpu_percent, mem_used_percent, mem_available_mb, battery_level, battery_temp_c, thermal_c and,
+        with a package, app_cpu_percent, app_rss_mb, fps, jank_frames and frame_p95_ms.
+        `buckets` splits the window into that many intervals, each with its own aggregates.
+        """
+        try:
+            return json.dumps(await query_perf_samples(serial, metrics, window_seconds, buckets), indent=4)
+        except Exception as e:
+            return f"Failed to query performance samples for device '{serial}': {str(e)}"
+
+    @mcp.tool(name="cancel_device_commands", title="Cancel device commands",
+              description="Cancel queued and running adb commands of an Android device, optionally only in the "
+                          "'quick' or 'bulk' lane. Running commands are killed, screen recordings "
+                          "and background log collectors are stopped.")
+    async def cancel_device_commands_tool(serial: str, lane: Optional[str] = None, include_running: bool = True):
+        """Cancel adb commands of a connected Android device, e.g. a stuck transfer or recording"""
+        try:
+            return json.dumps(scheduler.cancel(serial, lane, include_running), indent=4)
+        except Exception as e:
+            return f"Failed to cancel commands for device '{serial}': {str(e)}"
+
+    @mcp.tool(name="get_command_queue_status", title="Command queue status",
+              description="Show queued and running adb commands per device and lane.")
+    async def get_command_queue_status_tool():
+        """Show the adb command scheduler state for all devices"""
+        return json.dumps(scheduler.status(), indent=4)
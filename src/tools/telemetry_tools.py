@@ -0,0 +1,47 @@
+import json
+from typing import Optional
+
+from mcp.server.fastmcp import FastMCP
+
+from src.telemetry import telemetry
+
+
+def register_telemetry_tools(mcp: FastMCP):
+    """Register performance telemetry tools and resources with the MCP server"""
+
+    @mcp.resource("telemetry://metrics", name="performance_metrics", title="Performance Metrics",
+                  description="Latency summaries and counters of tool calls and adb commands",
+                  mime_type="application/json")
+    def performance_metrics_resource() -> str:
+        return json.dumps(telemetry.snapshot(), indent=4)
+
+    @mcp.resource("telemetry://metrics/prometheus", name="performance_metrics_prometheus",
+                  title="Performance Metrics (Prometheus)",
+                  description="Latency histograms and counters in the Prometheus text format", mime_type="text/plain")
+    def performance_metrics_prometheus_resource() -> str:
+        return telemetry.prometheus()
+
+    @mcp.tool(name="get_performance_metrics", title="Get performance metrics",
+              description="Get latency percentiles per tool, adb subcommand and device, together with spawn, "
+                          "timeout and failure counts and bytes transferred.")
+    async def get_performance_metrics_tool(output_format: str = "json", output_file: Optional[str] = None,
+                                           reset: bool = False):
+        """
+        Get performance telemetry of this server.
+        `output_format` is 'json' for summaries with p50/p99 or 'prometheus' for the text exposition format.
+        With `output_file`, the Prometheus dump is written to that file instead of being returned.
+        `reset` clears all metrics after reading them.
+        """
+        try:
+            if output_file:
+                telemetry.write_prometheus(output_file)
+                result = f"Metrics written to '{output_file}'"
+            elif output_format == "prometheus":
+                result = telemetry.prometheus()
+            else:
+                result = json.dumps(telemetry.snapshot(), indent=4)
+            if reset:
+                telemetry.reset()
+            return result
+        except Exception as e:
+            return f"Failed to get performance metrics: {str(e)}"
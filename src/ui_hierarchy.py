@@ -0,0 +1,268 @@
+import re
+import time
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.adb_manager import stream_adb
+
+BOUNDS_PATTERN = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+# Node attributes compared when diffing two dumps of the same screen
+DIFF_ATTRIBUTES = ('text', 'content-desc', 'bounds', 'checked', 'selected', 'focused', 'enabled')
+
+# Boolean node attributes reported with every node
+STATE_ATTRIBUTES = ('clickable', 'enabled', 'checked', 'selected', 'focused', 'scrollable')
+
+
+XML_START = b"<?xml"
+HIERARCHY_START = b"<hierarchy"
+HIERARCHY_END = b"</hierarchy>"
+
+
+@dataclass
+class UiNode:
+    path: str
+    attrs: dict[str, str]
+    parent: Optional["UiNode"] = None
+    children: list["UiNode"] = field(default_factory=list)
+    # Identity used to match the node across dumps, assigned when the node is indexed
+    key: str = ""
+
+    @property
+    def bounds(self) -> Optional[list[int]]:
+        match = BOUNDS_PATTERN.match(self.attrs.get('bounds', ''))
+        return [int(value) for value in match.groups()] if match else None
+
+    def identity(self) -> str:
+        """What identifies the node across dumps: its resource-id, else its text or content-desc,
+        and only for anonymous nodes the position in the tree, which shifts when siblings come and go"""
+        class_name = self.attrs.get('class', '')
+        if self.attrs.get('resource-id'):
+            return f"{class_name}|id={self.attrs['resource-id']}"
+        if self.attrs.get('text') or self.attrs.get('content-desc'):
+            return f"{class_name}|text={self.attrs.get('text', '')}|desc={self.attrs.get('content-desc', '')}"
+        return f"{class_name}|path={self.path}"
+
+    def to_dict(self, include_subtree: bool = False, max_depth: int = 10) -> dict:
+        bounds = self.bounds
+        info = {
+            'path': self.path,
+            'class': self.attrs.get('class', ''),
+            'resource_id': self.attrs.get('resource-id', ''),
+            'text': self.attrs.get('text', ''),
+            'content_desc': self.attrs.get('content-desc', ''),
+            'bounds': bounds,
+            'center': [(bounds[0] + bounds[2]) // 2, (bounds[1] + bounds[3]) // 2] if bounds else None,
+        }
+        info.update({name: True for name in STATE_ATTRIBUTES if self.attrs.get(name) == 'true'})
+        if include_subtree and self.children:
+            if max_depth > 0:
+                info['children'] = [child.to_dict(True, max_depth - 1) for child in self.children]
+            else:
+                info['child_count'] = len(self.children)
+        return info
+
+
+class UiHierarchy:
+    """A parsed uiautomator dump, indexed by resource-id, text, content-desc and class"""
+
+    def __init__(self):
+        self.root: Optional[UiNode] = None
+        self.nodes: list[UiNode] = []
+        self.captured_at = time.time()
+        # The dump itself, only kept when asked for
+        self.xml: Optional[bytes] = None
+        self.by_resource_id: dict[str, list[UiNode]] = {}
+        self.by_text: dict[str, list[UiNode]] = {}
+        self.by_content_desc: dict[str, list[UiNode]] = {}
+        self.by_class: dict[str, list[UiNode]] = {}
+        self._identities: dict[str, int] = {}
+
+    def _index(self, node: UiNode):
+        self.nodes.append(node)
+        # Nodes sharing an identity, such as list rows, are told apart by their order
+        identity = node.identity()
+        occurrence = self._identities[identity] = self._identities.get(identity, 0) + 1
+        node.key = identity if occurrence == 1 else f"{identity}#{occurrence}"
+        for index, attribute in ((self.by_resource_id, 'resource-id'), (self.by_text, 'text'),
+                                 (self.by_content_desc, 'content-desc'), (self.by_class, 'class')):
+            value = node.attrs.get(attribute)
+            if value:
+                index.setdefault(value, []).append(node)
+
+    def query(self, resource_id: Optional[str] = None, text: Optional[str] = None,
+              content_desc: Optional[str] = None, class_name: Optional[str] = None,
+              partial: bool = False) -> list[UiNode]:
+        """Return nodes matching all given selectors; `partial` matches substrings, case-insensitively"""
+        selectors = [(index, value) for index, value in ((self.by_resource_id, resource_id), (self.by_text, text),
+                                                         (self.by_content_desc, content_desc),
+                                                         (self.by_class, class_name)) if value]
+        if not selectors:
+            return []
+
+        matches = None
+        for index, value in selectors:
+            if partial:
+                needle = value.lower()
+                found = [node for key, nodes in index.items() if needle in key.lower() for node in nodes]
+            else:
+                found = index.get(value, [])
+            ids = {id(node) for node in found}
+            matches = ids if matches is None else matches & ids
+        return [node for node in self.nodes if id(node) in matches]
+
+    def diff(self, previous: "UiHierarchy") -> dict:
+        """Structural diff against an earlier dump of the same device"""
+        old = {node.key: node for node in previous.nodes}
+        new = {node.key: node for node in self.nodes}
+        changed = []
+        for key in sorted(old.keys() & new.keys()):
+            changes = {name: [old[key].attrs.get(name, ''), new[key].attrs.get(name, '')]
+                       for name in DIFF_ATTRIBUTES if old[key].attrs.get(name, '') != new[key].attrs.get(name, '')}
+            if changes:
+                changed.append({'node': new[key].to_dict(), 'changes': changes})
+        return {
+            'added': [new[key].to_dict() for key in sorted(new.keys() - old.keys())],
+            'removed': [old[key].to_dict() for key in sorted(old.keys() - new.keys())],
+            'changed': changed,
+        }
+
+
+class UiHierarchyBuilder:
+    """Builds a UiHierarchy from a dump fed in chunks as it arrives, skipping output around the XML"""
+
+    def __init__(self, keep_xml: bool = False):
+        self.hierarchy = UiHierarchy()
+        self.started = False
+        self.complete = False
+        # Start of the output that is not XML, for error messages
+        self.preamble = bytearray()
+        self._parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self._stack: list[UiNode] = []
+        self._pending = b""
+        self._xml = bytearray() if keep_xml else None
+
+    def feed(self, chunk: bytes):
+        if self.complete:
+            return
+        data = self._pending + chunk
+        if not self.started:
+            start = data.find(XML_START)
+            if start == -1:
+                start = data.find(HIERARCHY_START)
+            if start == -1:
+                # Hold back what may be the beginning of the XML
+                split = max(0, len(data) - len(HIERARCHY_START) + 1)
+                self.preamble += data[:split][:max(0, 200 - len(self.preamble))]
+                self._pending = data[split:]
+                return
+            self.preamble += data[:start][:max(0, 200 - len(self.preamble))]
+            self.started = True
+            data = data[start:]
+        end = data.find(HIERARCHY_END)
+        if end != -1:
+            # uiautomator reports where it dumped to after the document, which the parser must not see
+            self.complete = True
+            data, self._pending = data[:end + len(HIERARCHY_END)], b""
+        else:
+            split = max(0, len(data) - len(HIERARCHY_END) + 1)
+            data, self._pending = data[:split], data[split:]
+        self._feed_xml(data)
+
+    def _feed_xml(self, data: bytes):
+        if self._xml is not None:
+            self._xml += data
+        hierarchy = self.hierarchy
+        self._parser.feed(data)
+        for event, element in self._parser.read_events():
+            if element.tag != 'node':
+                continue
+            if event == "start":
+                parent = self._stack[-1] if self._stack else None
+                index = len(parent.children) if parent else len(hierarchy.nodes)
+                node = UiNode(f"{parent.path}.{index}" if parent else str(index), dict(element.attrib), parent)
+                if parent:
+                    parent.children.append(node)
+                elif hierarchy.root is None:
+                    hierarchy.root = node
+                hierarchy._index(node)
+                self._stack.append(node)
+            else:
+                self._stack.pop()
+                element.clear()
+
+    def close(self) -> UiHierarchy:
+        if not self.complete:
+            raise ValueError("UI dump is incomplete")
+        self._parser.close()
+        if self.hierarchy.root is None:
+            raise ValueError("UI dump does not contain any nodes")
+        if self._xml is not None:
+            self.hierarchy.xml = bytes(self._xml)
+        return self.hierarchy
+
+
+# Latest and previous hierarchy per device
+hierarchies: dict[str, tuple[UiHierarchy, Optional[UiHierarchy]]] = {}
+
+
+async def _stream_dump(serial: str, command: str, keep_xml: bool,
+                       timeout: Optional[float]) -> tuple[UiHierarchyBuilder, bytes]:
+    builder = UiHierarchyBuilder(keep_xml)
+    async with stream_adb("-s", serial, "exec-out", command, timeout=timeout) as stream:
+        async for chunk in stream:
+            builder.feed(chunk)
+    return builder, stream.stderr
+
+
+async def fetch_ui_hierarchy(serial: str, keep_xml: bool = False, timeout: Optional[float] = 30.0) -> UiHierarchy:
+    """Dump the UI hierarchy over exec-out without leaving a file on the device, parsing it as it streams in"""
+    builder, err = await _stream_dump(serial, "uiautomator dump /dev/tty", keep_xml, timeout)
+    if not builder.complete:
+        # Some devices cannot dump to a tty, dump to a temporary file and stream it back in the same call
+        path_in_device = f"/data/local/tmp/{serial.replace(':', '_')}_dump_xml.xml"
+        builder, err = await _stream_dump(serial, f"uiautomator dump {path_in_device} >/dev/null && "
+                                                  f"cat {path_in_device}; rm -f {path_in_device}", keep_xml, timeout)
+        if not builder.complete:
+            raise RuntimeError(f"uiautomator dump failed: "
+                               f"{(err or bytes(builder.preamble)).decode(errors='ignore').strip()[:200]}")
+    return builder.close()
+
+
+async def refresh_hierarchy(serial: str, hierarchy: Optional[UiHierarchy] = None) -> UiHierarchy:
+    """Dump (unless given) and index the current screen, keeping the previous dump for diffs"""
+    if hierarchy is None:
+        hierarchy = await fetch_ui_hierarchy(serial)
+    previous = hierarchies.get(serial, (None, None))[0]
+    hierarchies[serial] = (hierarchy, previous)
+    return hierarchy
+
+
+async def query_ui(serial: str, resource_id: Optional[str] = None, text: Optional[str] = None,
+                   content_desc: Optional[str] = None, class_name: Optional[str] = None, partial: bool = False,
+                   refresh: bool = True, include_subtree: bool = False, limit: int = 20) -> dict:
+    """Find UI nodes on the current screen by selector"""
+    if refresh or serial not in hierarchies:
+        hierarchy = await refresh_hierarchy(serial)
+    else:
+        hierarchy = hierarchies[serial][0]
+    matches = hierarchy.query(resource_id, text, content_desc, class_name, partial)
+    return {
+        'count': len(matches),
+        'nodes': [node.to_dict(include_subtree) for node in matches[:max(0, limit)]],
+        'total_nodes': len(hierarchy.nodes),
+    }
+
+
+async def ui_diff(serial: str, refresh: bool = True) -> dict:
+    """Diff the current screen against the previous dump of the device"""
+    if refresh or serial not in hierarchies:
+        await refresh_hierarchy(serial)
+    current, previous = hierarchies[serial]
+    if previous is None:
+        return {'message': "No previous dump to compare with, call again after the screen changes",
+                'total_nodes': len(current.nodes)}
+    result = current.diff(previous)
+    result['seconds_between_dumps'] = round(current.captured_at - previous.captured_at, 2)
+    return result
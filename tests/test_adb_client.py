@@ -0,0 +1,243 @@
+import asyncio
+import stat
+import struct
+
+import pytest
+
+from src.adb_client import (AdbClient, AdbLocalFileError, AdbProtocolError, SHELL_EXIT, SHELL_STDERR, SHELL_STDOUT,
+                            SYNC_DATA_MAX)
+
+SERIAL = "emulator-5554"
+LARGE_OUTPUT = b"".join(b"line %d\n" % index for index in range(30000))
+
+
+class MiniAdbServer:
+    """In-process ADB server with one device, answering just the requests AdbClient sends"""
+
+    def __init__(self):
+        self.files: dict[str, bytes] = {}
+
+    @staticmethod
+    def run(command: str) -> tuple[int, bytes, bytes]:
+        name, _, rest = command.partition(" ")
+        if name == "echo":
+            return 0, rest.encode() + b"\n", b""
+        if name == "false":
+            return 1, b"", b""
+        if name == "large":
+            return 0, LARGE_OUTPUT, b""
+        return 127, b"", f"/system/bin/sh: {name}: inaccessible or not found\n".encode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = (await reader.readexactly(int(await reader.readexactly(4), 16))).decode()
+                if request in (f"host:transport:{SERIAL}", "host:transport-any"):
+                    writer.write(b"OKAY")
+                    continue
+                if request == "host:version":
+                    self._okay(writer, "0029")
+                elif request in ("host:devices", "host:devices-l"):
+                    self._okay(writer, f"{SERIAL}\tdevice" + (" model:Mini" if request.endswith("-l") else "") + "\n")
+                elif request == f"host-serial:{SERIAL}:get-state":
+                    self._okay(writer, "device")
+                elif request.startswith("shell,v2,raw:"):
+                    writer.write(b"OKAY")
+                    code, stdout, stderr = self.run(request.split(":", 1)[1])
+                    for packet_id, data in ((SHELL_STDOUT, stdout), (SHELL_STDERR, stderr)):
+                        for offset in range(0, len(data), SYNC_DATA_MAX):
+                            chunk = data[offset:offset + SYNC_DATA_MAX]
+                            writer.write(struct.pack("<BI", packet_id, len(chunk)) + chunk)
+                    writer.write(struct.pack("<BIB", SHELL_EXIT, 1, code))
+                elif request.startswith("exec:"):
+                    writer.write(b"OKAY" + self.run(request.split(":", 1)[1])[1])
+                elif request == "sync:":
+                    writer.write(b"OKAY")
+                    await self._sync(reader, writer)
+                else:
+                    payload = f"device '{request.split(':')[-1]}' not found".encode()
+                    writer.write(b"FAIL" + f"{len(payload):04x}".encode() + payload)
+                await writer.drain()
+                return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _okay(writer: asyncio.StreamWriter, text: str):
+        writer.write(b"OKAY" + f"{len(text):04x}".encode() + text.encode())
+
+    async def _sync(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            request, length = struct.unpack("<4sI", await reader.readexactly(8))
+            if request == b"QUIT":
+                return
+            path = (await reader.readexactly(length)).decode()
+            if request == b"STAT":
+                if path in self.files:
+                    writer.write(b"STAT" + struct.pack("<III", 0o100644, len(self.files[path]), 0))
+                elif path.endswith("/") or path == "/sdcard":
+                    writer.write(b"STAT" + struct.pack("<III", 0o40755, 4096, 0))
+                else:
+                    writer.write(b"STAT" + struct.pack("<III", 0, 0, 0))
+            elif request == b"RECV":
+                data = self.files.get(path)
+                if data is None:
+                    writer.write(b"FAIL" + struct.pack("<I", 25) + b"No such file or directory")
+                else:
+                    for offset in range(0, len(data), SYNC_DATA_MAX):
+                        chunk = data[offset:offset + SYNC_DATA_MAX]
+                        writer.write(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+                    writer.write(b"DONE" + struct.pack("<I", 0))
+            elif request == b"SEND":
+                data = bytearray()
+                while (header := await reader.readexactly(8))[:4] == b"DATA":
+                    data += await reader.readexactly(struct.unpack("<I", header[4:])[0])
+                self.files[path.rsplit(",", 1)[0]] = bytes(data)
+                writer.write(b"OKAY" + struct.pack("<I", 0))
+            await writer.drain()
+
+
+def run_against_server(test):
+    """Run `test(client, server)` against a MiniAdbServer listening on a free local port"""
+
+    async def main():
+        server = MiniAdbServer()
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        client = AdbClient("127.0.0.1", listener.sockets[0].getsockname()[1], warm_size=0)
+        try:
+            return await test(client, server)
+        finally:
+            client.close()
+            listener.close()
+            await listener.wait_closed()
+
+    return asyncio.run(main())
+
+
+def test_host_queries():
+    async def test(client, server):
+        assert await client.server_version() == 0x29
+        assert await client.devices() == f"{SERIAL}\tdevice\n"
+        assert "model:Mini" in await client.devices(long=True)
+        assert await client.get_state(SERIAL) == "device"
+        with pytest.raises(AdbProtocolError, match="not found"):
+            await client.get_state("missing")
+
+    run_against_server(test)
+
+
+def test_shell_v2_separates_streams_and_exit_code():
+    async def test(client, server):
+        assert await client.shell(SERIAL, "echo hello") == (0, b"hello\n", b"")
+        assert (await client.shell(SERIAL, "false"))[0] == 1
+        code, out, err = await client.shell(SERIAL, "no-such-command")
+        assert (code, out) == (127, b"")
+        assert b"no-such-command: inaccessible or not found" in err
+
+    run_against_server(test)
+
+
+def test_shell_v2_streams_stdout_across_packets():
+    async def test(client, server):
+        chunks = []
+
+        async def on_stdout(data: bytes):
+            chunks.append(data)
+
+        assert await client.shell(SERIAL, "large", on_stdout=on_stdout) == (0, b"", b"")
+        assert len(chunks) > 1
+        assert b"".join(chunks) == LARGE_OUTPUT
+
+    run_against_server(test)
+
+
+def test_exec_out_returns_raw_stdout():
+    async def test(client, server):
+        assert await client.exec_out(SERIAL, "echo raw") == b"raw\n"
+
+    run_against_server(test)
+
+
+def test_sync_push_stat_and_pull_round_trip(tmp_path):
+    payload = bytes(range(256)) * 1024
+    source = tmp_path / "source.bin"
+    source.write_bytes(payload)
+    target = tmp_path / "target.bin"
+
+    async def test(client, server):
+        assert await client.push(SERIAL, str(source), "/sdcard/data.bin") == len(payload)
+        assert server.files["/sdcard/data.bin"] == payload
+        mode, size, _ = await client.stat(SERIAL, "/sdcard/data.bin")
+        assert stat.S_ISREG(mode) and size == len(payload)
+        assert (await client.stat(SERIAL, "/sdcard/missing.bin"))[0] == 0
+        assert await client.pull(SERIAL, "/sdcard/data.bin", str(target)) == len(payload)
+        assert target.read_bytes() == payload
+
+    run_against_server(test)
+
+
+def test_failed_pull_removes_the_local_file(tmp_path):
+    target = tmp_path / "missing.bin"
+
+    async def test(client, server):
+        with pytest.raises(AdbProtocolError, match="No such file"):
+            await client.pull(SERIAL, "/sdcard/missing.bin", str(target))
+        assert not target.exists()
+
+    run_against_server(test)
+
+
+def test_local_file_errors_are_not_connection_errors(tmp_path):
+    async def test(client, server):
+        server.files["/sdcard/data.bin"] = b"data"
+        # OSError would be taken for a dead ADB server by run_adb, so local failures get their own type
+        with pytest.raises(AdbLocalFileError, match="cannot create"):
+            await client.pull(SERIAL, "/sdcard/data.bin", str(tmp_path / "no" / "such" / "dir.bin"))
+        with pytest.raises(AdbLocalFileError, match="cannot read"):
+            await client.push(SERIAL, str(tmp_path / "missing.bin"), "/sdcard/missing.bin")
+        code, out, err = await client.run(("-s", SERIAL, "pull", "/sdcard/data.bin", str(tmp_path / "no" / "x")))
+        assert (code, out) == (1, b"") and err.startswith(b"adb: error: cannot create")
+
+    run_against_server(test)
+
+
+def test_run_maps_cli_arguments(tmp_path):
+    source = tmp_path / "notes.txt"
+    source.write_bytes(b"notes")
+
+    async def test(client, server):
+        code, out, _ = await client.run(("devices",))
+        assert code == 0 and out == f"List of devices attached\n{SERIAL}\tdevice\n".encode()
+        assert await client.run(("-s", SERIAL, "shell", "echo", "hi")) == (0, b"hi\n", b"")
+        assert await client.run(("-s", SERIAL, "get-state")) == (0, b"device", b"")
+        assert (await client.run(("-s", SERIAL, "push", str(source), "/sdcard/")))[0] == 0
+        assert server.files["/sdcard/notes.txt"] == b"notes"
+        assert (await client.run(("-s", SERIAL, "pull", "/sdcard/notes.txt", str(tmp_path / "copy.txt"))))[0] == 0
+        assert (tmp_path / "copy.txt").read_bytes() == b"notes"
+
+    run_against_server(test)
+
+
+def test_run_falls_back_to_cli_for_unsupported_commands(tmp_path):
+    async def test(client, server):
+        # None tells the caller to spawn the adb executable instead
+        assert await client.run(("-s", SERIAL, "install", "app.apk")) is None
+        assert await client.run(("-s", SERIAL, "forward", "tcp:8080", "tcp:8080")) is None
+        assert await client.run(("--version",)) is None
+        # Directories and missing files keep the CLI semantics of adb pull and push
+        assert await client.run(("-s", SERIAL, "pull", "/sdcard", str(tmp_path))) is None
+        assert await client.run(("-s", SERIAL, "pull", "/sdcard/missing.bin", str(tmp_path))) is None
+        assert await client.run(("-s", SERIAL, "push", str(tmp_path / "missing.txt"), "/sdcard/")) is None
+
+    run_against_server(test)
+
+
+def test_run_reports_protocol_errors_as_exit_code():
+    async def test(client, server):
+        code, out, err = await client.run(("-s", "missing", "shell", "echo", "hi"))
+        assert (code, out) == (1, b"")
+        assert err.startswith(b"adb: error: ") and b"not found" in err
+
+    run_against_server(test)
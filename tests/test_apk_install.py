@@ -0,0 +1,101 @@
+import asyncio
+import struct
+import zipfile
+
+import pytest
+
+import src.apk_install as apk_install
+from src.apk_install import (ATTR_VERSION_CODE, ATTR_VERSION_NAME, ApkBuild, ApkManifest, is_build_installed,
+                             parse_binary_manifest, read_apk_manifest)
+from src.app_inventory import AppRecord
+
+TYPE_INT_DEC = 0x10
+
+
+def string_pool(strings: list[str]) -> bytes:
+    offsets, data = [], b""
+    for string in strings:
+        offsets.append(len(data))
+        data += struct.pack("<H", len(string)) + string.encode("utf-16-le") + b"\0\0"
+    data += b"\0" * (-len(data) % 4)
+    header_size = 28
+    strings_start = header_size + 4 * len(strings)
+    return (struct.pack("<HHIIIIII", 0x0001, header_size, strings_start + len(data), len(strings), 0, 0,
+                        strings_start, 0) + struct.pack(f"<{len(strings)}I", *offsets) + data)
+
+
+def compiled_manifest(package: str, version_code: int, version_name: str) -> bytes:
+    """AndroidManifest.xml as aapt2 compiles it, reduced to what the parser reads"""
+    # Attribute names with a resource id come first, their index is the index into the resource map
+    strings = ["versionCode", "versionName", "package", "manifest", package, version_name]
+    resource_map = struct.pack("<HHI", 0x0180, 8, 16) + struct.pack("<II", ATTR_VERSION_CODE, ATTR_VERSION_NAME)
+    attributes = [(0, 0xffffffff, TYPE_INT_DEC, version_code), (1, 5, 0x03, 5), (2, 4, 0x03, 4)]
+    body = struct.pack("<IIHHHHHH", 0xffffffff, 3, 20, 20, len(attributes), 0, 0, 0) + b"".join(
+        struct.pack("<IIIHBBI", 0xffffffff, name, raw, 8, 0, data_type, value)
+        for name, raw, data_type, value in attributes)
+    element = struct.pack("<HHIII", 0x0102, 16, 16 + len(body), 1, 0xffffffff) + body
+    chunks = string_pool(strings) + resource_map + element
+    return struct.pack("<HHI", 0x0003, 8, 8 + len(chunks)) + chunks
+
+
+def test_parse_binary_manifest():
+    assert parse_binary_manifest(compiled_manifest("com.example.app", 42, "1.2.3")) == \
+           ApkManifest("com.example.app", 42, "1.2.3")
+
+
+def test_parse_binary_manifest_rejects_other_documents():
+    with pytest.raises(ValueError, match="not a binary XML"):
+        parse_binary_manifest(b"<manifest package='com.example.app'/>")
+    with pytest.raises(ValueError, match="manifest element not found"):
+        parse_binary_manifest(struct.pack("<HHI", 0x0003, 8, 8) + string_pool(["manifest"]))
+
+
+def test_read_apk_manifest(tmp_path):
+    apk = tmp_path / "app.apk"
+    with zipfile.ZipFile(apk, "w") as archive:
+        archive.writestr("AndroidManifest.xml", compiled_manifest("com.example.app", 7, "0.7"))
+    assert read_apk_manifest(str(apk)) == ApkManifest("com.example.app", 7, "0.7")
+    apk.write_bytes(b"not a zip")
+    assert read_apk_manifest(str(apk)) is None
+
+
+BUILD = ApkBuild(["app.apk"], ApkManifest("com.example.app", 42, "1.2.3"), ["a" * 64])
+
+
+def check_installed(monkeypatch, record=None, sha256s=("a" * 64,), inventory_error=None, probe_error=None):
+    async def get(serial, package):
+        if inventory_error:
+            raise inventory_error
+        return record
+
+    async def installed_sha256s(serial, package):
+        if probe_error:
+            raise probe_error
+        return list(sha256s)
+
+    monkeypatch.setattr(apk_install.app_inventory, "get", get)
+    monkeypatch.setattr(apk_install, "installed_sha256s", installed_sha256s)
+    monkeypatch.setattr(apk_install, "_installed", {})
+    return asyncio.run(is_build_installed("serial", BUILD))
+
+
+def installed_record(**changes) -> AppRecord:
+    record = AppRecord("com.example.app", version_code=42, last_update_time="2024-02-01 11:30:00")
+    for name, value in changes.items():
+        setattr(record, name, value)
+    return record
+
+
+def test_only_a_matching_sha256_skips_the_install(monkeypatch):
+    assert check_installed(monkeypatch, installed_record())
+    assert not check_installed(monkeypatch, installed_record(), sha256s=["b" * 64])
+    assert not check_installed(monkeypatch, installed_record(version_code=41))
+    assert not check_installed(monkeypatch, installed_record(installed=False))
+    assert not check_installed(monkeypatch, None)
+
+
+def test_failed_probes_and_missing_metadata_mean_install(monkeypatch):
+    assert not check_installed(monkeypatch, inventory_error=RuntimeError("adb failed to read package inventory"))
+    assert not check_installed(monkeypatch, installed_record(), probe_error=TimeoutError("timed out"))
+    assert not check_installed(monkeypatch, installed_record(), sha256s=[])
+    assert not check_installed(monkeypatch, installed_record(last_update_time=""))
@@ -0,0 +1,92 @@
+from src.app_inventory import DumpsysPackageParser
+
+DUMPSYS_PACKAGE = """Activity Resolver Table:
+  Non-Data Actions:
+      android.intent.action.MAIN:
+        1a2b3c com.example.app/.MainActivity filter 4d5e6f
+
+Packages:
+  Package [com.example.app] (1a2b3c):
+    userId=10123
+    pkg=Package{4d5e6f com.example.app}
+    codePath=/data/app/~~abc==/com.example.app-xyz==
+    versionCode=42 minSdk=24 targetSdk=34
+    versionName=1.2.3 beta
+    flags=[ HAS_CODE ALLOW_CLEAR_USER_DATA ]
+    privateFlags=[ PRIVATE_FLAG_ACTIVITIES_RESIZE_MODE_RESIZEABLE ]
+    timeStamp=2024-01-01 10:00:00
+    firstInstallTime=2024-01-01 10:00:01
+    lastUpdateTime=2024-02-01 11:30:00
+    installerPackageName=com.android.vending
+    requested permissions:
+      android.permission.INTERNET
+      android.permission.CAMERA
+    install permissions:
+      android.permission.INTERNET: granted=true
+    User 0: ceDataInode=123 installed=true hidden=false suspended=false stopped=false notLaunched=false enabled=0
+      runtime permissions:
+        android.permission.CAMERA: granted=true, flags=[ USER_SET ]
+    User 10: ceDataInode=456 installed=false hidden=false suspended=false stopped=true notLaunched=true enabled=0
+      runtime permissions:
+        android.permission.CAMERA: granted=false, flags=[ USER_SET ]
+  Package [com.android.settings] (7a8b9c):
+    codePath=/system/priv-app/Settings
+    versionCode=34 minSdk=34 targetSdk=34
+    versionName=14
+    flags=[ SYSTEM HAS_CODE ]
+    User 0: ceDataInode=789 installed=true hidden=false enabled=2
+
+Hidden system packages:
+  Package [com.android.settings] (1d2e3f):
+    codePath=/system/priv-app/SettingsOld
+    versionCode=33 minSdk=33 targetSdk=33
+
+Queries:
+  system apps queryable: false
+"""
+
+
+def parse(text: str) -> dict:
+    parser = DumpsysPackageParser()
+    for line in text.splitlines():
+        parser.feed(line)
+    return parser.records
+
+
+def test_package_details_are_parsed():
+    app = parse(DUMPSYS_PACKAGE)['com.example.app']
+    assert app.details() == {
+        'package': "com.example.app",
+        'versionName': "1.2.3 beta",
+        'versionCode': 42,
+        'minSdk': 24,
+        'targetSdk': 34,
+        'firstInstallTime': "2024-01-01 10:00:01",
+        'lastUpdateTime': "2024-02-01 11:30:00",
+        'installerPackageName': "com.android.vending",
+        'codePath': "/data/app/~~abc==/com.example.app-xyz==",
+        'system': False,
+        'enabled': 0,
+        'flags': ["HAS_CODE", "ALLOW_CLEAR_USER_DATA", "PRIVATE_FLAG_ACTIVITIES_RESIZE_MODE_RESIZEABLE"],
+        'requestedPermissions': ["android.permission.INTERNET", "android.permission.CAMERA"],
+        # Runtime grants of other users are ignored
+        'grantedPermissions': ["android.permission.INTERNET", "android.permission.CAMERA"],
+    }
+
+
+def test_only_installed_packages_section_is_indexed():
+    records = parse(DUMPSYS_PACKAGE)
+    assert list(records) == ["com.example.app", "com.android.settings"]
+    settings = records['com.android.settings']
+    # The hidden copy of the system package that follows must not override the installed one
+    assert (settings.version_code, settings.code_path) == (34, "/system/priv-app/Settings")
+    assert settings.system and settings.enabled == 2 and settings.installed
+
+
+def test_package_not_installed_for_the_primary_user():
+    text = DUMPSYS_PACKAGE.replace("User 0: ceDataInode=123 installed=true", "User 0: ceDataInode=123 installed=false")
+    assert not parse(text)['com.example.app'].installed
+
+
+def test_output_without_packages_section():
+    assert parse("Activity Resolver Table:\n  Non-Data Actions:\n") == {}
@@ -0,0 +1,87 @@
+import asyncio
+from collections import Counter
+
+from src.fan_out import device_host, fan_out
+
+
+def test_device_host():
+    assert device_host("192.168.1.20:5555") == "192.168.1.20"
+    assert device_host("emulator-5554") == "emulator"
+    # USB devices do not share a connection with each other
+    assert device_host("R58M123ABC") == "R58M123ABC"
+
+
+class Tracker:
+    """Operation recording how many devices run at once, overall and per host"""
+
+    def __init__(self):
+        self.running = Counter()
+        self.peak = Counter()
+        self.release = asyncio.Event()
+
+    async def __call__(self, serial: str) -> str:
+        for key in ("all", device_host(serial)):
+            self.running[key] += 1
+            self.peak[key] = max(self.peak[key], self.running[key])
+        try:
+            await self.release.wait()
+        finally:
+            for key in ("all", device_host(serial)):
+                self.running[key] -= 1
+        return f"done on {serial}"
+
+
+async def run_until_idle(tracker: Tracker, serials: list[str], **limits) -> dict:
+    task = asyncio.ensure_future(fan_out(serials, tracker, **limits))
+    # Let every device that can get a slot start before releasing them all
+    for _ in range(10):
+        await asyncio.sleep(0)
+    tracker.release.set()
+    return await task
+
+
+def test_limits_parallelism_overall_and_per_host():
+    serials = [f"10.0.0.1:{5555 + index}" for index in range(6)] + [f"USB{index}" for index in range(6)]
+
+    async def main():
+        tracker = Tracker()
+        result = await run_until_idle(tracker, serials, max_parallel=5, per_host_limit=2)
+        return tracker, result
+
+    tracker, result = asyncio.run(main())
+    assert tracker.peak["all"] == 5
+    assert tracker.peak["10.0.0.1"] == 2
+    assert result['summary']['ok'] == 12
+    assert result['devices']["USB3"]['output'] == "done on USB3"
+
+
+def test_busy_host_does_not_hold_global_slots():
+    # Four devices of one host queue behind its single slot while the USB devices use the global slots
+    serials = [f"10.0.0.1:{5555 + index}" for index in range(4)] + ["USB0", "USB1"]
+
+    async def main():
+        tracker = Tracker()
+        result = await run_until_idle(tracker, serials, max_parallel=3, per_host_limit=1)
+        return tracker, result
+
+    tracker, result = asyncio.run(main())
+    assert tracker.peak["all"] == 3 and tracker.peak["10.0.0.1"] == 1
+    assert result['summary']['ok'] == 6
+
+
+def test_failures_and_timeouts_are_reported_per_device():
+    async def operation(serial: str):
+        if serial == "slow":
+            await asyncio.sleep(10)
+        if serial == "raising":
+            raise RuntimeError("device offline")
+        if serial == "failing":
+            return "Failed to do it"
+        return "ok"
+
+    result = asyncio.run(fan_out(["ok", "slow", "raising", "failing"], operation, timeout=0.1))
+    assert {serial: device['status'] for serial, device in result['devices'].items()} == {
+        'ok': "ok", 'slow': "timeout", 'raising': "failed", 'failing': "failed"}
+    assert result['devices']['raising']['output'] == "device offline"
+    summary = result['summary']
+    assert (summary['total'], summary['ok'], summary['failed'], summary['timeout']) == (4, 1, 2, 1)
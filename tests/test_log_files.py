@@ -0,0 +1,45 @@
+import gzip
+
+import pytest
+
+from src.log_files import RotatingLogWriter
+
+LINES = b"".join(b"01-01 00:00:%02d.000  1234  1240 I Tag: message %04d\n" % (index % 60, index)
+                 for index in range(500))
+
+
+def write_in_chunks(writer: RotatingLogWriter, data: bytes, chunk_size: int):
+    for offset in range(0, len(data), chunk_size):
+        writer.write(data[offset:offset + chunk_size])
+    writer.close()
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_segments_rotate_on_line_boundaries(tmp_path, compression):
+    writer = RotatingLogWriter(str(tmp_path / "logcat.log"), max_bytes=1000, compression=compression)
+    write_in_chunks(writer, LINES, 333)
+    assert len(writer.files) > 10
+    opener = gzip.open if compression else open
+    segments = []
+    for path in writer.files:
+        with opener(path, "rb") as f:
+            segments.append(f.read())
+    assert all(segment.endswith(b"\n") for segment in segments)
+    assert b"".join(segments) == LINES
+    assert (writer.bytes_written, writer.lines_written) == (len(LINES), 500)
+    assert writer.files[0] == str(tmp_path / ("logcat.log.gz" if compression else "logcat.log"))
+    assert writer.files[1] == str(tmp_path / ("logcat.1.log.gz" if compression else "logcat.1.log"))
+
+
+def test_long_line_is_not_split(tmp_path):
+    writer = RotatingLogWriter(str(tmp_path / "logcat.log"), max_bytes=10)
+    write_in_chunks(writer, b"a" * 100 + b"\nb\n", 7)
+    assert [open(path, "rb").read() for path in writer.files] == [b"a" * 100 + b"\n", b"b\n"]
+
+
+def test_close_leaves_an_empty_log_and_ignores_later_writes(tmp_path):
+    writer = RotatingLogWriter(str(tmp_path / "logcat.log"), compression="gzip")
+    writer.close()
+    writer.write(b"too late\n")
+    writer.close()
+    assert gzip.open(writer.files[0]).read() == b""
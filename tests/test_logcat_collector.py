@@ -0,0 +1,90 @@
+import asyncio
+
+from src.logcat_collector import LogcatCollector, logcat_filter_specs
+
+LONG_OUTPUT = b"""--------- beginning of main
+[ 1700000000.100  1234: 1240 I/ActivityManager ]
+Start proc 4321:com.example/u0a123 for activity
+
+[ 1700000000.200  4321: 4321 E/AndroidRuntime ]
+FATAL EXCEPTION: main
+java.lang.IllegalStateException: boom
+\tat com.example.Main.onCreate(Main.java:10)
+
+[ 1700000000.300  4321: 4330 W/Choreographer ]
+Skipped 42 frames!
+
+[ 1700000000.400  1234: 1240 I/ActivityManager ]
+Process com.example (pid 4321) has died
+"""
+
+
+def collect(data: bytes, buffer_size: int = 50000) -> LogcatCollector:
+    async def main():
+        collector = LogcatCollector("serial", buffer_size)
+        stream = asyncio.StreamReader()
+        stream.feed_data(data)
+        stream.feed_eof()
+        await collector._read(stream)
+        return collector
+
+    return asyncio.run(main())
+
+
+def test_long_format_records_are_parsed():
+    records = list(collect(LONG_OUTPUT).records)
+    assert [(r.seq, r.pid, r.tid, r.priority, r.tag) for r in records] == [
+        (1, 1234, 1240, "I", "ActivityManager"), (2, 4321, 4321, "E", "AndroidRuntime"),
+        (3, 4321, 4330, "W", "Choreographer"), (4, 1234, 1240, "I", "ActivityManager")]
+    assert records[1].timestamp == 1700000000.2
+    assert records[1].message == ("FATAL EXCEPTION: main\njava.lang.IllegalStateException: boom\n"
+                                  "\tat com.example.Main.onCreate(Main.java:10)")
+    # The last record has no empty line after it and is still kept
+    assert records[3].message == "Process com.example (pid 4321) has died"
+
+
+def test_full_buffer_drops_the_oldest_records():
+    collector = collect(LONG_OUTPUT, buffer_size=2)
+    assert [r.seq for r in collector.records] == [3, 4]
+    assert collector.dropped == 2
+
+
+def test_query_filters():
+    collector = collect(LONG_OUTPUT)
+    assert [r['seq'] for r in collector.query(min_priority="W")['records']] == [2, 3]
+    assert [r['seq'] for r in collector.query(tag="ActivityManager")['records']] == [1, 4]
+    assert [r['seq'] for r in collector.query(pid=4321, pattern="frames")['records']] == [3]
+    assert [r['seq'] for r in collector.query(since=1700000000.25)['records']] == [3, 4]
+    assert [r['seq'] for r in collector.query(pattern="^Activity")['records']] == [1, 4]
+
+
+def test_query_without_cursor_returns_the_newest_matches():
+    result = collect(LONG_OUTPUT).query(limit=2)
+    assert [r['seq'] for r in result['records']] == [3, 4]
+    assert result['truncated'] and result['cursor'] == 4
+
+
+def test_cursor_pages_through_every_match():
+    collector = collect(LONG_OUTPUT)
+    result = collector.query(after_seq=0, limit=3)
+    assert [r['seq'] for r in result['records']] == [1, 2, 3]
+    assert result['truncated'] and result['cursor'] == 3
+    result = collector.query(after_seq=result['cursor'], limit=3)
+    assert [r['seq'] for r in result['records']] == [4]
+    assert not result['truncated'] and result['cursor'] == 4
+    result = collector.query(after_seq=result['cursor'])
+    assert result['records'] == [] and result['cursor'] == 4
+
+
+def test_filtered_cursor_does_not_skip_unreturned_matches():
+    collector = collect(LONG_OUTPUT)
+    result = collector.query(after_seq=0, tag="ActivityManager", limit=1)
+    assert [r['seq'] for r in result['records']] == [1] and result['cursor'] == 1
+    result = collector.query(after_seq=result['cursor'], tag="ActivityManager", limit=1)
+    assert [r['seq'] for r in result['records']] == [4]
+
+
+def test_filter_specs():
+    assert logcat_filter_specs() == []
+    assert logcat_filter_specs(min_priority="w") == ["*:W"]
+    assert logcat_filter_specs(["ActivityManager"], "I") == ["ActivityManager:I", "*:S"]
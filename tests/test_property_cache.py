@@ -0,0 +1,59 @@
+import pytest
+
+import src.property_cache as property_cache_module
+from src.adb_supervisor import supervisor
+from src.property_cache import DevicePropertyCache, property_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(property_cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_only_read_only_properties_are_kept_per_boot():
+    cache = DevicePropertyCache()
+    assert cache.get_props("serial") is None
+    cache.set_props("serial", "boot-1", {'ro.product.model': "Pixel", 'sys.boot_completed': "1"})
+    assert cache.get_props("serial") == ("boot-1", {'ro.product.model': "Pixel"})
+
+
+def test_new_boot_drops_everything_cached_under_the_old_one(clock):
+    cache = DevicePropertyCache()
+    cache.set_props("serial", "boot-1", {'ro.product.model': "Pixel"})
+    cache.set_volatile("serial", "battery", {'level': 50})
+    cache.set_props("serial", "boot-2", {'ro.build.version.sdk': "34"})
+    assert cache.get_props("serial") == ("boot-2", {'ro.build.version.sdk': "34"})
+    assert cache.get_volatile("serial", "battery") is None
+
+
+def test_volatile_details_expire_after_their_ttl(clock):
+    cache = DevicePropertyCache({'battery': 30.0})
+    cache.set_volatile("serial", "battery", {'level': 50})
+    clock.now += 30.0
+    assert cache.get_volatile("serial", "battery") == {'level': 50}
+    clock.now += 0.1
+    assert cache.get_volatile("serial", "battery") is None
+    # Details without a TTL are never served from the cache
+    cache.set_volatile("serial", "unknown", 1)
+    clock.now += 0.1
+    assert cache.get_volatile("serial", "unknown") is None
+
+
+def test_device_leaving_the_device_state_invalidates_its_entry(monkeypatch):
+    monkeypatch.setattr(supervisor, "devices", {'serial': "device"})
+    property_cache.set_props("serial", "boot-1", {'ro.product.model': "Pixel"})
+    property_cache.set_props("other", "boot-1", {'ro.product.model': "Pixel"})
+    supervisor._update({'serial': "offline", 'other': "device"})
+    assert property_cache.get_props("serial") is None
+    assert property_cache.get_props("other") is not None
+    property_cache.clear()
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from src.scheduler import (BULK_LANE, QUICK_LANE, PRIORITY_HIGH, PRIORITY_LOW, CommandCancelled, CommandScheduler,
+                           classify_lane)
+
+
+def test_classify_lane():
+    assert classify_lane(("-s", "serial", "shell", "getprop"), 30) == QUICK_LANE
+    assert classify_lane(("-s", "serial", "pull", "/sdcard/a", "/tmp"), 30) == BULK_LANE
+    assert classify_lane(("-s", "serial", "exec-out", "screenrecord --output-format=h264 -"), 30) == BULK_LANE
+    assert classify_lane(("-s", "serial", "logcat", "-d"), 30) == QUICK_LANE
+    assert classify_lane(("-s", "serial", "logcat"), 30) == BULK_LANE
+    # Long timeouts mean long commands
+    assert classify_lane(("-s", "serial", "shell", "find", "/"), 600) == BULK_LANE
+
+
+class Gate:
+    """Command factory whose commands run until the gate opens, recording the start order"""
+
+    def __init__(self):
+        self.started: list[str] = []
+        self.opened = asyncio.Event()
+
+    def command(self, name: str):
+        async def run():
+            self.started.append(name)
+            await self.opened.wait()
+            return name
+        return run
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_device_lane_limit_and_priority_order():
+    async def main():
+        scheduler = CommandScheduler({QUICK_LANE: 1, BULK_LANE: 1}, {QUICK_LANE: 8, BULK_LANE: 8})
+        gate = Gate()
+        tasks = [asyncio.ensure_future(scheduler.run("serial", QUICK_LANE, gate.command("first")))]
+        await settle()
+        for name, priority in (("low", PRIORITY_LOW), ("normal", 5), ("high", PRIORITY_HIGH)):
+            tasks.append(asyncio.ensure_future(scheduler.run("serial", QUICK_LANE, gate.command(name), priority)))
+        await settle()
+        assert gate.started == ["first"]
+        assert scheduler.status()['devices']['serial'][QUICK_LANE]['queued'] == 3
+        gate.opened.set()
+        assert await asyncio.gather(*tasks) == ["first", "low", "normal", "high"]
+        return gate.started
+
+    assert asyncio.run(main()) == ["first", "high", "normal", "low"]
+
+
+def test_bulk_commands_do_not_block_the_quick_lane():
+    async def main():
+        scheduler = CommandScheduler({QUICK_LANE: 1, BULK_LANE: 1}, {QUICK_LANE: 8, BULK_LANE: 8})
+        transfer = Gate()
+        bulk = asyncio.ensure_future(scheduler.run("serial", BULK_LANE, transfer.command("pull")))
+        await settle()
+
+        async def quick():
+            return "getprop"
+
+        assert await asyncio.wait_for(scheduler.run("serial", QUICK_LANE, quick), timeout=1.0) == "getprop"
+        transfer.opened.set()
+        await bulk
+
+    asyncio.run(main())
+
+
+def test_global_slots_go_round_robin_between_devices():
+    async def main():
+        scheduler = CommandScheduler({QUICK_LANE: 4, BULK_LANE: 1}, {QUICK_LANE: 1, BULK_LANE: 1})
+        blocker, gate = Gate(), Gate()
+        blocking = asyncio.ensure_future(scheduler.run("z", QUICK_LANE, blocker.command("z")))
+        await settle()
+        tasks = [asyncio.ensure_future(scheduler.run(serial, QUICK_LANE, gate.command(f"{serial}{index}")))
+                 for serial in ("a", "b") for index in range(3)]
+        await settle()
+        gate.opened.set()
+        blocker.opened.set()
+        await asyncio.gather(blocking, *tasks)
+        return gate.started
+
+    assert asyncio.run(main()) == ["a0", "b0", "a1", "b1", "a2", "b2"]
+
+
+def test_cancel_queued_and_running_commands():
+    async def main():
+        scheduler = CommandScheduler({QUICK_LANE: 1, BULK_LANE: 1}, {QUICK_LANE: 8, BULK_LANE: 8})
+        gate = Gate()
+        running = asyncio.ensure_future(scheduler.run("serial", QUICK_LANE, gate.command("running"),
+                                                      description="getprop"))
+        queued = asyncio.ensure_future(scheduler.run("serial", QUICK_LANE, gate.command("queued")))
+        other = asyncio.ensure_future(scheduler.run("other", QUICK_LANE, gate.command("other")))
+        await settle()
+        assert scheduler.status()['devices']['serial'][QUICK_LANE]['running'][0]['command'] == "getprop"
+        assert scheduler.cancel("serial") == {'queued_cancelled': 1, 'running_cancelled': 1}
+        for task in (running, queued):
+            with pytest.raises(CommandCancelled):
+                await task
+        assert "serial" not in scheduler.status()['devices']
+        # Slots of the cancelled commands are free again, other devices are untouched
+        gate.opened.set()
+        assert await scheduler.run("serial", QUICK_LANE, gate.command("after")) == "after"
+        assert await other == "other"
+        return gate.started
+
+    assert asyncio.run(main()) == ["running", "other", "after"]
+
+
+def test_cancel_only_one_lane():
+    async def main():
+        scheduler = CommandScheduler()
+        gate = Gate()
+        quick = asyncio.ensure_future(scheduler.run("serial", QUICK_LANE, gate.command("quick")))
+        bulk = asyncio.ensure_future(scheduler.run("serial", BULK_LANE, gate.command("bulk")))
+        await settle()
+        assert scheduler.cancel("serial", BULK_LANE) == {'queued_cancelled': 0, 'running_cancelled': 1}
+        with pytest.raises(CommandCancelled):
+            await bulk
+        gate.opened.set()
+        assert await quick == "quick"
+
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import pytest
+
+from src.shell_session import ShellSession, ShellSessionError
+
+
+class LocalShellSession(ShellSession):
+    """Session running a local `sh`, which frames commands just like the device shell"""
+
+    def command(self) -> list[str]:
+        return ["sh"]
+
+
+def with_session(test):
+    async def main():
+        session = LocalShellSession("local")
+        await session.start()
+        try:
+            return await test(session)
+        finally:
+            await session.close()
+
+    return asyncio.run(main())
+
+
+def test_commands_are_split_into_exit_code_stdout_and_stderr():
+    async def test(session):
+        assert await session.run("echo out; echo err >&2; exit 3") == (3, b"out\n", b"err\n")
+        assert await session.run("printf 'no newline'") == (0, b"no newline", b"")
+        assert await session.run("true") == (0, b"", b"")
+        assert await session.run("printf 'a\\0b'; false") == (1, b"a\0b", b"")
+        assert session.commands_run == 4
+
+    with_session(test)
+
+
+def test_state_of_a_command_does_not_leak_into_the_next():
+    async def test(session):
+        cwd = (await session.run("pwd"))[1]
+        # Commands run in a subshell with stdin from /dev/null
+        assert await session.run("cd /tmp; FOO=bar; exit 0") == (0, b"", b"")
+        assert await session.run("pwd; echo \"[$FOO]\"; cat") == (0, cwd + b"[]\n", b"")
+        assert session.alive
+
+    with_session(test)
+
+
+def test_output_of_background_children_stays_with_their_command():
+    async def test(session):
+        started = time.monotonic()
+        code, out, err = await session.run("(sleep 0.2; echo late; echo late-err >&2) & echo now")
+        # The command only ends once the child closed the output, so everything it wrote is its own
+        assert time.monotonic() - started >= 0.2
+        assert (code, out, err) == (0, b"now\nlate\n", b"late-err\n")
+        assert await session.run("echo next") == (0, b"next\n", b"")
+
+    with_session(test)
+
+
+def test_detached_children_do_not_hold_up_the_session():
+    async def test(session):
+        assert await session.run("sleep 3 >/dev/null 2>&1 &", timeout=2.0) == (0, b"", b"")
+        assert await session.run("echo next", timeout=2.0) == (0, b"next\n", b"")
+
+    with_session(test)
+
+
+def test_timeout_takes_the_session_down():
+    async def test(session):
+        with pytest.raises(TimeoutError):
+            await session.run("sleep 1", timeout=0.2)
+        assert not session.alive
+        with pytest.raises(ShellSessionError):
+            await session.run("echo again")
+
+    with_session(test)
+
+
+def test_large_output():
+    async def test(session):
+        code, out, err = await session.run("i=0; while [ $i -lt 20000 ]; do echo line $i; i=$((i + 1)); done")
+        assert code == 0 and err == b""
+        assert out.splitlines()[-1] == b"line 19999" and len(out.splitlines()) == 20000
+
+    with_session(test)
@@ -0,0 +1,78 @@
+import pytest
+
+from src.ui_hierarchy import UiHierarchyBuilder
+
+
+def node(attrs: str, children: str = "") -> str:
+    return f"<node {attrs}>{children}</node>"
+
+
+def dump(*rows: str) -> bytes:
+    screen = node('class="android.widget.FrameLayout" bounds="[0,0][1080,2400]"',
+                  node('resource-id="app:id/title" class="android.widget.TextView" text="Inbox" '
+                       'bounds="[0,0][1080,200]"') +
+                  node('resource-id="app:id/list" class="android.widget.ListView" bounds="[0,200][1080,2400]"',
+                       "".join(rows)))
+    return (b"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"
+            b"<hierarchy rotation=\"0\">" + screen.encode() + b"</hierarchy>")
+
+
+def row(text: str, checked: bool = False) -> str:
+    return node(f'class="android.widget.CheckBox" text="{text}" checkable="true" '
+                f'checked="{"true" if checked else "false"}" clickable="true" bounds="[0,200][1080,300]"')
+
+
+def build(data: bytes, chunk_size: int = 64 * 1024, keep_xml: bool = False):
+    builder = UiHierarchyBuilder(keep_xml)
+    for offset in range(0, len(data), chunk_size):
+        builder.feed(data[offset:offset + chunk_size])
+    return builder
+
+
+def test_dump_is_parsed_across_chunks_skipping_the_output_around_it():
+    data = dump(row("Milk"), row("Eggs"))
+    output = b"WARNING: linker: noise\n" + data + b"UI hierchary dumped to: /dev/tty\n"
+    for chunk_size in (1, 7, len(output)):
+        builder = build(output, chunk_size, keep_xml=True)
+        assert builder.complete
+        hierarchy = builder.close()
+        assert [n.path for n in hierarchy.nodes] == ["0", "0.0", "0.1", "0.1.0", "0.1.1"]
+        assert hierarchy.xml == data
+        assert bytes(builder.preamble) == b"WARNING: linker: noise\n"
+
+
+def test_incomplete_dump_is_rejected():
+    builder = build(dump(row("Milk"))[:-20])
+    assert not builder.complete
+    with pytest.raises(ValueError, match="incomplete"):
+        builder.close()
+    builder = build(b"ERROR: could not get idle state.\n")
+    assert not builder.started and bytes(builder.preamble).startswith(b"ERROR")
+
+
+def test_query_by_selectors():
+    hierarchy = build(dump(row("Milk"), row("Eggs", checked=True))).close()
+    assert [n.attrs['text'] for n in hierarchy.query(class_name="android.widget.CheckBox")] == ["Milk", "Eggs"]
+    assert [n.path for n in hierarchy.query(resource_id="app:id/title")] == ["0.0"]
+    assert [n.attrs['text'] for n in hierarchy.query(text="mil", partial=True)] == ["Milk"]
+    assert hierarchy.query(text="Milk", class_name="android.widget.TextView") == []
+    info = hierarchy.query(text="Eggs")[0].to_dict()
+    assert info['center'] == [540, 250] and info['checked'] and info['clickable']
+
+
+def test_diff_matches_nodes_by_identity_not_position():
+    before = build(dump(row("Milk"), row("Eggs"))).close()
+    after = build(dump(row("Bread"), row("Milk"), row("Eggs", checked=True))).close()
+    result = after.diff(before)
+    # Inserting a row shifts the paths of the rows after it, which must not show up as changes
+    assert [n['text'] for n in result['added']] == ["Bread"]
+    assert result['removed'] == []
+    assert [(c['node']['text'], c['changes']) for c in result['changed']] == [
+        ("Eggs", {'checked': ["false", "true"]})]
+
+
+def test_nodes_sharing_an_identity_are_told_apart_by_order():
+    before = build(dump(row("Item"), row("Item"))).close()
+    after = build(dump(row("Item"), row("Item", checked=True))).close()
+    assert [n.key for n in after.nodes[3:]] == [before.nodes[3].key, before.nodes[3].key + "#2"]
+    assert [c['changes'] for c in after.diff(before)['changed']] == [{'checked': ["false", "true"]}]